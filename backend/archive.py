@@ -0,0 +1,143 @@
+"""
+Archivo de años cerrados en ficheros Parquet.
+
+``python archive.py 2018`` escribe las transacciones de 2018 en
+``ARCHIVE_DIR/transactions_2018.parquet`` (columnar, comprimido con zstd)
+y después las quita de transactions; en Postgres particionado se borran
+sus particiones mensuales enteras. Los rollups diarios y los snapshots de
+balance del año se conservan, así que reportes, series temporales e
+historial de balances responden igual; el listado, la búsqueda y la
+exportación solo cubren los años sin archivar.
+
+Los años se archivan del más antiguo al más reciente y solo si ya
+terminaron. Después no se aceptan altas, ediciones ni borrados con fecha
+anterior al final del último año archivado.
+
+Requiere pyarrow (opcional, ver requirements.txt).
+
+Uso (desde ``backend/``):
+    python archive.py 2018
+    python archive.py 2018 --directory /srv/archivo
+    python archive.py --list
+"""
+import argparse
+import datetime
+import itertools
+import os
+import sys
+
+from sqlalchemy.orm import Session
+
+import crud
+import models
+import search
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+
+# Filas por grupo de filas del fichero Parquet
+ROW_GROUP_ROWS = 100_000
+
+# Columnas del fichero: las de la exportación, con el importe en céntimos
+ARCHIVE_COLUMNS = tuple("amount_cents" if name == "amount" else name for name in crud.EXPORT_COLUMNS)
+
+
+def _arrow_schema(pa, start: datetime.date, end: datetime.date):
+    types = {
+        "id": pa.int64(),
+        "date": pa.timestamp("us"),
+        "type": pa.string(),
+        "amount_cents": pa.int64(),
+        "description": pa.string(),
+        "account_id": pa.int32(),
+        "to_account_id": pa.int32(),
+        "category_id": pa.int32(),
+    }
+    return pa.schema(
+        [(name, types[name]) for name in ARCHIVE_COLUMNS],
+        metadata={"period_start": start.isoformat(), "period_end": end.isoformat()},
+    )
+
+
+def write_parquet(db: Session, start: datetime.date, end: datetime.date, path: str):
+    """
+    Escribe las transacciones de [start, end) en path, en orden (date, id),
+    leyéndolas con el cursor del servidor de la exportación. El fichero se
+    escribe aparte y se renombra al terminar. Devuelve el resumen por cuenta
+    de las filas escritas (crud.update_archive_summary).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Archivar requiere pyarrow (pip install pyarrow).")
+
+    schema = _arrow_schema(pa, start, end)
+    rows = crud.iter_transactions_for_export(
+        db, date_from=datetime.datetime.combine(start, datetime.time()),
+        date_to=datetime.datetime.combine(end, datetime.time()), chunk_size=ROW_GROUP_ROWS
+    )
+    written = 0
+    summary = {}
+    summarized = [ARCHIVE_COLUMNS.index(name) for name in ("id", "account_id", "type", "amount_cents")]
+    partial = path + ".partial"
+    with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+        while True:
+            chunk = list(itertools.islice(rows, ROW_GROUP_ROWS))
+            if not chunk:
+                break
+            columns = [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            written += len(chunk)
+            crud.update_archive_summary(summary, ([row[i] for i in summarized] for row in chunk))
+    if pq.ParquetFile(partial).metadata.num_rows != written:
+        raise RuntimeError(f"El fichero {partial} no contiene las {written} filas escritas.")
+    os.replace(partial, path)
+    return summary
+
+
+def archive_year(db: Session, year: int, directory: str = ARCHIVE_DIR):
+    """Archiva el año: escribe el Parquet y quita sus transacciones del libro. Devuelve el ArchivedPeriod."""
+    start, end = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+    crud.check_archivable(db, start, end)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, f"transactions_{year}.parquet"))
+    summary = write_parquet(db, start, end, path)
+    # La escritura del fichero y el borrado van en transacciones distintas:
+    # archive_transactions comprueba con el resumen que el periodo no cambió entre medias
+    db.rollback()
+    return crud.archive_transactions(db, start, end, path, summary)
+
+
+def main():
+    from database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Archiva años cerrados en ficheros Parquet.")
+    parser.add_argument("year", type=int, nargs="?")
+    parser.add_argument("--directory", default=ARCHIVE_DIR)
+    parser.add_argument("--list", action="store_true", help="Mostrar los periodos ya archivados.")
+    args = parser.parse_args()
+    if args.year is None and not args.list:
+        parser.error("indicar el año a archivar o --list")
+
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_search_index(engine)
+    with SessionLocal() as db:
+        if args.year is not None:
+            try:
+                period = archive_year(db, args.year, directory=args.directory)
+            except (ValueError, RuntimeError) as e:
+                print(e)
+                return 1
+            size = os.path.getsize(period.path)
+            print(f"{period.row_count} transacciones de {args.year} archivadas en {period.path} ({size / 1e6:.1f} MB).")
+        if args.list:
+            for period in crud.get_archived_periods(db):
+                print(
+                    f"{period.period_start} - {period.period_end}: {period.row_count} transacciones "
+                    f"en {period.path} (archivado {period.archived_at:%Y-%m-%d %H:%M})"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
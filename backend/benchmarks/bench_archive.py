@@ -0,0 +1,196 @@
+"""
+Benchmark y verificación del archivo de años cerrados.
+
+Genera un libro sintético (2015-2024) en una base SQLite temporal, guarda
+reportes, series, historial de balances y conciliación, archiva los
+primeros años con ``archive.archive_year`` y comprueba que todo responde
+igual, que los ficheros Parquet contienen lo que salió del libro y que no
+se aceptan escrituras en los años archivados, tampoco con fechas con zona
+horaria. Comprueba también que si una transacción del año cambia de
+importe entre la escritura del fichero y el borrado, el archivo se rechaza
+sin borrar nada. Mide el tiempo de archivo, el tamaño de la base y de los
+ficheros y el listado antes y después.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_archive.py --rows 1000000 --years 3
+"""
+import argparse
+import datetime
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_archive.db")
+ARCHIVE_PATH = os.path.join(tempfile.gettempdir(), "bench_archive")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import text  # noqa: E402
+
+import archive  # noqa: E402
+import crud  # noqa: E402
+import ledger_generator  # noqa: E402
+import schemas  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+FIRST_YEAR = 2015
+
+
+def snapshot_state(db):
+    """Resultados que no deben cambiar al archivar."""
+    account_ids = [account.id for account in crud.get_accounts(db)]
+    return {
+        "monthly": [crud.get_monthly_report(db, year, 6) for year in range(FIRST_YEAR, FIRST_YEAR + 10)],
+        "categorized": crud.get_categorized_expenses_report(db, FIRST_YEAR, 3),
+        "timeseries": crud.get_time_series_report(
+            db, datetime.date(FIRST_YEAR, 1, 1), datetime.date(FIRST_YEAR + 10, 1, 1), "month", "account"
+        ),
+        "history": [
+            crud.get_balance_history(
+                db, account_id, datetime.date(FIRST_YEAR, 1, 1), datetime.date(FIRST_YEAR + 10, 1, 1), "month"
+            )
+            for account_id in account_ids
+        ],
+        "balance_at": [crud.get_balance_at(db, account_id, datetime.date(FIRST_YEAR + 1, 7, 15)) for account_id in account_ids],
+        "categories": crud.get_categories_with_stats(db),
+    }
+
+
+def used_mb(db):
+    """Páginas ocupadas de la base (sin las libres), en MB."""
+    pages = db.execute(text("PRAGMA page_count")).scalar() - db.execute(text("PRAGMA freelist_count")).scalar()
+    return pages * db.execute(text("PRAGMA page_size")).scalar() / 1e6
+
+
+def listing_ms(db, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows, cursor = crud.get_transactions(db, limit=50)
+        crud.get_transactions(db, cursor=cursor, limit=50)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--years", type=int, default=3, help="Años a archivar desde el primero.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    import pyarrow.parquet as pq
+
+    for path in (DB_PATH, DB_PATH + "-wal", DB_PATH + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(ARCHIVE_PATH, ignore_errors=True)
+    t0 = time.perf_counter()
+    ledger_generator.generate_ledger(engine, SessionLocal, args.rows)
+    print(f"Poblado de {args.rows} filas en {time.perf_counter() - t0:.1f}s")
+
+    with SessionLocal() as db:
+        crud.snapshot_balances(db)
+        before = snapshot_state(db)
+        listing_before = listing_ms(db, args.repeat)
+        assert crud.reconcile_balances(db)["discrepancies"] == []
+        rows_before = db.execute(text("SELECT count(*) FROM transactions")).scalar()
+        size_before = used_mb(db)
+
+        for year in range(FIRST_YEAR, FIRST_YEAR + args.years):
+            started = time.perf_counter()
+            period = archive.archive_year(db, year, directory=ARCHIVE_PATH)
+            elapsed = time.perf_counter() - started
+            table = pq.read_table(period.path)
+            assert table.num_rows == period.row_count
+            assert min(table.column("date").to_pylist()).year == year == max(table.column("date").to_pylist()).year
+            print(f"{year}: {period.row_count} filas archivadas en {elapsed:.2f}s, "
+                  f"{os.path.getsize(period.path) / 1e6:.1f} MB en Parquet")
+
+        after = snapshot_state(db)
+        for name in before:
+            assert before[name] == after[name], f"{name} cambió al archivar"
+        assert crud.reconcile_balances(db)["discrepancies"] == []
+        assert crud.check_rollups(db) == []
+        crud.rebuild_rollups(db)
+        assert snapshot_state(db) == before
+        rows_after = db.execute(text("SELECT count(*) FROM transactions")).scalar()
+        assert rows_after + sum(period.row_count for period in crud.get_archived_periods(db)) == rows_before
+
+        archived_day = datetime.datetime(FIRST_YEAR, 5, 1)
+        try:
+            crud.create_transaction(db, schemas.TransactionCreate(
+                account_id=1, amount=1, type="expense", date=archived_day, description="tardía"
+            ))
+            raise AssertionError("Se aceptó una transacción en un año archivado")
+        except crud.ArchivedPeriodError:
+            db.rollback()
+        # Fechas con zona horaria: se comparan con el corte en UTC, sin error 500
+        aware = datetime.timezone(datetime.timedelta(hours=2))
+        try:
+            crud.create_transaction(db, schemas.TransactionCreate(
+                account_id=1, amount=1, type="expense", date=archived_day.replace(tzinfo=aware)
+            ))
+            raise AssertionError("Se aceptó una transacción con zona horaria en un año archivado")
+        except crud.ArchivedPeriodError:
+            db.rollback()
+        try:
+            crud.create_transactions_batch(db, [schemas.TransactionCreate(
+                account_id=1, amount=1, type="expense", date=archived_day.replace(tzinfo=datetime.timezone.utc)
+            )])
+            raise AssertionError("Se aceptó un lote con zona horaria en un año archivado")
+        except crud.BatchValidationError:
+            db.rollback()
+        live_day = datetime.datetime(FIRST_YEAR + 9, 3, 15, 10, tzinfo=datetime.timezone.utc)
+        live = crud.create_transaction(db, schemas.TransactionCreate(
+            account_id=1, amount=1, type="expense", date=live_day, description="con zona"
+        ))
+        crud.create_transactions_batch(db, [schemas.TransactionCreate(
+            account_id=1, amount=1, type="expense", date=live_day.astimezone(aware), description="con zona"
+        )])
+        crud.update_transaction(db, live.id, schemas.TransactionUpdate(date=live_day.replace(day=16)))
+        try:
+            crud.update_transaction(db, live.id, schemas.TransactionUpdate(date=archived_day.replace(tzinfo=aware)))
+            raise AssertionError("Se movió una transacción a un año archivado con una fecha con zona horaria")
+        except crud.ArchivedPeriodError:
+            db.rollback()
+        crud.delete_transaction(db, live.id)
+
+        # Edición entre la escritura del fichero y el borrado: mismo número de filas
+        year = FIRST_YEAR + args.years
+        start, end = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        path = os.path.join(ARCHIVE_PATH, f"edited_{year}.parquet")
+        summary = archive.write_parquet(db, start, end, path)
+        db.rollback()
+        edited = db.execute(
+            text("SELECT id, amount_cents FROM transactions WHERE date >= :start ORDER BY date LIMIT 1"),
+            {"start": str(start)}
+        ).one()
+        crud.update_transaction(db, edited.id, schemas.TransactionUpdate(amount=(edited.amount_cents + 1) / 100))
+        rows_in_ledger = db.execute(text("SELECT count(*) FROM transactions")).scalar()
+        try:
+            crud.archive_transactions(db, start, end, path, summary)
+            raise AssertionError("Se archivó un año editado después de escribir el fichero")
+        except ValueError:
+            pass
+        assert db.execute(text("SELECT count(*) FROM transactions")).scalar() == rows_in_ledger
+        assert crud.get_archive_cutoff(db) == datetime.date(FIRST_YEAR + args.years, 1, 1)
+        os.remove(path)
+        listing_after = listing_ms(db, args.repeat)
+        size_after = used_mb(db)
+
+    archived_mb = sum(os.path.getsize(os.path.join(ARCHIVE_PATH, name)) for name in os.listdir(ARCHIVE_PATH)) / 1e6
+    print(f"Filas en transactions: {rows_before} -> {rows_after}")
+    print(f"Listado (2 páginas): {listing_before:.2f} ms -> {listing_after:.2f} ms")
+    print(f"Base SQLite (páginas en uso): {size_before:.1f} MB -> {size_after:.1f} MB; Parquet: {archived_mb:.1f} MB")
+    print("Reportes, historial y conciliación idénticos tras archivar.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark de carga: modo síncrono frente a modo asíncrono (DB_ASYNC=1).
+
+Arranca la API con uvicorn en un subproceso para cada modo, contra la misma
+base de datos, y lanza peticiones concurrentes con httpx durante un tiempo
+fijo. Informa de peticiones por segundo y latencias p50/p95.
+
+Requiere ``httpx`` además de las dependencias opcionales del modo async.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_async.py --concurrency 64 --duration 10
+    python benchmarks/bench_async.py --database-url postgresql://localhost/ingresos_bench
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = (
+    "/api/accounts/?fields=summary",
+    "/api/reports/monthly?year=2024&month=6",
+    "/api/transactions/?limit=50",
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Por defecto, una base SQLite temporal nueva.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga por modo.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--transactions", type=int, default=5000, help="Transacciones a crear antes de medir.")
+    return parser.parse_args()
+
+
+def start_server(database_url, async_mode, port):
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC="1" if async_mode else "0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("La API no arrancó en 30 s.")
+
+
+def seed(base_url, transactions):
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        account_ids = [
+            client.post("/api/accounts/", json={"name": f"bench-{i}", "balance": 0}).json()["id"]
+            for i in range(5)
+        ]
+        rows = "\n".join(
+            f"2024-06-{1 + i % 28:02d},{(-1) ** i * (i % 100 + 1)}" for i in range(transactions)
+        )
+        for account_id in account_ids:
+            client.post(
+                "/api/transactions/import", params={"account_id": account_id},
+                files={"file": ("seed.csv", f"date,amount\n{rows}\n".encode())},
+            ).raise_for_status()
+
+
+async def load(base_url, concurrency, duration):
+    latencies = []
+    errors = 0
+    stop_at = time.perf_counter() + duration
+
+    async def worker(client, offset):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            response = await client.get(PATHS[i % len(PATHS)])
+            if response.status_code != 200:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+            i += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url
+    if database_url is None:
+        db_path = os.path.join(tempfile.gettempdir(), "bench_async.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        database_url = f"sqlite:///{db_path}"
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    seeded = False
+    for async_mode in (False, True):
+        process = start_server(database_url, async_mode, args.port)
+        try:
+            if not seeded:
+                seed(base_url, args.transactions)
+                seeded = True
+            latencies, errors, elapsed = asyncio.run(load(base_url, args.concurrency, args.duration))
+        finally:
+            process.terminate()
+            process.wait()
+        latencies.sort()
+        print(
+            f"{'async' if async_mode else 'sync ':5s}: {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f} ms  "
+            f"errores {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
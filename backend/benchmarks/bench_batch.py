@@ -0,0 +1,72 @@
+"""
+Benchmark de los endpoints batch frente a llamadas individuales.
+
+Crea N transacciones y N transferencias primero una a una
+(POST /api/transactions/, POST /api/transfers/) y después con una sola
+petición a /api/transactions/batch y /api/transfers/batch, contra la app en
+proceso y una base SQLite temporal.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_batch.py --items 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_batch.db")
+if os.path.exists(DB_PATH):
+    os.remove(DB_PATH)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = TestClient(main.app)
+    first = client.post("/api/accounts/", json={"name": "Origen", "balance": 0}).json()["id"]
+    second = client.post("/api/accounts/", json={"name": "Destino", "balance": 0}).json()["id"]
+    transactions = [
+        {"account_id": first, "amount": i % 50 + 1, "type": "income" if i % 3 else "expense"}
+        for i in range(args.items)
+    ]
+    transfers = [
+        {"from_account_id": first, "to_account_id": second, "amount": i % 20 + 1}
+        for i in range(args.items)
+    ]
+
+    def post_each(path, items):
+        for item in items:
+            client.post(path, json=item).raise_for_status()
+
+    cases = (
+        ("transacciones", "/api/transactions/", "/api/transactions/batch", transactions),
+        ("transferencias", "/api/transfers/", "/api/transfers/batch", transfers),
+    )
+    for name, single_path, batch_path, items in cases:
+        t_single = timed(lambda: post_each(single_path, items))
+        t_batch = timed(lambda: client.post(batch_path, json=items).raise_for_status())
+        print(
+            f"{args.items} {name:14s} una a una: {t_single:7.2f}s   batch: {t_batch:7.3f}s   "
+            f"x{t_single / t_batch:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
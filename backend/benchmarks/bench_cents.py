@@ -0,0 +1,102 @@
+"""
+Benchmark de importes float frente a céntimos enteros.
+
+Carga los mismos importes como REAL y como INTEGER (céntimos) en una base
+SQLite temporal y mide:
+  * SUM agrupado por mes sobre cada columna, y la desviación del resultado
+    float respecto al total exacto;
+  * la deriva de un balance actualizado con ``balance = balance + importe``
+    una vez por movimiento, como hacen las altas de transacciones.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_cents.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_cents.db")
+
+
+def populate(conn, rows, seed):
+    rng = random.Random(seed)
+    conn.execute("DROP TABLE IF EXISTS amounts")
+    conn.execute("CREATE TABLE amounts (id INTEGER PRIMARY KEY, month INTEGER, amount REAL, amount_cents INTEGER)")
+    batch = []
+    for i in range(rows):
+        cents = rng.randint(-50_000, 50_000)
+        batch.append((i % 120, cents / 100, cents))
+        if len(batch) >= 50_000:
+            conn.executemany("INSERT INTO amounts (month, amount, amount_cents) VALUES (?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO amounts (month, amount, amount_cents) VALUES (?, ?, ?)", batch)
+    conn.commit()
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def balance_drift(conn, updates):
+    """Aplica los primeros ``updates`` importes uno a uno sobre un balance REAL y otro INTEGER."""
+    conn.execute("DROP TABLE IF EXISTS balances")
+    conn.execute("CREATE TABLE balances (id INTEGER PRIMARY KEY, balance REAL, balance_cents INTEGER)")
+    conn.execute("INSERT INTO balances VALUES (1, 0.0, 0)")
+    amounts = conn.execute("SELECT amount, amount_cents FROM amounts ORDER BY id LIMIT ?", (updates,)).fetchall()
+    for amount, cents in amounts:
+        conn.execute(
+            "UPDATE balances SET balance = balance + ?, balance_cents = balance_cents + ? WHERE id = 1",
+            (amount, cents)
+        )
+    conn.commit()
+    return conn.execute("SELECT balance, balance_cents FROM balances").fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--updates", type=int, default=100_000, help="Actualizaciones de balance encadenadas.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        t0 = time.perf_counter()
+        populate(conn, args.rows, args.seed)
+        print(f"Poblado de {args.rows} filas en {time.perf_counter() - t0:.1f}s")
+
+        query = "SELECT month, SUM({column}) FROM amounts GROUP BY month ORDER BY month"
+        t_float, float_sums = timed(lambda: conn.execute(query.format(column="amount")).fetchall(), args.repeat)
+        t_cents, cents_sums = timed(lambda: conn.execute(query.format(column="amount_cents")).fetchall(), args.repeat)
+        worst = max(
+            abs(Decimal(repr(float_total)) - Decimal(cents_total) / 100)
+            for (_, float_total), (_, cents_total) in zip(float_sums, cents_sums)
+        )
+        print(f"SUM por mes  float: {t_float * 1000:9.2f} ms   céntimos: {t_cents * 1000:9.2f} ms   "
+              f"x{t_float / t_cents:.2f}   desviación máxima float: {worst}")
+
+        t0 = time.perf_counter()
+        balance, balance_cents = balance_drift(conn, min(args.updates, args.rows))
+        exact = Decimal(balance_cents) / 100
+        print(f"Balance tras {min(args.updates, args.rows)} actualizaciones ({time.perf_counter() - t0:.1f}s): "
+              f"float {balance!r}   céntimos {exact}   deriva {Decimal(repr(balance)) - exact}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Verificación y benchmark de Idempotency-Key en las altas.
+
+1. Concurrencia: para cada clave lanza la misma transferencia desde varios
+   hilos a la vez (cada uno con su sesión, por ``idempotency.run`` como el
+   endpoint) y comprueba que se crea una sola, que todos reciben la misma
+   respuesta y que los balances cuadran con el libro.
+2. API: compara alta sin clave, alta con clave y reintento con la misma
+   clave (latencia y sentencias SQL); el reintento no debe leer ni escribir
+   accounts ni transactions. Comprueba también el 422 de una clave
+   reutilizada con otro cuerpo y que un 404 no consume la clave.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_idempotency.py
+    python benchmarks/bench_idempotency.py --database-url postgresql://localhost/ingresos_bench
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Por defecto, una base SQLite temporal nueva.")
+    parser.add_argument("--threads", type=int, default=8, help="Peticiones simultáneas por clave.")
+    parser.add_argument("--keys", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.database_url is None:
+        db_path = os.path.join(tempfile.gettempdir(), "bench_idempotency.db")
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        args.database_url = f"sqlite:///{db_path}"
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, func
+
+    import crud
+    import idempotency
+    import main as api
+    import models
+    import schemas
+    from database import SessionLocal, engine
+
+    run_id = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        account_ids = [
+            crud.create_account(db, schemas.AccountCreate(name=f"idem-{run_id}-{i}", balance=1000)).id
+            for i in range(2)
+        ]
+
+    errors = []
+    responses = {}
+    lock = threading.Lock()
+
+    def worker(key, transfer, barrier):
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            replayed, result = idempotency.run(
+                db, "transfers", key, idempotency.fingerprint(transfer), api.serialize_transfer,
+                crud.create_transfer, transfer=transfer
+            )
+            body = json.loads(result) if replayed else api.serialize_transfer(result)
+            with lock:
+                responses.setdefault(key, []).append((replayed, body))
+        except Exception as e:
+            with lock:
+                errors.append(f"{key}: {type(e).__name__}: {e}")
+        finally:
+            db.close()
+
+    started = time.perf_counter()
+    for n in range(args.keys):
+        key = f"{run_id}-{n}"
+        transfer = schemas.TransferCreate(
+            from_account_id=account_ids[0], to_account_id=account_ids[1], amount=1.25, description=key
+        )
+        barrier = threading.Barrier(args.threads)
+        threads = [threading.Thread(target=worker, args=(key, transfer, barrier)) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    for key, results in responses.items():
+        executed = [body for replayed, body in results if not replayed]
+        if len(executed) != 1:
+            errors.append(f"{key}: {len(executed)} ejecuciones en lugar de 1")
+        if any(body != results[0][1] for _, body in results):
+            errors.append(f"{key}: respuestas distintas")
+    with SessionLocal() as db:
+        created = db.query(func.count(models.Transaction.id)).filter(
+            models.Transaction.account_id.in_(account_ids), models.Transaction.type == "transfer_out"
+        ).scalar()
+        if created != args.keys:
+            errors.append(f"{created} transferencias creadas para {args.keys} claves")
+        if crud.reconcile_balances(db)["discrepancies"]:
+            errors.append("Balances que no cuadran con el libro")
+    print(f"Base de datos: {engine.url.render_as_string(hide_password=True)}")
+    print(f"{args.keys} claves x {args.threads} peticiones simultáneas en {elapsed:.2f}s: "
+          f"{sum(len(r) for r in responses.values())} respuestas, {created} transferencias")
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *event_args: statements.append(event_args[2]))
+    client = TestClient(api.app)
+    body = {"account_id": account_ids[0], "amount": 3.5, "type": "expense", "description": "idem"}
+
+    def measure(request):
+        timings, counts = [], []
+        for n in range(args.repeat):
+            statements.clear()
+            t0 = time.perf_counter()
+            response = request(n)
+            timings.append(time.perf_counter() - t0)
+            counts.append(len(statements))
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return statistics.median(timings) * 1000, max(counts)
+
+    plain = measure(lambda n: client.post("/api/transactions/", json=body))
+    keyed = measure(lambda n: client.post(
+        "/api/transactions/", json=body, headers={"Idempotency-Key": f"{run_id}-api-{n}"}
+    ))
+    statements.clear()
+    replay = measure(lambda n: client.post(
+        "/api/transactions/", json=body, headers={"Idempotency-Key": f"{run_id}-api-{n}"}
+    ))
+    touched = [sql for sql in statements if "accounts" in sql or "FROM transactions" in sql or "INTO transactions" in sql]
+    if touched:
+        errors.append(f"El reintento consultó accounts/transactions: {touched[0]}")
+    print(f"Alta sin clave:     p50 {plain[0]:7.2f} ms, sql {plain[1]}")
+    print(f"Alta con clave:     p50 {keyed[0]:7.2f} ms, sql {keyed[1]}")
+    print(f"Reintento repetido: p50 {replay[0]:7.2f} ms, sql {replay[1]}")
+
+    first = client.post("/api/transactions/", json=body, headers={"Idempotency-Key": f"{run_id}-api-0"})
+    if first.headers.get("Idempotent-Replayed") != "true":
+        errors.append("El reintento no lleva Idempotent-Replayed")
+    reused = client.post(
+        "/api/transactions/", json={**body, "amount": 4}, headers={"Idempotency-Key": f"{run_id}-api-0"}
+    )
+    if reused.status_code != 422:
+        errors.append(f"Clave reutilizada con otro cuerpo: HTTP {reused.status_code}")
+    missing = {**body, "account_id": 10**9}
+    key = {"Idempotency-Key": f"{run_id}-missing"}
+    if client.post("/api/transactions/", json=missing, headers=key).status_code != 404:
+        errors.append("Cuenta inexistente no devolvió 404")
+    # El 404 se deshizo con su reserva: la clave sigue libre
+    if client.post("/api/transactions/", json=body, headers=key).status_code != 200:
+        errors.append("Un 404 consumió la clave")
+
+    for error in errors:
+        print(f"ERROR: {error}")
+    if not errors:
+        print("Una ejecución por clave, respuestas idénticas y balances consistentes.")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
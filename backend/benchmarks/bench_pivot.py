@@ -0,0 +1,141 @@
+"""
+Benchmark y verificación del reporte pivote (/api/reports/pivot).
+
+Genera un libro sintético (2015-2024) y mide, sin caché, varios pivotes de
+diez años: en proceso (pivot.get_pivot_report) y por la API (TestClient,
+con el tamaño de la respuesta). Comprueba los resultados contra el libro:
+  * categoría x mes de ingresos y gastos = serie temporal por categoría,
+  * el total de "count" = transacciones del rango,
+  * el total de "net" = efecto en el balance de las transacciones,
+  * los totales por fila y columna suman la matriz.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_pivot.py --size 1m
+    python benchmarks/bench_pivot.py --size 1m --reuse
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_pivot.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+# Se mide el cálculo, no la caché de reportes
+os.environ["CACHE_BACKEND"] = "none"
+
+START = datetime.date(2015, 1, 1)
+END = datetime.date(2025, 1, 1)
+
+SCENARIOS = [
+    ("category_x_month_net", {"rows": "category", "columns": "period", "granularity": "month"}),
+    ("account_x_week_amount", {"rows": "account", "columns": "period", "granularity": "week", "measure": "amount"}),
+    ("period_day_x_category_expense", {
+        "rows": "period", "columns": "category", "granularity": "day", "measure": "amount", "types": ("expense",),
+    }),
+    ("type_x_year_count", {"rows": "type", "columns": "period", "granularity": "year", "measure": "count"}),
+    ("category_x_account_net", {"rows": "category", "columns": "account"}),
+]
+
+
+def check_totals(report):
+    for row, total in zip(report["values"], report["row_totals"]):
+        assert abs(sum(row) - total) < 0.005 * max(1, len(row))
+    for j, total in enumerate(report["column_totals"]):
+        assert abs(sum(row[j] for row in report["values"]) - total) < 0.005 * max(1, len(report["values"]))
+    assert abs(sum(report["row_totals"]) - report["total"]) < 0.01 * max(1, len(report["row_totals"]))
+
+
+def verify(db):
+    from sqlalchemy import func
+
+    import crud
+    import models
+    import pivot
+
+    report = pivot.get_pivot_report(db, START, END, rows="category", columns="period", types=("expense", "income"))
+    check_totals(report)
+    series = crud.get_time_series_report(db, START, END, "month", "category")["series"]
+    expected = {
+        (point["group_id"], point["period_start"].isoformat()): point["net_balance_cents"]
+        for point in series if point["total_income_cents"] or point["total_expense_cents"]
+    }
+    actual = {
+        (category, period): round(value * 100)
+        for category, row in zip(report["rows"]["keys"], report["values"])
+        for period, value in zip(report["columns"]["keys"], row) if value
+    }
+    assert actual == {key: value for key, value in expected.items() if value}, "pivote != serie temporal"
+
+    day_start = datetime.datetime.combine(START, datetime.time())
+    day_end = datetime.datetime.combine(END, datetime.time())
+    in_range = (models.Transaction.date >= day_start, models.Transaction.date < day_end)
+    count = pivot.get_pivot_report(db, START, END, rows="type", columns="account", measure="count")
+    check_totals(count)
+    assert count["total"] == db.query(func.count(models.Transaction.id)).filter(*in_range).scalar()
+    net = pivot.get_pivot_report(db, START, END, rows="account", columns="type")
+    check_totals(net)
+    ledger = db.query(func.sum(crud._ledger_balance_effect())).filter(*in_range).scalar() or 0
+    assert round(net["total"] * 100) == ledger
+
+
+def main():
+    import ledger_generator
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=ledger_generator.SIZES, default="1m")
+    parser.add_argument("--reuse", action="store_true", help="No regenerar el libro.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    from database import SessionLocal, engine
+
+    if not args.reuse:
+        for path in (DB_PATH, DB_PATH + "-wal", DB_PATH + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        started = time.perf_counter()
+        ledger_generator.generate_ledger(engine, SessionLocal, ledger_generator.SIZES[args.size])
+        print(f"Libro de {ledger_generator.SIZES[args.size]} filas generado en {time.perf_counter() - started:.1f}s")
+
+    from fastapi.testclient import TestClient
+
+    import main as api
+    import pivot
+
+    client = TestClient(api.app)
+    with SessionLocal() as db:
+        verify(db)
+        for name, params in SCENARIOS:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                report = pivot.get_pivot_report(db, START, END, **params)
+                timings.append(time.perf_counter() - started)
+            check_totals(report)
+            query = {key: list(value) if isinstance(value, tuple) else value for key, value in params.items()}
+            query = {"start": START.isoformat(), "end": END.isoformat(), **{
+                ("type" if key == "types" else key): value for key, value in query.items()
+            }}
+            api_timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get("/api/reports/pivot", params=query)
+                api_timings.append(time.perf_counter() - started)
+                response.raise_for_status()
+            cells = len(report["rows"]["keys"]) * len(report["columns"]["keys"])
+            print(
+                f"{name:32s} {cells:6d} celdas  pivote p50 {statistics.median(timings) * 1000:7.1f} ms  "
+                f"API p50 {statistics.median(api_timings) * 1000:7.1f} ms  {len(response.content) / 1024:7.1f} KiB"
+            )
+    print("Pivotes coherentes con el libro, la serie temporal y sus totales.")
+
+
+if __name__ == "__main__":
+    main()
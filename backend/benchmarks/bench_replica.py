@@ -0,0 +1,216 @@
+"""
+Verificación del enrutado de lecturas a la réplica con dos ficheros SQLite.
+
+Genera un libro en el primario, lo copia al fichero de la réplica con la
+API de backup de SQLite (el papel de la replicación) y ejecuta la app real
+en proceso (TestClient) con READ_REPLICA_URL apuntando a la copia.
+Comprueba que:
+  * los GET de reportes y listados solo ejecutan SQL en la réplica,
+  * tras una escritura, el mismo cliente lee del primario y ve su alta
+    mientras otro cliente sigue leyendo de la réplica (sin ella),
+  * pasados READ_REPLICA_STICKY_SECONDS el cliente vuelve a la réplica,
+  * la réplica rechaza escrituras,
+  * con caché: lo que otro cliente cachea desde la réplica atrasada no se
+    sirve al que escribió cuando vuelve a la réplica ya sincronizada, ni
+    con un ETag nuevo.
+Mide además la latencia de las lecturas desde cada base mientras un hilo
+escribe en el primario.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_replica.py --size 100k
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PRIMARY_PATH = os.path.join(tempfile.gettempdir(), "bench_replica_primary.db")
+REPLICA_PATH = os.path.join(tempfile.gettempdir(), "bench_replica_replica.db")
+STICKY_SECONDS = 1
+
+os.environ["DATABASE_URL"] = f"sqlite:///{PRIMARY_PATH}"
+os.environ["READ_REPLICA_URL"] = f"sqlite:///{REPLICA_PATH}"
+os.environ["READ_REPLICA_STICKY_SECONDS"] = str(STICKY_SECONDS)
+# Sin caché: se mide y se comprueba la base de la que lee cada petición
+# (la comprobación con caché la activa solo durante ella)
+os.environ["CACHE_BACKEND"] = "none"
+
+
+def sync_replica():
+    """Copia el primario sobre la réplica, como haría la replicación."""
+    source = sqlite3.connect(PRIMARY_PATH)
+    target = sqlite3.connect(REPLICA_PATH)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+
+def check_cached_replica_read(api, errors):
+    """
+    Un cliente escribe; otro lee el reporte del mes de la réplica atrasada
+    y lo cachea después de la invalidación del commit. Cuando la réplica se
+    pone al día y caduca la cookie, el que escribió debe leer su alta.
+    """
+    import datetime
+
+    from fastapi.testclient import TestClient
+
+    import cache
+
+    today = datetime.date.today()
+    params = {"year": today.year, "month": today.month}
+    writer, reader = TestClient(api.app), TestClient(api.app)
+    account_id = writer.get("/api/accounts/", params={"fields": "summary"}).json()[0]["id"]
+    cache.backend = cache.MemoryBackend(cache.CACHE_MAX_ENTRIES, cache.CACHE_TTL)
+    try:
+        sync_replica()
+        before = reader.get("/api/reports/monthly", params=params).json()["total_income"]
+        writer.post("/api/transactions/", json={
+            "account_id": account_id, "amount": 10, "type": "income", "description": "caché y réplica",
+        }).raise_for_status()
+        stale = reader.get("/api/reports/monthly", params=params)
+        if stale.json()["total_income"] != before:
+            errors.append("La réplica sin sincronizar ya tenía el alta: la comprobación no prueba nada")
+        sync_replica()
+        time.sleep(STICKY_SECONDS + 0.2)
+        after = writer.get("/api/reports/monthly", params=params, headers={"If-None-Match": stale.headers["ETag"]})
+        if after.status_code != 200 or after.json()["total_income"] != before + 10:
+            errors.append(f"Con caché, el cliente que escribió leyó de la réplica: HTTP {after.status_code} {after.text}")
+    finally:
+        cache.backend = cache.NullBackend()
+
+
+def main():
+    import ledger_generator
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=ledger_generator.SIZES, default="100k")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for base in (PRIMARY_PATH, REPLICA_PATH):
+        for path in (base, base + "-wal", base + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, text
+    from sqlalchemy.exc import OperationalError
+
+    from database import (
+        ReplicaSessionLocal, SessionLocal, async_engine, async_replica_engine, engine, replica_engine,
+    )
+
+    ledger_generator.generate_ledger(engine, SessionLocal, ledger_generator.SIZES[args.size])
+    import main as api  # el arranque escribe en el primario: se copia después
+    sync_replica()
+
+    statements = {"primary": 0, "replica": 0}
+    bound_engines = [("primary", engine), ("replica", replica_engine)]
+    if async_engine is not None:
+        bound_engines += [("primary", async_engine.sync_engine), ("replica", async_replica_engine.sync_engine)]
+    for name, bound in bound_engines:
+        event.listen(bound, "before_cursor_execute", lambda *event_args, name=name: statements.__setitem__(name, statements[name] + 1))
+
+    def counted(client, path, **params):
+        statements.update(primary=0, replica=0)
+        response = client.get(path, params=params)
+        response.raise_for_status()
+        return response.json(), dict(statements)
+
+    errors = []
+    writer = TestClient(api.app)
+    reader = TestClient(api.app)
+    reads = [
+        ("/api/reports/monthly", {"year": 2020, "month": 6}),
+        ("/api/reports/timeseries", {"start": "2020-01-01", "end": "2021-01-01", "split_by": "account"}),
+        ("/api/accounts/", {"fields": "summary"}),
+        ("/api/transactions/", {"limit": 50}),
+        ("/api/transactions/search", {"q": "farmacia"}),
+    ]
+    for path, params in reads:
+        _, counts = counted(reader, path, **params)
+        if counts["primary"] or not counts["replica"]:
+            errors.append(f"{path}: {counts} (se esperaba solo la réplica)")
+
+    account_id, other_account_id = [
+        account["id"] for account in writer.get("/api/accounts/", params={"fields": "summary"}).json()[:2]
+    ]
+    created = writer.post("/api/transactions/", json={
+        "account_id": account_id, "amount": 1234.56, "type": "income", "description": "alta de la prueba de réplica",
+    })
+    created.raise_for_status()
+    if "read_primary" not in created.headers.get("set-cookie", ""):
+        errors.append("La escritura no puso la cookie read_primary")
+
+    page, counts = counted(writer, "/api/transactions/", limit=1)
+    if counts["replica"] or page["items"][0]["id"] != created.json()["id"]:
+        errors.append(f"El cliente que escribió no leyó su alta del primario: {counts}")
+    page, counts = counted(reader, "/api/transactions/", limit=1)
+    if counts["primary"] or page["items"][0]["id"] == created.json()["id"]:
+        errors.append(f"El otro cliente no leyó de la réplica: {counts}")
+
+    time.sleep(STICKY_SECONDS + 0.2)
+    _, counts = counted(writer, "/api/transactions/", limit=1)
+    if counts["primary"]:
+        errors.append("El cliente no volvió a la réplica al caducar la cookie")
+    sync_replica()
+    page, _ = counted(reader, "/api/transactions/", limit=1)
+    if page["items"][0]["id"] != created.json()["id"]:
+        errors.append("La réplica sincronizada no tiene el alta")
+
+    with ReplicaSessionLocal() as db:
+        try:
+            db.execute(text("DELETE FROM categories"))
+            errors.append("La réplica aceptó una escritura")
+        except OperationalError:
+            db.rollback()
+
+    check_cached_replica_read(api, errors)
+
+    # Lecturas con escrituras concurrentes en el primario
+    stop = threading.Event()
+
+    def write_load():
+        client = TestClient(api.app)
+        while not stop.is_set():
+            client.post("/api/transfers/", json={"from_account_id": account_id, "to_account_id": other_account_id, "amount": 1})
+
+    load = threading.Thread(target=write_load)
+    load.start()
+    try:
+        for path, params in reads:
+            timings = {}
+            for source, client in (("primario", writer), ("réplica", reader)):
+                client.cookies.clear()
+                if source == "primario":
+                    client.cookies.set("read_primary", "1")
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    client.get(path, params=params).raise_for_status()
+                    samples.append(time.perf_counter() - started)
+                timings[source] = statistics.median(samples) * 1000
+            print(f"{path:28s} primario {timings['primario']:8.2f} ms  réplica {timings['réplica']:8.2f} ms")
+    finally:
+        stop.set()
+        load.join()
+
+    for error in errors:
+        print(f"ERROR: {error}")
+    if not errors:
+        print("Lecturas en la réplica, lectura de lo escrito en el primario y réplica de solo lectura.")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
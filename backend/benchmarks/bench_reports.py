@@ -0,0 +1,108 @@
+"""
+Benchmark de los reportes mensual y diario.
+
+Compara las consultas antiguas (extract + dos SUM sobre transactions) con
+las actuales de ``crud`` (rango semiabierto + agregación condicional sobre
+daily_rollups) en una base SQLite temporal.
+
+Uso (desde ``backend/``):
+    python benchmarks/bench_reports.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_reports.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import func, extract  # noqa: E402
+
+import crud  # noqa: E402
+import ledger_generator  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+
+def legacy_monthly_report(db, year, month):
+    """Implementación previa: extract() impide usar índices y hace dos pasadas."""
+    total_income = db.query(func.sum(models.Transaction.amount_cents)).filter(
+        extract('year', models.Transaction.date) == year,
+        extract('month', models.Transaction.date) == month,
+        models.Transaction.type == 'income'
+    ).scalar() or 0
+    total_expense = db.query(func.sum(models.Transaction.amount_cents)).filter(
+        extract('year', models.Transaction.date) == year,
+        extract('month', models.Transaction.date) == month,
+        models.Transaction.type == 'expense'
+    ).scalar() or 0
+    return total_income, total_expense
+
+
+def legacy_daily_report(db, year, month, day):
+    total_income = db.query(func.sum(models.Transaction.amount_cents)).filter(
+        extract('year', models.Transaction.date) == year,
+        extract('month', models.Transaction.date) == month,
+        extract('day', models.Transaction.date) == day,
+        models.Transaction.type == 'income'
+    ).scalar() or 0
+    total_expense = db.query(func.sum(models.Transaction.amount_cents)).filter(
+        extract('year', models.Transaction.date) == year,
+        extract('month', models.Transaction.date) == month,
+        extract('day', models.Transaction.date) == day,
+        models.Transaction.type == 'expense'
+    ).scalar() or 0
+    return total_income, total_expense
+
+
+def populate(rows):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    ledger_generator.generate_ledger(engine, SessionLocal, rows)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    populate(args.rows)
+    print(f"Poblado de {args.rows} filas en {time.perf_counter() - t0:.1f}s")
+
+    db = SessionLocal()
+    try:
+        cases = [
+            ("mensual", lambda: legacy_monthly_report(db, 2022, 6), lambda: crud.get_monthly_report(db, 2022, 6)),
+            ("diario", lambda: legacy_daily_report(db, 2022, 6, 15), lambda: crud.get_daily_report(db, 2022, 6, 15)),
+        ]
+        for name, legacy, current in cases:
+            legacy_result = legacy()
+            current_result = current()
+            assert legacy_result[0] == current_result["total_income_cents"]
+            assert legacy_result[1] == current_result["total_expense_cents"]
+            t_legacy = timed(legacy, args.repeat)
+            t_current = timed(current, args.repeat)
+            print(f"{name:8s} extract: {t_legacy * 1000:9.2f} ms   actual: {t_current * 1000:9.2f} ms   "
+                  f"x{t_legacy / t_current:.1f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Comprueba que la caché de reportes no sirve datos anteriores a un commit.
+
+Carrera de una lectura con una escritura: una lectura del reporte mensual
+empieza (lee versiones y datos) antes de que otra sesión confirme un alta
+en ese mes y guarda su resultado después del commit y de su invalidación.
+La siguiente lectura debe ver el alta, no lo guardado por la lectura lenta.
+
+Caché de otro worker y ETag: con el backend ``memory`` cada worker tiene su
+caché y la invalidación de una escritura solo llega a la del worker que la
+hizo. Tras un alta hecha en "otro worker", un GET condicional con el ETag
+anterior debe devolver 200 con el alta (no el cuerpo cacheado antes junto a
+un ETag nuevo) y el siguiente, con el ETag nuevo, 304.
+
+Uso (desde ``backend/``):
+    python benchmarks/cache_consistency.py
+"""
+import datetime
+import os
+import sys
+import tempfile
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_cache_consistency.db")
+for path in (DB_PATH, DB_PATH + "-wal", DB_PATH + "-shm"):
+    if os.path.exists(path):
+        os.remove(path)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["CACHE_BACKEND"] = "memory"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import cache  # noqa: E402
+import crud  # noqa: E402
+import main  # noqa: E402
+import schemas  # noqa: E402
+from database import SessionLocal  # noqa: E402
+
+DAY = datetime.datetime(2024, 3, 10)
+
+
+class PausedSet:
+    """Backend que retiene el primer set hasta que se le indique."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.reached = threading.Event()
+        self.release = threading.Event()
+
+    def get(self, key):
+        return self.inner.get(key)
+
+    def set(self, key, value, tags):
+        if not self.reached.is_set():
+            self.reached.set()
+            self.release.wait()
+        self.inner.set(key, value, tags)
+
+    def invalidate(self, tags):
+        self.inner.invalidate(tags)
+
+    def clear(self):
+        self.inner.clear()
+
+
+def add_income(amount):
+    with SessionLocal() as db:
+        crud.create_transaction(db, schemas.TransactionCreate(
+            account_id=account_id, amount=amount, type="income", date=DAY, description="caché"
+        ))
+
+
+def monthly_income():
+    with SessionLocal() as db:
+        return crud.get_monthly_report(db, year=2024, month=3)["total_income_cents"]
+
+
+def check_read_write_race(errors):
+    before = monthly_income()
+    paused = PausedSet(cache.backend)
+    cache.backend.clear()
+    cache.backend = paused
+    slow = threading.Thread(target=monthly_income)
+    slow.start()
+    try:
+        # La lectura lenta ya tiene su resultado (sin el alta) y espera para guardarlo
+        paused.reached.wait()
+        add_income(10)
+    finally:
+        paused.release.set()
+        slow.join()
+        cache.backend = paused.inner
+    after = monthly_income()
+    if after != before + 1000:
+        errors.append(f"Lectura tras la carrera: {after} céntimos, se esperaba {before + 1000}")
+
+
+def check_other_worker_etag(errors):
+    client = TestClient(main.app)
+    params = {"year": 2024, "month": 3}
+    first = client.get("/api/reports/monthly", params=params)
+    this_worker = cache.backend
+    # El alta la atiende otro worker: su invalidación no llega a esta caché
+    cache.backend = cache.MemoryBackend(cache.CACHE_MAX_ENTRIES, cache.CACHE_TTL)
+    try:
+        add_income(20)
+    finally:
+        cache.backend = this_worker
+    revalidated = client.get("/api/reports/monthly", params=params, headers={"If-None-Match": first.headers["ETag"]})
+    if revalidated.status_code != 200 or revalidated.json()["total_income"] != first.json()["total_income"] + 20:
+        errors.append(f"Revalidación tras escribir en otro worker: HTTP {revalidated.status_code}, {revalidated.text}")
+        return
+    again = client.get("/api/reports/monthly", params=params, headers={"If-None-Match": revalidated.headers["ETag"]})
+    if again.status_code != 304:
+        errors.append(f"ETag nuevo sin cambios: HTTP {again.status_code}")
+
+
+if __name__ == "__main__":
+    with SessionLocal() as db:
+        account_id = crud.create_account(db, schemas.AccountCreate(name="caché", balance=0)).id
+    add_income(5)
+
+    errors = []
+    check_read_write_race(errors)
+    check_other_worker_etag(errors)
+    for error in errors:
+        print(f"ERROR: {error}")
+    if not errors:
+        print("La caché no sirve datos anteriores a un commit ni cuerpos atrasados con un ETag nuevo.")
+    sys.exit(1 if errors else 0)
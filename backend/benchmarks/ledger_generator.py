@@ -0,0 +1,152 @@
+"""
+Generador reproducible de libros sintéticos para benchmarks.
+
+Crea cuentas, categorías, ingresos, gastos y transferencias con una semilla
+fija, deja los balances coherentes con el libro y regenera los rollups y
+el índice de búsqueda.
+BORRA Y RECREA LAS TABLAS de la base indicada: usar solo con bases de
+benchmark.
+
+Uso (desde ``backend/``):
+    python benchmarks/ledger_generator.py --size 1m
+    python benchmarks/ledger_generator.py --size 10k --database-url postgresql://localhost/ingresos_bench
+    python benchmarks/ledger_generator.py --size 1m --database-url postgresql://localhost/ingresos_bench --partitioned
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SIZES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+ACCOUNTS = (
+    ("Cuenta corriente", "Banco"), ("Ahorros", "Banco"), ("Tarjeta de crédito", "Tarjeta"),
+    ("Efectivo", "Efectivo"), ("Inversiones", "Inversión"), ("Cuenta conjunta", "Banco"),
+)
+
+# (categoría, tipo, descripciones, importe medio)
+CATEGORIES = (
+    ("Nómina", "income", ("Nómina", "Paga extra"), 1800.0),
+    ("Otros ingresos", "income", ("Reembolso", "Venta", "Intereses"), 120.0),
+    ("Supermercado", "expense", ("Supermercado", "Mercado", "Panadería"), 45.0),
+    ("Vivienda", "expense", ("Alquiler", "Comunidad", "Reparación"), 600.0),
+    ("Servicios", "expense", ("Luz", "Agua", "Internet", "Teléfono"), 60.0),
+    ("Transporte", "expense", ("Gasolina", "Metro", "Taxi", "Parking"), 25.0),
+    ("Ocio", "expense", ("Restaurante", "Cine", "Concierto", "Bar"), 35.0),
+    ("Salud", "expense", ("Farmacia", "Dentista", "Seguro médico"), 70.0),
+)
+# Peso relativo de cada categoría al elegir un movimiento
+CATEGORY_WEIGHTS = (3, 2, 30, 4, 10, 15, 15, 5)
+TRANSFER_RATIO = 0.05
+
+
+def iter_rows(count, seed=42, start=datetime.datetime(2015, 1, 1), years=10, account_count=len(ACCOUNTS)):
+    """
+    Genera ``count`` filas de transactions como dicts en orden cronológico.
+    Cada transferencia aporta dos filas (salida y entrada).
+    """
+    rng = random.Random(seed)
+    span = years * 365 * 24 * 3600
+    step = span / max(count, 1)
+    produced = 0
+    while produced < count:
+        date = start + datetime.timedelta(seconds=produced * step + rng.random() * step)
+        if rng.random() < TRANSFER_RATIO and count - produced >= 2:
+            from_id, to_id = rng.sample(range(1, account_count + 1), 2)
+            amount_cents = round(rng.lognormvariate(5, 0.8) * 100)
+            yield {"description": "Transferencia", "amount_cents": amount_cents, "type": "transfer_out",
+                   "account_id": from_id, "to_account_id": None, "category_id": None, "date": date}
+            yield {"description": "Transferencia", "amount_cents": amount_cents, "type": "transfer_in",
+                   "account_id": to_id, "to_account_id": from_id, "category_id": None, "date": date}
+            produced += 2
+            continue
+        index = rng.choices(range(len(CATEGORIES)), weights=CATEGORY_WEIGHTS)[0]
+        _, type, descriptions, mean = CATEGORIES[index]
+        yield {
+            "description": rng.choice(descriptions),
+            "amount_cents": round(max(0.5, rng.gauss(mean, mean / 3)) * 100),
+            "type": type,
+            "account_id": rng.randint(1, account_count),
+            "to_account_id": None,
+            "category_id": index + 1,
+            "date": date,
+        }
+        produced += 1
+
+
+def generate_ledger(engine, session_factory, count, seed=42, batch_size=50_000, initial_balance_cents=500_000,
+                    partitioned=False):
+    """
+    Recrea las tablas y carga un libro de ``count`` transacciones. Con
+    partitioned (solo Postgres) convierte transactions en tabla particionada.
+    """
+    from sqlalchemy import case, func, insert, select, update
+
+    import crud
+    import models
+    import partitions
+    import search
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Account), [
+            {"name": name, "type": type, "balance_cents": initial_balance_cents,
+             "opening_balance_cents": initial_balance_cents}
+            for name, type in ACCOUNTS
+        ])
+        conn.execute(insert(models.Category), [{"name": category[0]} for category in CATEGORIES])
+
+        batch = []
+        for row in iter_rows(count, seed=seed):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                conn.execute(insert(models.Transaction), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.Transaction), batch)
+
+        # Balance = inicial + efecto de todas sus transacciones
+        delta = select(func.coalesce(func.sum(case(
+            (models.Transaction.type.in_(("income", "transfer_in")), models.Transaction.amount_cents),
+            else_=-models.Transaction.amount_cents
+        )), 0)).where(models.Transaction.account_id == models.Account.id).scalar_subquery()
+        conn.execute(update(models.Account).values(balance_cents=initial_balance_cents + delta))
+
+    if partitioned:
+        partitions.convert_to_partitioned(engine)
+    with session_factory() as db:
+        crud.rebuild_rollups(db)
+    search.rebuild_search_index(engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=SIZES, default="10k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=None, help="Por defecto, DATABASE_URL o la base SQLite local.")
+    parser.add_argument("--partitioned", action="store_true", help="Particionar transactions por mes (Postgres).")
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from database import SessionLocal, engine
+
+    started = time.perf_counter()
+    generate_ledger(engine, SessionLocal, SIZES[args.size], seed=args.seed, partitioned=args.partitioned)
+    print(f"{SIZES[args.size]} transacciones generadas en {time.perf_counter() - started:.1f}s "
+          f"({engine.url.render_as_string(hide_password=True)})")
+
+
+if __name__ == "__main__":
+    main()
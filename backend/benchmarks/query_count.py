@@ -0,0 +1,74 @@
+"""
+Comprueba que GET /api/accounts/ ejecuta un número constante de sentencias
+SQL sin importar cuántas cuentas haya (sin N+1).
+
+Uso (desde ``backend/``):
+    python benchmarks/query_count.py
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_query_count.db")
+if os.path.exists(DB_PATH):
+    os.remove(DB_PATH)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import main  # noqa: E402
+from database import engine  # noqa: E402
+
+ACCOUNT_COUNTS = (1, 10, 50)
+ENDPOINTS = (
+    ("/api/accounts/", {}),
+    ("/api/accounts/", {"fields": "summary"}),
+    ("/api/categories/", {"fields": "full"}),
+)
+
+statements = []
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+def count_statements(client, path, params):
+    statements.clear()
+    response = client.get(path, params=params)
+    response.raise_for_status()
+    return len(statements)
+
+
+def run():
+    client = TestClient(main.app)
+    created = 0
+    results = {}
+    for target in ACCOUNT_COUNTS:
+        while created < target:
+            created += 1
+            account = client.post("/api/accounts/", json={"name": f"Cuenta {created}", "balance": 0}).json()
+            category = client.post("/api/categories/", json={"name": f"Categoría {created}"}).json()
+            for _ in range(3):
+                client.post("/api/transactions/", json={
+                    "account_id": account["id"], "amount": 10, "type": "expense", "category_id": category["id"]
+                })
+        for path, params in ENDPOINTS:
+            results.setdefault((path, tuple(params.items())), []).append(count_statements(client, path, params))
+
+    ok = True
+    for (path, params), counts in results.items():
+        constant = len(set(counts)) == 1
+        ok = ok and constant
+        label = path + ("?" + "&".join(f"{k}={v}" for k, v in params) if params else "")
+        print(f"{label:35s} cuentas={ACCOUNT_COUNTS} sentencias={counts} {'OK' if constant else 'N+1'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,191 @@
+"""
+Suite de benchmarks de la API contra un libro sintético.
+
+Genera el libro con ``ledger_generator`` y ejecuta la app FastAPI real en
+proceso (TestClient) midiendo latencia y sentencias SQL de: listado de
+cuentas, cada reporte, historial de balances, listado y búsqueda de transacciones, alta/edición/borrado de
+transacciones y transferencias. El resultado es JSON para comparar commits.
+
+Uso (desde ``backend/``):
+    python benchmarks/run_suite.py --size 10k --output resultados.json
+    python benchmarks/run_suite.py --size 1m --database-url postgresql://localhost/ingresos_bench
+    python benchmarks/run_suite.py --size 10k --baseline resultados_main.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Por encima de este tamaño no se mide el listado completo con transacciones
+FULL_LISTING_MAX_ROWS = 100_000
+
+
+def parse_args():
+    import ledger_generator
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=ledger_generator.SIZES, default="10k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=None, help="Por defecto, una base SQLite temporal.")
+    parser.add_argument("--reuse", action="store_true", help="No regenerar el libro (misma base y tamaño).")
+    parser.add_argument("--repeat", type=int, default=20, help="Iteraciones por escenario.")
+    parser.add_argument("--output", default=None, help="Fichero JSON de salida (por defecto, stdout).")
+    parser.add_argument("--baseline", default=None, help="JSON de una ejecución anterior para comparar.")
+    return parser.parse_args()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_scenarios(client, rows):
+    """Lista de (nombre, función) que ejecutan una petición cada vez."""
+    state = {"transaction_ids": []}
+    account_ids = [account["id"] for account in client.get("/api/accounts/", params={"fields": "summary"}).json()]
+
+    def get(path, **params):
+        return lambda: client.get(path, params=params)
+
+    def create_transaction():
+        response = client.post("/api/transactions/", json={
+            "account_id": account_ids[0], "amount": 12.5, "type": "expense",
+            "category_id": 3, "description": "benchmark",
+        })
+        state["transaction_ids"].append(response.json()["id"])
+        return response
+
+    def update_transaction():
+        return client.put(f"/api/transactions/{state['transaction_ids'][-1]}", json={"amount": 13.0})
+
+    def delete_transaction():
+        return client.delete(f"/api/transactions/{state['transaction_ids'].pop()}")
+
+    def transfer():
+        return client.post("/api/transfers/", json={
+            "from_account_id": account_ids[0], "to_account_id": account_ids[1], "amount": 1.0,
+        })
+
+    scenarios = [
+        ("accounts_summary", get("/api/accounts/", fields="summary")),
+        ("categories", get("/api/categories/")),
+        ("report_monthly", get("/api/reports/monthly", year=2020, month=6)),
+        ("report_daily", get("/api/reports/daily", year=2020, month=6, day=15)),
+        ("report_categorized_expenses", get("/api/reports/categorized_expenses", year=2020, month=6)),
+        ("report_timeseries_12m", get("/api/reports/timeseries", start="2020-01-01", end="2021-01-01")),
+        ("report_pivot_category_month_5y", get("/api/reports/pivot", start="2020-01-01", end="2025-01-01")),
+        ("account_balance_at", get(f"/api/accounts/{account_ids[0]}/balance", date="2018-06-15")),
+        ("account_balance_history_90d", get(
+            f"/api/accounts/{account_ids[0]}/balance_history", start="2018-06-01", end="2018-08-30"
+        )),
+        ("transactions_page", get("/api/transactions/", limit=50)),
+        ("transactions_page_account", get("/api/transactions/", account_id=account_ids[0], limit=50)),
+        ("transactions_search", get("/api/transactions/search", q="seguro medico", limit=50)),
+        ("transactions_search_account_year", get(
+            "/api/transactions/search", q="farmacia", account_id=account_ids[0],
+            date_from="2020-01-01T00:00:00", date_to="2021-01-01T00:00:00", limit=50
+        )),
+        ("transaction_create", create_transaction),
+        ("transaction_update", update_transaction),
+        ("transaction_delete", delete_transaction),
+        ("transfer_create", transfer),
+    ]
+    if rows <= FULL_LISTING_MAX_ROWS:
+        scenarios.insert(0, ("accounts_full", get("/api/accounts/")))
+    return scenarios
+
+
+def measure(fn, repeat, statements):
+    timings = []
+    counts = []
+    for _ in range(repeat):
+        statements.clear()
+        started = time.perf_counter()
+        response = fn()
+        timings.append(time.perf_counter() - started)
+        counts.append(len(statements))
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+    timings.sort()
+    return {
+        "n": repeat,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "statements": max(counts),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.database_url is None:
+        args.database_url = f"sqlite:///{os.path.join(tempfile.gettempdir(), f'bench_suite_{args.size}.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+
+    import ledger_generator
+    from sqlalchemy import event
+    from database import SessionLocal, engine
+
+    rows = ledger_generator.SIZES[args.size]
+    if not args.reuse:
+        started = time.perf_counter()
+        ledger_generator.generate_ledger(engine, SessionLocal, rows, seed=args.seed)
+        print(f"Libro de {rows} filas generado en {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    from fastapi.testclient import TestClient
+    import main as api
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *event_args: statements.append(event_args[2]))
+
+    client = TestClient(api.app)
+    results = {}
+    for name, fn in build_scenarios(client, rows):
+        fn()  # calentamiento
+        results[name] = measure(fn, args.repeat, statements)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "size": args.size,
+        "rows": rows,
+        "seed": args.seed,
+        "results": results,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    for name, result in results.items():
+        line = f"{name:30s} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  sql {result['statements']:3d}"
+        if baseline and name in baseline:
+            line += f"  x{baseline[name]['p50_ms'] / result['p50_ms']:.2f} vs base"
+        print(line, file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
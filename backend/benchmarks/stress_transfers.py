@@ -0,0 +1,155 @@
+"""
+Prueba de carga concurrente de transferencias.
+
+Lanza miles de ``crud.create_transfer`` desde varios hilos, cada uno con su
+propia sesión, y al final comprueba que:
+  * la suma de balances de las cuentas de la prueba no ha cambiado,
+  * el balance de cada cuenta coincide con su libro de transacciones,
+  * los rollups diarios coinciden con el libro.
+
+Solo toca cuentas creadas para la ejecución (nombre ``stress-<id>-N``), así
+que puede lanzarse contra una base Postgres local existente.
+
+Uso (desde ``backend/``):
+    python benchmarks/stress_transfers.py                      # SQLite temporal
+    python benchmarks/stress_transfers.py --database-url postgresql://localhost/ingresos_bench
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Por defecto, una base SQLite temporal nueva.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--transfers", type=int, default=2000, help="Total de transferencias entre todos los hilos.")
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--initial-balance", type=float, default=1000.0)
+    parser.add_argument("--max-retries", type=int, default=20)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.database_url is None:
+        db_path = os.path.join(tempfile.gettempdir(), "bench_stress.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        args.database_url = f"sqlite:///{db_path}"
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import func, case
+    from sqlalchemy.exc import OperationalError, DBAPIError
+
+    import crud
+    import models
+    import schemas
+    import search
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_search_index(engine)
+    run_id = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        account_ids = [
+            crud.create_account(db, schemas.AccountCreate(
+                name=f"stress-{run_id}-{i}", balance=args.initial_balance
+            )).id
+            for i in range(args.accounts)
+        ]
+
+    per_thread = [args.transfers // args.threads] * args.threads
+    for i in range(args.transfers % args.threads):
+        per_thread[i] += 1
+    stats = {"ok": 0, "retries": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def worker(seed, count):
+        rng = random.Random(seed)
+        db = SessionLocal()
+        try:
+            for _ in range(count):
+                from_id, to_id = rng.sample(account_ids, 2)
+                transfer = schemas.TransferCreate(
+                    from_account_id=from_id, to_account_id=to_id,
+                    amount=round(rng.uniform(0.01, 50), 2), description="stress"
+                )
+                for attempt in range(args.max_retries + 1):
+                    try:
+                        crud.create_transfer(db, transfer)
+                        with lock:
+                            stats["ok"] += 1
+                        break
+                    except (OperationalError, DBAPIError):
+                        # SQLite ocupado / interbloqueo detectado por Postgres
+                        db.rollback()
+                        with lock:
+                            stats["retries"] += 1
+                        time.sleep(rng.uniform(0, 0.01) * (attempt + 1))
+                else:
+                    with lock:
+                        stats["failed"] += 1
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker, args=(seed, count)) for seed, count in enumerate(per_thread)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    errors = []
+    with SessionLocal() as db:
+        balances = dict(
+            db.query(models.Account.id, models.Account.balance_cents)
+            .filter(models.Account.id.in_(account_ids))
+        )
+        # Céntimos enteros: la suma se conserva exactamente
+        expected_total = schemas.to_cents(args.initial_balance) * len(account_ids)
+        if sum(balances.values()) != expected_total:
+            errors.append(f"Suma de balances {sum(balances.values())} != {expected_total} céntimos")
+
+        ledger = dict(
+            db.query(
+                models.Transaction.account_id,
+                func.sum(case(
+                    (models.Transaction.type == "transfer_in", models.Transaction.amount_cents),
+                    else_=-models.Transaction.amount_cents
+                ))
+            ).filter(models.Transaction.account_id.in_(account_ids))
+            .group_by(models.Transaction.account_id)
+        )
+        for account_id, balance in balances.items():
+            expected = schemas.to_cents(args.initial_balance) + int(ledger.get(account_id) or 0)
+            if balance != expected:
+                errors.append(f"Cuenta {account_id}: balance {balance} != libro {expected} céntimos")
+
+        mismatches = [m for m in crud.check_rollups(db) if m["account_id"] in balances]
+        if mismatches:
+            errors.append(f"{len(mismatches)} rollups no coinciden con el libro")
+
+    print(f"Base de datos: {engine.url.render_as_string(hide_password=True)}")
+    print(
+        f"{stats['ok']} transferencias en {elapsed:.2f}s con {args.threads} hilos "
+        f"({stats['ok'] / elapsed:.0f}/s), {stats['retries']} reintentos, {stats['failed']} fallidas"
+    )
+    for error in errors:
+        print(f"ERROR: {error}")
+    if not errors:
+        print("Balances, libro y rollups consistentes.")
+    return 1 if errors or stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
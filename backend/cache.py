@@ -0,0 +1,270 @@
+"""
+Caché de lectura para búsquedas y reportes con invalidación por escrituras.
+
+Cada entrada lleva etiquetas (por ejemplo ``month:2024-03`` o ``categories``).
+Las funciones de crud que modifican datos marcan en la sesión qué etiquetas
+afectan. Cada etiqueta tiene además una versión en table_versions (fila
+``cache:<etiqueta>``) que crud incrementa antes del commit, en la misma
+transacción que los datos, y la clave de cada entrada incluye las versiones
+de sus etiquetas leídas en la sesión antes de calcularla. Así una entrada
+solo se sirve a quien ve en la base exactamente esas versiones:
+  * una lectura que empezó antes de un commit y guarda su resultado después
+    lo guarda con las versiones antiguas, que nadie vuelve a pedir;
+  * lo cacheado por otro worker (backend ``memory``) deja de servirse en
+    cuanto se confirma la escritura, sin esperar al TTL;
+  * una réplica de lectura atrasada (replica.py) lee sus propias versiones:
+    lo que guarda solo lo reutiliza quien ve esas mismas versiones, en ella
+    o en el primario, y deja de servirse cuando la réplica se pone al día.
+Invalidar al confirmar solo libera antes las entradas que ya no se pedirán.
+
+Backends (CACHE_BACKEND):
+  * ``memory`` (por defecto): LRU en proceso con TTL, una por worker.
+  * ``redis``: compartida entre workers (CACHE_URL, requiere ``redis``).
+  * ``none``: sin caché (ni consulta de versiones).
+"""
+import functools
+import inspect
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+import models
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+
+_MISSING = object()
+
+# Filas de table_versions de las etiquetas; EPOCH (clear_on_commit) entra en todas las claves
+VERSION_PREFIX = "cache:"
+EPOCH = VERSION_PREFIX + "*"
+
+
+class MemoryBackend:
+    """LRU con TTL en proceso, seguro entre hilos."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # clave -> (caduca, valor, etiquetas)
+        self._tags = {} # etiqueta -> claves
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, tags):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """Caché compartida en Redis; cada etiqueta es un set con sus claves."""
+
+    prefix = "ingresos_gastos:cache:"
+
+    def __init__(self, url: str, ttl: float):
+        import redis # Dependencia opcional
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + repr(key))
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, tags):
+        name = self.prefix + repr(key)
+        pipeline = self.client.pipeline()
+        pipeline.set(name, pickle.dumps(value), ex=self.ttl)
+        for tag in tags:
+            pipeline.sadd(self.prefix + "tag:" + tag, name)
+            pipeline.expire(self.prefix + "tag:" + tag, self.ttl)
+        pipeline.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_name = self.prefix + "tag:" + tag
+            names = self.client.smembers(tag_name)
+            if names:
+                self.client.delete(*names)
+            self.client.delete(tag_name)
+
+    def clear(self):
+        names = list(self.client.scan_iter(self.prefix + "*"))
+        if names:
+            self.client.delete(*names)
+
+
+class NullBackend:
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value, tags):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+def _make_backend():
+    if CACHE_BACKEND == "redis":
+        return RedisBackend(CACHE_URL, CACHE_TTL)
+    if CACHE_BACKEND == "none":
+        return NullBackend()
+    return MemoryBackend(CACHE_MAX_ENTRIES, CACHE_TTL)
+
+
+backend = _make_backend()
+
+# Aciertos y fallos por espacio de nombres
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _count(namespace, hit):
+    with _stats_lock:
+        hits, misses = _stats.get(namespace, (0, 0))
+        _stats[namespace] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+
+def stats():
+    """{namespace: {"hits": n, "misses": n}}"""
+    with _stats_lock:
+        return {namespace: {"hits": hits, "misses": misses} for namespace, (hits, misses) in _stats.items()}
+
+
+def _tag_versions(db: Session, tags):
+    """Versiones de las etiquetas (y de EPOCH) en table_versions; las que no tienen fila no aparecen."""
+    names = [EPOCH, *(VERSION_PREFIX + tag for tag in tags)]
+    rows = db.execute(
+        select(models.TableVersion.name, models.TableVersion.version).where(models.TableVersion.name.in_(names))
+    )
+    return tuple(sorted(rows.tuples()))
+
+
+def cached(namespace, tags=lambda **arguments: ()):
+    """
+    Decorador para funciones de crud ``fn(db, ...)``. La clave son los
+    argumentos salvo ``db`` y las versiones de las etiquetas leídas en esa
+    sesión antes de llamar a ``fn``; ``tags`` recibe los argumentos por
+    nombre. El valor cacheado debe ser independiente de la sesión (dicts,
+    no objetos ORM).
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(db, *args, **kwargs):
+            if isinstance(backend, NullBackend):
+                _count(namespace, False)
+                return fn(db, *args, **kwargs)
+            bound = signature.bind(db, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name != "db"}
+            entry_tags = tuple(tags(**arguments))
+            # Antes que los datos: lo que fn lea será al menos igual de reciente
+            key = (namespace, fn.__name__, tuple(sorted(arguments.items())), _tag_versions(db, entry_tags))
+            value = backend.get(key)
+            if value is not _MISSING:
+                _count(namespace, True)
+                return value
+            _count(namespace, False)
+            value = fn(db, *args, **kwargs)
+            backend.set(key, value, entry_tags)
+            return value
+        return wrapper
+    return decorator
+
+
+def month_tag(year: int, month: int) -> str:
+    return f"month:{year:04d}-{month:02d}"
+
+
+def month_tags(start, end):
+    """Etiquetas de todos los meses que solapan [start, end)."""
+    year, month = start.year, start.month
+    while (year, month) < (end.year, end.month) or (year, month) == (end.year, end.month) and end.day > 1:
+        yield month_tag(year, month)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def invalidate_on_commit(db: Session, *tags):
+    """Marca etiquetas a invalidar cuando la sesión confirme; se descartan si hace rollback."""
+    db.info.setdefault("cache_invalidations", set()).update(tags)
+
+
+def clear_on_commit(db: Session):
+    db.info["cache_clear"] = True
+
+
+def versions_to_bump(session: Session):
+    """Filas de table_versions que crud incrementa antes del commit por las etiquetas marcadas."""
+    if session.info.get("cache_clear"):
+        return {EPOCH}
+    return {VERSION_PREFIX + tag for tag in session.info.get("cache_invalidations", ())}
+
+
+# after_commit/after_rollback también se emiten al liberar o deshacer un
+# savepoint (begin_nested); solo cuenta la transacción principal
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.in_nested_transaction():
+        return
+    tags = session.info.pop("cache_invalidations", None)
+    if session.info.pop("cache_clear", False):
+        backend.clear()
+    elif tags:
+        backend.invalidate(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("cache_invalidations", None)
+    session.info.pop("cache_clear", None)
@@ -0,0 +1,124 @@
+"""
+Feed de cambios para clientes (Server-Sent Events).
+
+crud escribe los eventos en la tabla change_events dentro de la misma
+transacción que el cambio, con números de secuencia asignados en orden de
+commit, así que cualquier worker puede servirlos y un cliente que se
+reconecta continúa desde su último id (cabecera Last-Event-ID o ?since=).
+
+Los streams de este proceso se despiertan nada más confirmar una escritura
+local; los cambios de otros workers se recogen sondeando cada
+CHANGEFEED_POLL_SECONDS.
+
+Coste: la secuencia sale de la fila "changes" de table_versions, que toda
+escritura incrementa junto con las de sus tablas ("transactions", ...) y
+las "cache:<etiqueta>" de la caché. Esas pocas filas globales quedan
+bloqueadas desde ese incremento hasta el commit, así que las escrituras
+concurrentes se serializan en ese último tramo. Es lo que garantiza que el
+orden de seq sea el de commit (un cliente nunca ve el evento N+1 antes que
+el N) y se acota haciéndolo lo más tarde posible y en una sola sentencia
+(UPDATE ... RETURNING en orden fijo, ver crud._bump_table_versions). Una
+secuencia del motor evitaría el bloqueo, pero sus números salen en orden de
+reserva y no de commit.
+"""
+import asyncio
+import json
+import os
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+CHANGEFEED_POLL_SECONDS = float(os.getenv("CHANGEFEED_POLL_SECONDS", "1.0"))
+HEARTBEAT_SECONDS = 15.0
+RETRY_MS = 3000
+PAGE_SIZE = 500
+
+
+class Notifier:
+    """Despierta a los streams en espera; notify() se puede llamar desde cualquier hilo."""
+
+    def __init__(self):
+        self._waiters = set() # (loop, asyncio.Event)
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        return waiter
+
+    def unsubscribe(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, waiter_event in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter_event.set)
+            except RuntimeError: # bucle ya cerrado
+                self.unsubscribe((loop, waiter_event))
+
+
+notifier = Notifier()
+
+
+def notify_on_commit(db: Session):
+    """Avisa a los streams locales cuando la sesión confirme."""
+    db.info["changefeed_notify"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.in_nested_transaction():
+        return
+    if session.info.pop("changefeed_notify", False):
+        notifier.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("changefeed_notify", None)
+
+
+def format_event(seq, kind, data):
+    return f"id: {seq}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def event_stream(read_changes, since, is_disconnected):
+    """
+    Generador SSE. ``read_changes(since, limit)`` es una corrutina que devuelve
+    el resultado de crud.get_changes. Si los eventos posteriores a ``since``
+    ya se purgaron se envía un evento ``reset``: el cliente debe recargar
+    el estado completo y seguir desde ``last_seq``.
+    """
+    waiter = notifier.subscribe()
+    _, wakeup = waiter
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        idle = 0.0
+        while not await is_disconnected():
+            wakeup.clear()
+            page = await read_changes(since, PAGE_SIZE)
+            if page["reset"]:
+                yield format_event(page["last_seq"], "reset", {"last_seq": page["last_seq"]})
+            for change in page["events"]:
+                yield format_event(change["seq"], change["kind"], change)
+            if page["events"] or page["reset"]:
+                idle = 0.0
+            since = page["last_seq"]
+            if len(page["events"]) == PAGE_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=CHANGEFEED_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                idle += CHANGEFEED_POLL_SECONDS
+                if idle >= HEARTBEAT_SECONDS:
+                    idle = 0.0
+                    yield ": ping\n\n"
+    finally:
+        notifier.unsubscribe(waiter)
@@ -1,8 +1,195 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 import models
 import schemas
+import cache
+import changefeed
+import idempotency
+import partitions
+import search
+import base64
+import json
 import datetime # Added for datetime.datetime.now()
-from sqlalchemy import func, extract # Added for reports
+import bisect
+from sqlalchemy import func, case, insert, update, delete, select, Date, and_, or_ # Added for reports
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import event, bindparam, text
+
+# --- Versiones de tablas (ETags) ---
+
+# "changes" es el contador de secuencia del feed de cambios
+VERSIONED_TABLES = ("accounts", "categories", "changes", "transactions")
+
+def ensure_table_versions(db: Session):
+    """Crea las filas de table_versions que falten."""
+    existing = {name for (name,) in db.query(models.TableVersion.name)}
+    for name in VERSIONED_TABLES:
+        if name not in existing:
+            db.add(models.TableVersion(name=name, version=0))
+    db.commit()
+
+def get_table_versions(db: Session, names):
+    """Devuelve {tabla: versión} con una consulta por clave primaria."""
+    return dict(
+        db.query(models.TableVersion.name, models.TableVersion.version)
+        .filter(models.TableVersion.name.in_(names))
+    )
+
+def _touch(db: Session, *names):
+    """Marca tablas modificadas; su versión se incrementa justo antes del commit."""
+    db.info.setdefault("touched_tables", set()).update(names)
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    # También se emite al liberar un savepoint: solo cuenta el commit principal
+    if session.in_nested_transaction():
+        return
+    _bump_table_versions(session)
+    _write_change_events(session)
+
+def _version_bump(steps):
+    """UPDATE que suma ``steps[nombre]`` a cada fila de table_versions indicada."""
+    larger = {name: n for name, n in steps.items() if n != 1}
+    step = case(larger, value=models.TableVersion.name, else_=1) if larger else 1
+    return (
+        update(models.TableVersion)
+        .where(models.TableVersion.name.in_(sorted(steps)))
+        .values(version=models.TableVersion.version + step)
+        .execution_options(synchronize_session=False)
+    )
+
+def _bump_table_versions(session):
+    # También las versiones de las etiquetas de caché invalidadas (ver cache.py)
+    names = session.info.pop("touched_tables", set()) | cache.versions_to_bump(session)
+    if not names:
+        return
+    # "changes" avanza un número por evento pendiente: son sus secuencias
+    events = len(session.info.get("pending_changes", ()))
+    steps = {name: max(events, 1) if name == "changes" else 1 for name in names}
+    # Al final de la transacción: el bloqueo de las filas dura lo mínimo y
+    # siempre se toma después de los de accounts
+    if session.get_bind().dialect.update_returning:
+        # Una sola sentencia para todas las filas. Se bloquean antes en orden
+        # fijo (FOR UPDATE ordenado en una CTE; SQLite lo ignora porque ya
+        # serializa las escrituras) para que dos escrituras no se crucen
+        locked = (
+            select(models.TableVersion.name)
+            .where(models.TableVersion.name.in_(sorted(steps)))
+            .order_by(models.TableVersion.name)
+            .with_for_update()
+            .cte("locked")
+        )
+        bump = (
+            _version_bump(steps)
+            .where(models.TableVersion.name.in_(select(locked.c.name)))
+            .returning(models.TableVersion.name, models.TableVersion.version)
+        )
+        versions = dict(session.execute(bump).all())
+    else:
+        versions = {}
+        for name in sorted(steps):
+            if session.execute(_version_bump({name: steps[name]})).rowcount:
+                versions[name] = None # se lee después si hace falta
+    for name in sorted(steps.keys() - versions.keys()):
+        # Base sin ensure_table_versions: se crea la fila (o se reintenta si
+        # otra transacción la creó a la vez)
+        try:
+            with session.begin_nested():
+                session.execute(insert(models.TableVersion).values(name=name, version=steps[name]))
+            versions[name] = steps[name]
+        except IntegrityError:
+            session.execute(_version_bump({name: steps[name]}))
+            versions[name] = None
+    # Último número reservado para el feed (None: _write_change_events lo lee)
+    session.info["changes_seq"] = versions.get("changes")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("touched_tables", None)
+    session.info.pop("pending_changes", None)
+    session.info.pop("changes_seq", None)
+
+# --- Feed de cambios ---
+
+# Eventos que se conservan; un cliente más atrasado recibe un "reset"
+CHANGE_EVENTS_RETENTION = 10_000
+
+def _record_change(db: Session, kind: str, account_ids, transactions=(), **payload):
+    """
+    Registra un evento para escribirlo al confirmar. ``transactions`` son
+    objetos ORM o filas Core: se serializan tras el flush final, cuando ya
+    tienen id. El evento incluye el estado final de las cuentas afectadas.
+    """
+    _touch(db, "changes")
+    db.info.setdefault("pending_changes", []).append((kind, set(account_ids), list(transactions), payload))
+
+def _write_change_events(session):
+    pending = session.info.pop("pending_changes", None)
+    last_seq = session.info.pop("changes_seq", None)
+    if not pending:
+        return
+    session.flush()
+    # _bump_table_versions ya reservó un número por evento en la fila
+    # "changes", que queda bloqueada hasta el commit: las secuencias salen en
+    # orden de commit
+    if last_seq is None:
+        last_seq = session.execute(
+            select(models.TableVersion.version).where(models.TableVersion.name == "changes")
+        ).scalar_one()
+    first_seq = last_seq - len(pending) + 1
+    account_ids = set().union(*(ids for _, ids, _, _ in pending))
+    accounts = {
+        account.id: schemas.AccountSummary.model_validate(account).model_dump(mode="json")
+        for account in session.execute(
+            select(models.Account).where(models.Account.id.in_(account_ids))
+            .execution_options(populate_existing=True)
+        ).scalars()
+    }
+    now = datetime.datetime.now()
+    rows = []
+    for offset, (kind, ids, transactions, payload) in enumerate(pending):
+        data = dict(payload)
+        if transactions:
+            data["transactions"] = [
+                schemas.Transaction.model_validate(t).model_dump(mode="json") for t in transactions
+            ]
+        data["accounts"] = [accounts[id] for id in sorted(ids) if id in accounts]
+        rows.append({"seq": first_seq + offset, "created_at": now, "kind": kind, "payload": json.dumps(data)})
+    session.execute(insert(models.ChangeEvent), rows)
+    newest = rows[-1]["seq"]
+    if newest // 500 != (first_seq - 1) // 500:
+        # Purga ocasional (cada 500 eventos) de los que exceden la retención
+        session.execute(delete(models.ChangeEvent).where(models.ChangeEvent.seq <= newest - CHANGE_EVENTS_RETENTION))
+    changefeed.notify_on_commit(session)
+
+def get_changes(db: Session, since, limit: int = 500):
+    """
+    Eventos con seq > since. Devuelve {"events", "last_seq", "reset"}:
+    last_seq es el último evento devuelto (o el más reciente si no hay) y
+    reset indica que faltan eventos purgados y el cliente debe recargar todo.
+    Sin since solo devuelve la secuencia actual.
+    """
+    latest = db.execute(
+        select(models.TableVersion.version).where(models.TableVersion.name == "changes")
+    ).scalar() or 0
+    if since is None:
+        return {"events": [], "last_seq": latest, "reset": False}
+    if since > latest:
+        return {"events": [], "last_seq": latest, "reset": True}
+    rows = db.execute(
+        select(models.ChangeEvent)
+        .where(models.ChangeEvent.seq > since)
+        .order_by(models.ChangeEvent.seq)
+        .limit(limit)
+    ).scalars().all()
+    if since < latest and (not rows or rows[0].seq != since + 1):
+        return {"events": [], "last_seq": latest, "reset": True}
+    events = [
+        {"seq": row.seq, "kind": row.kind, "created_at": row.created_at.isoformat(), **json.loads(row.payload)}
+        for row in rows
+    ]
+    return {"events": events, "last_seq": events[-1]["seq"] if events else latest, "reset": False}
 
 # --- Funciones CRUD para Cuentas (Accounts) ---
 
@@ -12,18 +199,41 @@ def get_account(db: Session, account_id: int):
     """Obtiene una cuenta por su ID."""
     return db.query(models.Account).filter(models.Account.id == account_id).first()
 
+@cache.cached("lookups", tags=lambda name: ("accounts",))
+def _account_id_by_name(db: Session, name: str):
+    row = db.query(models.Account.id).filter(models.Account.name == name).first()
+    return row[0] if row else None
+
 def get_account_by_name(db: Session, name: str):
-    """Obtiene una cuenta por su nombre."""
-    return db.query(models.Account).filter(models.Account.name == name).first()
+    """
+    Obtiene una cuenta por su nombre. El id se cachea, así que comprobar un
+    nombre inexistente solo consulta table_versions.
+    """
+    account_id = _account_id_by_name(db, name)
+    return None if account_id is None else get_account(db, account_id)
 
-def get_accounts(db: Session, skip: int = 0, limit: int = 100):
-    """Obtiene todas las cuentas."""
-    return db.query(models.Account).offset(skip).limit(limit).all()
+def get_accounts(db: Session, skip: int = 0, limit: int = 100, include_transactions: bool = False):
+    """
+    Obtiene todas las cuentas. Con include_transactions se cargan sus
+    transacciones en una única consulta adicional (selectinload) en lugar de
+    una consulta perezosa por cuenta.
+    """
+    query = db.query(models.Account).order_by(models.Account.id)
+    if include_transactions:
+        query = query.options(selectinload(models.Account.transactions))
+    return query.offset(skip).limit(limit).all()
 
 def create_account(db: Session, account: schemas.AccountCreate):
     """Crea una nueva cuenta."""
-    db_account = models.Account(name=account.name, balance=account.balance, type=account.type)
+    db_account = models.Account(
+        name=account.name, balance_cents=account.balance_cents,
+        opening_balance_cents=account.balance_cents, type=account.type
+    )
     db.add(db_account)
+    db.flush() # id para el evento del feed
+    cache.invalidate_on_commit(db, "accounts")
+    _touch(db, "accounts")
+    _record_change(db, "account.created", [db_account.id])
     db.commit()
     db.refresh(db_account)
     return db_account
@@ -34,18 +244,51 @@ def get_category(db: Session, category_id: int):
     """Obtiene una categoría por su ID."""
     return db.query(models.Category).filter(models.Category.id == category_id).first()
 
+@cache.cached("lookups", tags=lambda name: ("categories",))
+def _category_id_by_name(db: Session, name: str):
+    row = db.query(models.Category.id).filter(models.Category.name == name).first()
+    return row[0] if row else None
+
 def get_category_by_name(db: Session, name: str):
-    """Obtiene una categoría por su nombre."""
-    return db.query(models.Category).filter(models.Category.name == name).first()
+    """Obtiene una categoría por su nombre (id cacheado, ver get_account_by_name)."""
+    category_id = _category_id_by_name(db, name)
+    return None if category_id is None else get_category(db, category_id)
 
+@cache.cached("categories", tags=lambda skip, limit: ("categories",))
 def get_categories(db: Session, skip: int = 0, limit: int = 100):
-    """Obtiene todas las categorías."""
-    return db.query(models.Category).offset(skip).limit(limit).all()
+    """Obtiene todas las categorías (como dicts, cacheadas)."""
+    return [
+        {"id": category_id, "name": name}
+        for category_id, name in db.query(models.Category.id, models.Category.name)
+        .order_by(models.Category.id).offset(skip).limit(limit)
+    ]
+
+def get_categories_with_stats(db: Session, skip: int = 0, limit: int = 100):
+    """
+    Obtiene las categorías con su número de transacciones, leído de
+    daily_rollups en la misma consulta.
+    """
+    counts = db.query(
+        models.DailyRollup.category_id,
+        func.sum(models.DailyRollup.count).label("transaction_count")
+    ).group_by(models.DailyRollup.category_id).subquery()
+    rows = db.query(
+        models.Category,
+        func.coalesce(counts.c.transaction_count, 0)
+    ).outerjoin(counts, counts.c.category_id == models.Category.id).order_by(
+        models.Category.id
+    ).offset(skip).limit(limit).all()
+    return [
+        {"id": category.id, "name": category.name, "transaction_count": int(transaction_count)}
+        for category, transaction_count in rows
+    ]
 
 def create_category(db: Session, category: schemas.CategoryCreate):
     """Crea una nueva categoría."""
     db_category = models.Category(name=category.name)
     db.add(db_category)
+    cache.invalidate_on_commit(db, "categories")
+    _touch(db, "categories")
     db.commit()
     db.refresh(db_category)
     return db_category
@@ -57,6 +300,8 @@ def update_category(db: Session, category_id: int, category_data: schemas.Catego
         return None
     if category_data.name is not None:
         db_category.name = category_data.name
+    cache.invalidate_on_commit(db, "categories")
+    _touch(db, "categories")
     db.commit()
     db.refresh(db_category)
     return db_category
@@ -67,6 +312,8 @@ def delete_category(db: Session, category_id: int):
     if not db_category:
         return None
     db.delete(db_category)
+    cache.invalidate_on_commit(db, "categories")
+    _touch(db, "categories")
     db.commit()
     return db_category
 
@@ -79,12 +326,237 @@ def update_account(db: Session, account_id: int, account_data: schemas.AccountUp
     if account_data.name is not None:
         db_account.name = account_data.name
     if account_data.balance is not None:
-        db_account.balance = account_data.balance
+        db_account.balance_cents = account_data.balance_cents
 
+    cache.invalidate_on_commit(db, "accounts")
+    _touch(db, "accounts")
+    _record_change(db, "account.updated", [db_account.id])
     db.commit()
     db.refresh(db_account)
     return db_account
 
+# --- Balances ---
+
+def _balance_delta(type: str, amount_cents: int) -> int:
+    """Efecto de una transacción sobre el balance de su cuenta, en céntimos."""
+    if type in ('income', 'transfer_in'):
+        return amount_cents
+    if type in ('expense', 'transfer_out'):
+        return -amount_cents
+    return 0
+
+def _apply_balance_deltas(db: Session, deltas):
+    """
+    Aplica {account_id: delta} (céntimos) con UPDATE accounts SET balance = balance + delta,
+    de forma atómica en la base de datos en lugar de leer-modificar-escribir en
+    Python. Las cuentas se actualizan en orden de id para que dos transacciones
+    concurrentes bloqueen las filas en el mismo orden y no se interbloqueen.
+    No hace commit.
+    """
+    _touch(db, "accounts")
+    for account_id in sorted(deltas):
+        delta = deltas[account_id]
+        if delta:
+            db.execute(
+                update(models.Account)
+                .where(models.Account.id == account_id)
+                .values(balance_cents=models.Account.balance_cents + delta)
+                .execution_options(synchronize_session=False)
+            )
+
+# --- Rollups diarios ---
+
+def _rollup_entry(db_transaction: models.Transaction):
+    """Clave de rollup e importe en céntimos de una transacción (copia inmutable para updates)."""
+    key = (
+        db_transaction.date.date(),
+        db_transaction.account_id,
+        db_transaction.category_id,
+        db_transaction.type,
+    )
+    return key, db_transaction.amount_cents
+
+def _apply_rollups(db: Session, changes):
+    """
+    Aplica a daily_rollups una lista de (clave, importe en céntimos, signo).
+    Los cambios sobre la misma clave se agrupan y se aplican con UPDATE
+    total = total + delta, en orden de clave; si la fila no existe se inserta
+    dentro de un savepoint y, si otra transacción la creó a la vez, se
+    reintenta el UPDATE. No hace commit.
+    """
+    deltas = {}
+    for key, amount, sign in changes:
+        total, count = deltas.get(key, (0, 0))
+        deltas[key] = (total + sign * amount, count + sign)
+    _touch(db, "transactions")
+    # Solo se invalidan los reportes de los meses afectados
+    cache.invalidate_on_commit(db, *{cache.month_tag(key[0].year, key[0].month) for key in deltas})
+
+    for key in sorted(deltas, key=lambda k: (k[0], k[1], k[2] or 0, k[3])):
+        total, count = deltas[key]
+        if count == 0 and total == 0:
+            continue
+        day, account_id, category_id, type_ = key
+        key_filter = and_(
+            models.DailyRollup.day == day,
+            models.DailyRollup.account_id == account_id,
+            models.rollup_category_key() == (category_id or 0),
+            models.DailyRollup.type == type_
+        )
+        increment = (
+            update(models.DailyRollup)
+            .where(key_filter)
+            .values(total_cents=models.DailyRollup.total_cents + total, count=models.DailyRollup.count + count)
+            .execution_options(synchronize_session=False)
+        )
+        if db.execute(increment).rowcount == 0:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(models.DailyRollup).values(
+                        day=day, account_id=account_id, category_id=category_id,
+                        type=type_, total_cents=total, count=count
+                    ))
+                continue
+            except IntegrityError:
+                db.execute(increment)
+        db.execute(
+            delete(models.DailyRollup)
+            .where(key_filter, models.DailyRollup.count <= 0)
+            .execution_options(synchronize_session=False)
+        )
+
+    _shift_balance_snapshots(db, deltas)
+
+def _shift_balance_snapshots(db: Session, deltas):
+    """
+    Ajusta los snapshots de balance posteriores a los días modificados
+    (movimientos con fecha pasada). Una consulta para localizarlos y un
+    UPDATE executemany en orden de id. No hace commit.
+    """
+    effects = {}
+    for (day, account_id, _, type_), (total, _) in deltas.items():
+        effect = _balance_delta(type_, total)
+        if effect:
+            effects.setdefault(account_id, {}).setdefault(day, 0)
+            effects[account_id][day] += effect
+    if not effects:
+        return
+    first_day = min(day for days in effects.values() for day in days)
+    snapshot = models.BalanceSnapshot.__table__
+    snapshots = db.execute(
+        select(snapshot.c.id, snapshot.c.account_id, snapshot.c.day)
+        .where(snapshot.c.account_id.in_(effects), snapshot.c.day > first_day)
+    ).all()
+    if not snapshots:
+        return
+
+    # Por cuenta: días ordenados y suma acumulada para buscar con bisect
+    cumulative = {}
+    for account_id, days in effects.items():
+        ordered = sorted(days)
+        sums = []
+        for day in ordered:
+            sums.append((sums[-1] if sums else 0) + days[day])
+        cumulative[account_id] = (ordered, sums)
+    shifts = []
+    for snapshot_id, account_id, snapshot_day in snapshots:
+        ordered, sums = cumulative[account_id]
+        position = bisect.bisect_left(ordered, snapshot_day)
+        if position and sums[position - 1]:
+            shifts.append({"snapshot_id": snapshot_id, "shift": sums[position - 1]})
+    if shifts:
+        shifts.sort(key=lambda row: row["snapshot_id"])
+        db.execute(
+            update(snapshot)
+            .where(snapshot.c.id == bindparam("snapshot_id"))
+            .values(balance_cents=snapshot.c.balance_cents + bindparam("shift")),
+            shifts
+        )
+
+def _ledger_rollup_query(db: Session, since: datetime.date | None = None):
+    """Agregado diario calculado directamente sobre transactions (desde since, si se indica)."""
+    day = func.date(models.Transaction.date, type_=Date)
+    query = db.query(
+        day.label("day"),
+        models.Transaction.account_id,
+        models.Transaction.category_id,
+        models.Transaction.type,
+        func.sum(models.Transaction.amount_cents).label("total_cents"),
+        func.count(models.Transaction.id).label("count"),
+    ).group_by(
+        day,
+        models.Transaction.account_id,
+        models.Transaction.category_id,
+        models.Transaction.type
+    )
+    if since is not None:
+        query = query.filter(models.Transaction.date >= _day_start(since))
+    return query
+
+def rebuild_rollups(db: Session):
+    """
+    Regenera daily_rollups a partir del libro de transacciones. Los de los
+    periodos archivados no se tocan: sus transacciones ya no están.
+    """
+    cutoff = get_archive_cutoff(db)
+    stale = db.query(models.DailyRollup)
+    if cutoff is not None:
+        stale = stale.filter(models.DailyRollup.day >= cutoff)
+    stale.delete(synchronize_session=False)
+    cache.clear_on_commit(db)
+    _touch(db, "transactions")
+    ledger = _ledger_rollup_query(db, since=cutoff).subquery()
+    db.execute(
+        insert(models.DailyRollup).from_select(
+            ["day", "account_id", "category_id", "type", "total_cents", "count"],
+            db.query(ledger.c.day, ledger.c.account_id, ledger.c.category_id,
+                     ledger.c.type, ledger.c.total_cents, ledger.c.count)
+        )
+    )
+    db.commit()
+    return db.query(func.count(models.DailyRollup.id)).scalar()
+
+def check_rollups(db: Session):
+    """
+    Compara daily_rollups con el libro y devuelve las claves que no coinciden
+    (comparación exacta: los importes son céntimos enteros). Los periodos
+    archivados no se comparan.
+    """
+    cutoff = get_archive_cutoff(db)
+    expected = {
+        (row.day, row.account_id, row.category_id, row.type): (int(row.total_cents), row.count)
+        for row in _ledger_rollup_query(db, since=cutoff)
+    }
+    rollups = db.query(models.DailyRollup)
+    if cutoff is not None:
+        rollups = rollups.filter(models.DailyRollup.day >= cutoff)
+    actual = {
+        (row.day, row.account_id, row.category_id, row.type): (row.total_cents, row.count)
+        for row in rollups
+    }
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        expected_total, expected_count = expected.get(key, (0, 0))
+        actual_total, actual_count = actual.get(key, (0, 0))
+        if expected_count != actual_count or expected_total != actual_total:
+            mismatches.append({
+                "day": key[0],
+                "account_id": key[1],
+                "category_id": key[2],
+                "type": key[3],
+                "expected_total_cents": expected_total,
+                "actual_total_cents": actual_total,
+                "expected_count": expected_count,
+                "actual_count": actual_count,
+            })
+    return mismatches
+
+def rollups_need_rebuild(db: Session):
+    """True si hay transacciones pero la tabla de rollups está vacía."""
+    has_transactions = db.query(models.Transaction.id).first() is not None
+    has_rollups = db.query(models.DailyRollup.id).first() is not None
+    return has_transactions and not has_rollups
+
 def create_transaction(db: Session, transaction: schemas.TransactionCreate):
     """
     Crea una nueva transacción y actualiza el balance de la cuenta correspondiente.
@@ -95,30 +567,187 @@ def create_transaction(db: Session, transaction: schemas.TransactionCreate):
         return None # La cuenta no fue encontrada
 
     # 2. Crear el objeto de la transacción
+    date = transaction.date or datetime.datetime.now()
+    _check_not_archived(db, date)
     db_transaction = models.Transaction(
         description=transaction.description,
-        amount=abs(transaction.amount), # Guardar siempre el monto en positivo
+        amount_cents=abs(transaction.amount_cents), # Guardar siempre el monto en positivo
         type=transaction.type,
         account_id=transaction.account_id,
-        date=transaction.date or datetime.datetime.now(),
-        to_account_id=transaction.to_account_id # Added for transfers
+        date=date,
+        to_account_id=transaction.to_account_id, # Added for transfers
+        category_id=transaction.category_id
     )
 
-    # 3. Actualizar el balance de la cuenta
-    if transaction.type == 'income':
-        db_account.balance += abs(transaction.amount)
-    elif transaction.type == 'expense':
-        db_account.balance -= abs(transaction.amount)
+    # 3. Actualizar el balance de la cuenta (UPDATE atómico)
     # Transfers are handled by create_transfer, not here.
     # If a transfer_in/out transaction is created directly, it will affect balance.
+    _apply_balance_deltas(db, {db_account.id: _balance_delta(transaction.type, abs(transaction.amount_cents))})
+
+    # 4. Actualizar los rollups diarios
+    key, amount = _rollup_entry(db_transaction)
+    _apply_rollups(db, [(key, amount, 1)])
 
-    # 4. Añadir los cambios a la sesión y confirmar
+    # 5. Añadir los cambios a la sesión, indexar la descripción y confirmar
     db.add(db_transaction)
+    db.flush()
+    search.index_transactions(db, [(db_transaction.id, db_transaction.description)])
+    _record_change(db, "transactions.created", [db_account.id], [db_transaction])
+    idempotency.store_response(db, db_transaction)
     db.commit()
     db.refresh(db_transaction)
 
     return db_transaction
 
+class BatchValidationError(ValueError):
+    """Lote rechazado completo; errors es una lista de {"index", "detail"}."""
+
+    def __init__(self, errors):
+        super().__init__("El lote contiene elementos inválidos.")
+        self.errors = errors
+
+def _insert_transactions(db: Session, rows, returning: bool = False):
+    """
+    Inserta filas de Transaction con un único INSERT multi-fila y aplica un
+    solo delta de balance por cuenta y un solo ajuste por clave de rollup.
+    Con returning devuelve las filas creadas en el orden de rows.
+    No hace commit.
+    """
+    balance_deltas = {}
+    rollup_changes = []
+    for row in rows:
+        row["amount_cents"] = abs(row["amount_cents"])
+        row.setdefault("date", datetime.datetime.now())
+        row.setdefault("category_id", None)
+        balance_deltas[row["account_id"]] = (
+            balance_deltas.get(row["account_id"], 0) + _balance_delta(row["type"], row["amount_cents"])
+        )
+        key = (row["date"].date(), row["account_id"], row["category_id"], row["type"])
+        rollup_changes.append((key, row["amount_cents"], 1))
+
+    created = None
+    table = models.Transaction.__table__
+    if returning:
+        # Filas Core (no objetos ORM): no se expiran con el commit
+        created = db.execute(
+            insert(table).returning(*table.columns, sort_by_parameter_order=True), rows
+        ).all()
+        search.index_transactions(db, ((row.id, row.description) for row in created))
+    elif search.maintained_by_crud(db):
+        search.index_transactions(db, db.execute(insert(table).returning(table.c.id, table.c.description), rows))
+    else:
+        db.execute(insert(models.Transaction), rows)
+    _apply_balance_deltas(db, balance_deltas)
+    _apply_rollups(db, rollup_changes)
+    if returning:
+        _record_change(db, "transactions.created", balance_deltas, created)
+    else:
+        # Importaciones: solo el recuento, el cliente recarga los listados
+        _record_change(db, "transactions.imported", balance_deltas, count=len(rows))
+    return created
+
+def bulk_create_transactions(db: Session, rows):
+    """
+    Inserta un lote de transacciones (dicts con las columnas de Transaction,
+    importes en amount_cents)
+    y lo confirma en un commit. Devuelve el número de filas insertadas.
+    """
+    if not rows:
+        return 0
+    _insert_transactions(db, rows)
+    db.commit()
+    return len(rows)
+
+def _existing_ids(db: Session, model, ids):
+    ids = {id for id in ids if id is not None}
+    if not ids:
+        return set()
+    return {id for (id,) in db.query(model.id).filter(model.id.in_(ids))}
+
+def create_transactions_batch(db: Session, transactions):
+    """
+    Crea varias transacciones en una sola transacción de base de datos: o se
+    crean todas o ninguna. Valida cuentas y categorías con una consulta cada
+    una y lanza BatchValidationError con los elementos inválidos.
+    """
+    accounts = _existing_ids(db, models.Account, (t.account_id for t in transactions))
+    categories = _existing_ids(db, models.Category, (t.category_id for t in transactions))
+    cutoff = get_archive_cutoff(db)
+    errors = []
+    for index, transaction in enumerate(transactions):
+        if transaction.account_id not in accounts:
+            errors.append({"index": index, "detail": "La cuenta especificada no existe."})
+        elif transaction.category_id is not None and transaction.category_id not in categories:
+            errors.append({"index": index, "detail": "La categoría especificada no existe."})
+        elif transaction.date is not None and _is_archived(cutoff, transaction.date):
+            errors.append({"index": index, "detail": str(ArchivedPeriodError(cutoff))})
+    if errors:
+        raise BatchValidationError(errors)
+    if not transactions:
+        return []
+
+    rows = [
+        {
+            "description": transaction.description,
+            "amount_cents": transaction.amount_cents,
+            "type": transaction.type,
+            "account_id": transaction.account_id,
+            "date": transaction.date or datetime.datetime.now(),
+            "to_account_id": transaction.to_account_id,
+            "category_id": transaction.category_id,
+        }
+        for transaction in transactions
+    ]
+    created = _insert_transactions(db, rows, returning=True)
+    db.commit()
+    return created
+
+def create_transfers_batch(db: Session, transfers):
+    """
+    Crea varias transferencias (dos transacciones cada una) en una sola
+    transacción de base de datos, con las mismas reglas que create_transfer.
+    """
+    account_ids = {t.from_account_id for t in transfers} | {t.to_account_id for t in transfers}
+    names = dict(db.query(models.Account.id, models.Account.name).filter(models.Account.id.in_(account_ids)))
+    errors = []
+    for index, transfer in enumerate(transfers):
+        if transfer.from_account_id not in names or transfer.to_account_id not in names:
+            errors.append({"index": index, "detail": "Una o ambas cuentas no fueron encontradas."})
+        elif transfer.from_account_id == transfer.to_account_id:
+            errors.append({"index": index, "detail": "No se puede transferir dinero a la misma cuenta."})
+    if errors:
+        raise BatchValidationError(errors)
+    if not transfers:
+        return []
+
+    now = datetime.datetime.now()
+    rows = []
+    for transfer in transfers:
+        rows.append({
+            "description": transfer.description or f"Transferencia a {names[transfer.to_account_id]}",
+            "amount_cents": transfer.amount_cents,
+            "type": "transfer_out",
+            "account_id": transfer.from_account_id,
+            "date": now,
+        })
+        rows.append({
+            "description": transfer.description or f"Transferencia desde {names[transfer.from_account_id]}",
+            "amount_cents": transfer.amount_cents,
+            "type": "transfer_in",
+            "account_id": transfer.to_account_id,
+            "to_account_id": transfer.from_account_id,
+            "date": now,
+        })
+    # Todas las filas deben tener las mismas claves para el INSERT multi-fila
+    for row in rows:
+        row.setdefault("to_account_id", None)
+    created = _insert_transactions(db, rows, returning=True)
+    db.commit()
+    return [
+        {"from_transaction": created[i], "to_transaction": created[i + 1]}
+        for i in range(0, len(created), 2)
+    ]
+
 def create_transfer(db: Session, transfer: schemas.TransferCreate):
     from_account = get_account(db, account_id=transfer.from_account_id)
     to_account = get_account(db, account_id=transfer.to_account_id)
@@ -132,103 +761,786 @@ def create_transfer(db: Session, transfer: schemas.TransferCreate):
     # Crear transacción de salida (débito)
     db_transaction_out = models.Transaction(
         description=transfer.description or f"Transferencia a {to_account.name}",
-        amount=transfer.amount,
+        amount_cents=transfer.amount_cents,
         type="transfer_out",
         account_id=from_account.id,
         date=datetime.datetime.now()
     )
-    from_account.balance -= transfer.amount
 
     # Crear transacción de entrada (crédito)
     db_transaction_in = models.Transaction(
         description=transfer.description or f"Transferencia desde {from_account.name}",
-        amount=transfer.amount,
+        amount_cents=transfer.amount_cents,
         type="transfer_in",
         account_id=to_account.id,
         to_account_id=from_account.id, # Link back to the source of the transfer
         date=datetime.datetime.now()
     )
-    to_account.balance += transfer.amount
+
+    # Débito y crédito en orden de id de cuenta (ver _apply_balance_deltas)
+    _apply_balance_deltas(db, {
+        from_account.id: -transfer.amount_cents,
+        to_account.id: transfer.amount_cents,
+    })
+    _apply_rollups(db, [
+        (*_rollup_entry(db_transaction_out), 1),
+        (*_rollup_entry(db_transaction_in), 1),
+    ])
 
     db.add(db_transaction_out)
     db.add(db_transaction_in)
+    db.flush()
+    search.index_transactions(db, [
+        (db_transaction_out.id, db_transaction_out.description),
+        (db_transaction_in.id, db_transaction_in.description),
+    ])
+    _record_change(
+        db, "transactions.created", [from_account.id, to_account.id],
+        [db_transaction_out, db_transaction_in]
+    )
+    result = {"from_transaction": db_transaction_out, "to_transaction": db_transaction_in}
+    idempotency.store_response(db, result)
     db.commit()
     db.refresh(db_transaction_out)
     db.refresh(db_transaction_in)
 
-    return {"from_transaction": db_transaction_out, "to_transaction": db_transaction_in}
+    return result
+
+# --- Listado paginado de transacciones ---
+
+def encode_transaction_cursor(db_transaction: models.Transaction) -> str:
+    """Cursor opaco con la clave (date, id) de la última fila devuelta."""
+    raw = f"{db_transaction.date.isoformat()}|{db_transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_transaction_cursor(cursor: str):
+    """Devuelve (date, id) de un cursor. Lanza ValueError si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_part, id_part = raw.split("|")
+        return datetime.datetime.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Cursor de paginación inválido.") from e
+
+def get_transactions(
+    db: Session,
+    account_id: int | None = None,
+    category_id: int | None = None,
+    type: str | None = None,
+    date_from: datetime.datetime | None = None,
+    date_to: datetime.datetime | None = None,
+    min_amount_cents: int | None = None,
+    max_amount_cents: int | None = None,
+    cursor: str | None = None,
+    limit: int = 50,
+):
+    """
+    Lista transacciones de la más reciente a la más antigua con paginación
+    por clave (date, id). Devuelve (transacciones, cursor_siguiente).
+    El rango de fechas es semiabierto: date_from <= date < date_to.
+    """
+    query = db.query(models.Transaction)
+    if account_id is not None:
+        query = query.filter(models.Transaction.account_id == account_id)
+    if category_id is not None:
+        query = query.filter(models.Transaction.category_id == category_id)
+    if type is not None:
+        query = query.filter(models.Transaction.type == type)
+    if date_from is not None:
+        query = query.filter(models.Transaction.date >= date_from)
+    if date_to is not None:
+        query = query.filter(models.Transaction.date < date_to)
+    if min_amount_cents is not None:
+        query = query.filter(models.Transaction.amount_cents >= min_amount_cents)
+    if max_amount_cents is not None:
+        query = query.filter(models.Transaction.amount_cents <= max_amount_cents)
+    cursor_date = None
+    if cursor is not None:
+        cursor_date, cursor_id = decode_transaction_cursor(cursor)
+        query = query.filter(models.Transaction.date <= cursor_date, or_(
+            models.Transaction.date < cursor_date,
+            and_(models.Transaction.date == cursor_date, models.Transaction.id < cursor_id)
+        ))
+    order = (models.Transaction.date.desc(), models.Transaction.id.desc())
+
+    # Se pide una fila extra para saber si existe otra página
+    rows = None
+    if partitions.is_partitioned(db):
+        # Primero solo las particiones de los últimos meses; si no llenan la
+        # página, todas las del rango
+        recent = partitions.recent_start(cursor_date)
+        if date_from is None or date_from < recent:
+            rows = query.filter(models.Transaction.date >= recent).order_by(*order).limit(limit + 1).all()
+            if len(rows) <= limit:
+                rows = None
+    if rows is None:
+        rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_transaction_cursor(rows[-1])
+    return rows, next_cursor
+
+# Cabecera de la exportación; amount sale de amount_cents (exporter lo formatea)
+EXPORT_COLUMNS = (
+    "id", "date", "type", "amount", "description",
+    "account_id", "to_account_id", "category_id",
+)
+
+def _export_column(name: str):
+    return models.Transaction.amount_cents if name == "amount" else getattr(models.Transaction, name)
+
+def iter_transactions_for_export(
+    db: Session,
+    account_id: int | None = None,
+    date_from: datetime.datetime | None = None,
+    date_to: datetime.datetime | None = None,
+    chunk_size: int = 1000,
+):
+    """
+    Recorre las transacciones en orden (date, id) como tuplas de EXPORT_COLUMNS
+    usando un cursor del servidor (yield_per), sin crear objetos ORM ni
+    cargar el resultado completo en memoria.
+    """
+    columns = [_export_column(name) for name in EXPORT_COLUMNS]
+    statement = select(*columns).order_by(models.Transaction.date, models.Transaction.id)
+    if account_id is not None:
+        statement = statement.where(models.Transaction.account_id == account_id)
+    if date_from is not None:
+        statement = statement.where(models.Transaction.date >= date_from)
+    if date_to is not None:
+        statement = statement.where(models.Transaction.date < date_to)
+
+    result = db.execute(statement.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield from partition
 
 # --- Funciones para Reportes ---
 
+def _month_range(year: int, month: int):
+    """Devuelve el intervalo semiabierto [inicio, fin) de un mes; ValueError si no existe."""
+    try:
+        start = datetime.date(year, month, 1)
+        end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    except ValueError:
+        raise ValueError(f"El mes {year}-{month:02d} no es válido.")
+    return start, end
+
+def _day_range(year: int, month: int, day: int):
+    """Devuelve el intervalo semiabierto [inicio, fin) de un día; ValueError si no existe."""
+    try:
+        start = datetime.date(year, month, day)
+    except ValueError:
+        raise ValueError(f"La fecha {year}-{month:02d}-{day:02d} no existe.")
+    return start, start + datetime.timedelta(days=1)
+
+def _income_expense_totals(db: Session, start: datetime.date, end: datetime.date):
+    """
+    Suma ingresos y gastos en [start, end) con una sola consulta de agregación
+    condicional sobre daily_rollups, de modo que el coste depende del número
+    de días del rango y no del de transacciones.
+    """
+    total_income, total_expense = db.query(
+        func.coalesce(func.sum(case((models.DailyRollup.type == 'income', models.DailyRollup.total_cents), else_=0)), 0),
+        func.coalesce(func.sum(case((models.DailyRollup.type == 'expense', models.DailyRollup.total_cents), else_=0)), 0),
+    ).filter(
+        models.DailyRollup.day >= start,
+        models.DailyRollup.day < end,
+        models.DailyRollup.type.in_(('income', 'expense'))
+    ).one()
+    return int(total_income), int(total_expense)
+
+@cache.cached("reports", tags=lambda year, month: (cache.month_tag(year, month),))
 def get_monthly_report(db: Session, year: int, month: int):
     """
     Calcula el total de ingresos y gastos para un mes y año específicos.
     """
-    total_income = db.query(func.sum(models.Transaction.amount)).filter(
-        extract('year', models.Transaction.date) == year,
-        extract('month', models.Transaction.date) == month,
-        models.Transaction.type == 'income'
-    ).scalar() or 0.0
-
-    total_expense = db.query(func.sum(models.Transaction.amount)).filter(
-        extract('year', models.Transaction.date) == year,
-        extract('month', models.Transaction.date) == month,
-        models.Transaction.type == 'expense'
-    ).scalar() or 0.0
+    start, end = _month_range(year, month)
+    total_income, total_expense = _income_expense_totals(db, start, end)
 
     return {
         "year": year,
         "month": month,
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "net_balance": total_income - total_expense
+        "total_income_cents": total_income,
+        "total_expense_cents": total_expense,
+        "net_balance_cents": total_income - total_expense
     }
 
+@cache.cached("reports", tags=lambda year, month, day: (cache.month_tag(year, month),))
 def get_daily_report(db: Session, year: int, month: int, day: int):
     """
     Calcula el total de ingresos y gastos para un día específico.
     """
-    total_income = db.query(func.sum(models.Transaction.amount)).filter(
-        extract('year', models.Transaction.date) == year,
-        extract('month', models.Transaction.date) == month,
-        extract('day', models.Transaction.date) == day,
-        models.Transaction.type == 'income'
-    ).scalar() or 0.0
-
-    total_expense = db.query(func.sum(models.Transaction.amount)).filter(
-        extract('year', models.Transaction.date) == year,
-        extract('month', models.Transaction.date) == month,
-        extract('day', models.Transaction.date) == day,
-        models.Transaction.type == 'expense'
-    ).scalar() or 0.0
+    start, end = _day_range(year, month, day)
+    total_income, total_expense = _income_expense_totals(db, start, end)
 
     return {
         "year": year,
         "month": month,
         "day": day,
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "net_balance": total_income - total_expense
+        "total_income_cents": total_income,
+        "total_expense_cents": total_expense,
+        "net_balance_cents": total_income - total_expense
     }
 
+@cache.cached("reports", tags=lambda year, month: (cache.month_tag(year, month), "categories"))
 def get_categorized_expenses_report(db: Session, year: int, month: int):
     """
     Calcula el total de gastos por categoría para un mes y año específicos.
     """
+    start, end = _month_range(year, month)
     expenses_by_category = db.query(
         models.Category.name,
-        func.sum(models.Transaction.amount)
-    ).join(models.Transaction).filter(
-        extract('year', models.Transaction.date) == year,
-        extract('month', models.Transaction.date) == month,
-        models.Transaction.type == 'expense'
+        func.sum(models.DailyRollup.total_cents)
+    ).join(models.DailyRollup, models.DailyRollup.category_id == models.Category.id).filter(
+        models.DailyRollup.day >= start,
+        models.DailyRollup.day < end,
+        models.DailyRollup.type == 'expense'
     ).group_by(models.Category.name).all()
 
     return [
-        {"category": name, "total_expense": float(total_expense) if total_expense else 0.0}
+        {"category": name, "total_expense_cents": int(total_expense or 0)}
         for name, total_expense in expenses_by_category
     ]
 
+# Número máximo de periodos de una serie temporal
+MAX_TIME_SERIES_BUCKETS = 3660
+
+def _bucket_start(day: datetime.date, granularity: str) -> datetime.date:
+    """Inicio del periodo que contiene day (las semanas empiezan en lunes)."""
+    if granularity == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_bucket(bucket: datetime.date, granularity: str) -> datetime.date:
+    if granularity == "week":
+        return bucket + datetime.timedelta(days=7)
+    if granularity == "month":
+        return datetime.date(bucket.year + bucket.month // 12, bucket.month % 12 + 1, 1)
+    return bucket + datetime.timedelta(days=1)
+
+def _time_series_tags(start, end, granularity, split_by):
+    tags = list(cache.month_tags(start, end))
+    if split_by == "account":
+        tags.append("accounts")
+    elif split_by == "category":
+        tags.append("categories")
+    return tags
+
+@cache.cached("reports", tags=_time_series_tags)
+def get_time_series_report(
+    db: Session,
+    start: datetime.date,
+    end: datetime.date,
+    granularity: str = "month",
+    split_by: str | None = None,
+):
+    """
+    Ingresos, gastos y neto por día, semana o mes en [start, end), opcionalmente
+    separados por cuenta o categoría. Una sola consulta GROUP BY sobre
+    daily_rollups devuelve los totales diarios; se agrupan en periodos aquí
+    (portable entre SQLite y Postgres) y se rellenan los periodos vacíos.
+    """
+    if end <= start:
+        raise ValueError("La fecha final debe ser posterior a la inicial.")
+    buckets = []
+    bucket = _bucket_start(start, granularity)
+    while bucket < end:
+        buckets.append(bucket)
+        if len(buckets) > MAX_TIME_SERIES_BUCKETS:
+            raise ValueError(f"El rango supera {MAX_TIME_SERIES_BUCKETS} periodos.")
+        bucket = _next_bucket(bucket, granularity)
+
+    rollup = models.DailyRollup
+    columns = [rollup.day]
+    group_by = [rollup.day]
+    query = db.query()
+    if split_by == "account":
+        columns += [rollup.account_id, models.Account.name]
+        group_by += [rollup.account_id, models.Account.name]
+        query = query.select_from(rollup).join(models.Account, models.Account.id == rollup.account_id)
+    elif split_by == "category":
+        columns += [rollup.category_id, models.Category.name]
+        group_by += [rollup.category_id, models.Category.name]
+        query = query.select_from(rollup).outerjoin(models.Category, models.Category.id == rollup.category_id)
+    income = func.sum(case((rollup.type == 'income', rollup.total_cents), else_=0))
+    expense = func.sum(case((rollup.type == 'expense', rollup.total_cents), else_=0))
+    rows = query.add_columns(*columns, income, expense).filter(
+        rollup.day >= start,
+        rollup.day < end,
+        rollup.type.in_(('income', 'expense'))
+    ).group_by(*group_by).all()
+
+    totals = {}
+    groups = {}
+    for row in rows:
+        day, income_total, expense_total = row[0], row[-2], row[-1]
+        group = (row[1], row[2]) if split_by else (None, None)
+        groups[group[0]] = group[1]
+        key = (_bucket_start(day, granularity), group[0])
+        current_income, current_expense = totals.get(key, (0, 0))
+        totals[key] = (current_income + int(income_total or 0), current_expense + int(expense_total or 0))
+
+    if not split_by:
+        groups = {None: None}
+    series = []
+    for group_id, group_name in sorted(groups.items(), key=lambda item: (item[0] is None, item[0] or 0)):
+        for bucket in buckets:
+            total_income, total_expense = totals.get((bucket, group_id), (0, 0))
+            series.append({
+                "period_start": bucket,
+                "group_id": group_id,
+                "group_name": group_name,
+                "total_income_cents": total_income,
+                "total_expense_cents": total_expense,
+                "net_balance_cents": total_income - total_expense,
+            })
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "split_by": split_by,
+        "series": series,
+    }
+
+# --- Historial de balances ---
+
+# Efecto en el balance de una fila de daily_rollups
+_ROLLUP_BALANCE_EFFECT = case(
+    (models.DailyRollup.type.in_(('income', 'transfer_in')), models.DailyRollup.total_cents),
+    (models.DailyRollup.type.in_(('expense', 'transfer_out')), -models.DailyRollup.total_cents),
+    else_=0
+)
+
+def snapshot_balances(db: Session, through: datetime.date | None = None):
+    """
+    Crea los snapshots de inicio de mes que falten, desde el primer mes con
+    movimientos hasta el mes de ``through`` (hoy por defecto). El balance al
+    inicio de un mes es el actual menos el efecto de los movimientos desde
+    ese día; una sola consulta agregada lee balances y rollups a la vez.
+    Pensado para el arranque y para un cron al cierre de mes. Devuelve el
+    número de snapshots creados.
+    """
+    through = _bucket_start(through or datetime.date.today(), "month")
+    first_day = db.query(func.min(models.DailyRollup.day)).scalar()
+    first_month = _bucket_start(first_day, "month") if first_day and first_day < through else through
+    months = []
+    month = first_month
+    while month <= through:
+        months.append(month)
+        month = _next_bucket(month, "month")
+
+    snapshot = models.BalanceSnapshot
+    existing = set(db.query(snapshot.account_id, snapshot.day).filter(snapshot.day >= first_month))
+    account_ids = [id for (id,) in db.query(models.Account.id)]
+    missing = [(account_id, month) for account_id in account_ids for month in months if (account_id, month) not in existing]
+    if not missing:
+        return 0
+    since = min(month for _, month in missing)
+
+    rollup = models.DailyRollup
+    rows = (
+        db.query(models.Account.id, models.Account.balance_cents, rollup.day, func.sum(_ROLLUP_BALANCE_EFFECT))
+        .outerjoin(rollup, and_(rollup.account_id == models.Account.id, rollup.day >= since))
+        .group_by(models.Account.id, models.Account.balance_cents, rollup.day)
+        .all()
+    )
+    balances = {}
+    effects = {}
+    for account_id, balance, day, effect in rows:
+        balances[account_id] = balance
+        if day is not None:
+            effects.setdefault(account_id, []).append((day, int(effect or 0)))
+
+    # Cada cuenta se recorre del mes más reciente al más antiguo restando
+    # los movimientos posteriores a cada inicio de mes
+    missing_by_account = {}
+    for account_id, month in missing:
+        missing_by_account.setdefault(account_id, set()).add(month)
+    new_rows = []
+    for account_id, wanted in missing_by_account.items():
+        if account_id not in balances:
+            continue
+        changes = sorted(effects.get(account_id, ()), reverse=True)
+        running = balances[account_id]
+        position = 0
+        for month in reversed(months):
+            while position < len(changes) and changes[position][0] >= month:
+                running -= changes[position][1]
+                position += 1
+            if month in wanted:
+                new_rows.append({"account_id": account_id, "day": month, "balance_cents": running})
+    try:
+        db.execute(insert(models.BalanceSnapshot), new_rows)
+        db.commit()
+    except IntegrityError:
+        # Otro proceso (otro worker al arrancar) los creó a la vez
+        db.rollback()
+        return 0
+    return len(new_rows)
+
+def _balance_at_start(db: Session, account_id: int, day: datetime.date):
+    """
+    Balance en céntimos al inicio de day: snapshot más cercano anterior (o, si no hay,
+    el posterior o el balance actual) más los rollups entre ambas fechas.
+    None si la cuenta no existe.
+    """
+    snapshot = models.BalanceSnapshot
+    rollup = models.DailyRollup
+    before = (
+        db.query(snapshot.day, snapshot.balance_cents)
+        .filter(snapshot.account_id == account_id, snapshot.day <= day)
+        .order_by(snapshot.day.desc())
+        .first()
+    )
+    if before is not None:
+        anchor, sign, low, high = before.balance_cents, 1, before.day, day
+    else:
+        after = (
+            db.query(snapshot.day, snapshot.balance_cents)
+            .filter(snapshot.account_id == account_id, snapshot.day > day)
+            .order_by(snapshot.day)
+            .first()
+        )
+        if after is not None:
+            anchor, sign, low, high = after.balance_cents, -1, day, after.day
+        else:
+            anchor = db.query(models.Account.balance_cents).filter(models.Account.id == account_id).scalar()
+            if anchor is None:
+                return None
+            sign, low, high = -1, day, None
+    query = db.query(func.coalesce(func.sum(_ROLLUP_BALANCE_EFFECT), 0)).filter(
+        rollup.account_id == account_id, rollup.day >= low
+    )
+    if high is not None:
+        query = query.filter(rollup.day < high)
+    return anchor + sign * int(query.scalar())
+
+def get_balance_at(db: Session, account_id: int, day: datetime.date):
+    """Balance de la cuenta al final de day, o None si la cuenta no existe."""
+    balance = _balance_at_start(db, account_id, day + datetime.timedelta(days=1))
+    if balance is None:
+        return None
+    return {"account_id": account_id, "date": day, "balance_cents": balance}
+
+def get_balance_history(
+    db: Session,
+    account_id: int,
+    start: datetime.date,
+    end: datetime.date,
+    granularity: str = "day",
+):
+    """
+    Balance de cierre de cada día, semana o mes en [start, end): balance
+    inicial desde el snapshot más cercano y una consulta GROUP BY por día
+    sobre daily_rollups acotada al rango. None si la cuenta no existe.
+    """
+    if end <= start:
+        raise ValueError("La fecha final debe ser posterior a la inicial.")
+    buckets = []
+    bucket = _bucket_start(start, granularity)
+    while bucket < end:
+        buckets.append(bucket)
+        if len(buckets) > MAX_TIME_SERIES_BUCKETS:
+            raise ValueError(f"El rango supera {MAX_TIME_SERIES_BUCKETS} periodos.")
+        bucket = _next_bucket(bucket, granularity)
+
+    opening = _balance_at_start(db, account_id, start)
+    if opening is None:
+        return None
+    rollup = models.DailyRollup
+    effects = {}
+    for day, effect in db.query(rollup.day, func.sum(_ROLLUP_BALANCE_EFFECT)).filter(
+        rollup.account_id == account_id,
+        rollup.day >= start,
+        rollup.day < end
+    ).group_by(rollup.day):
+        key = _bucket_start(day, granularity)
+        effects[key] = effects.get(key, 0) + int(effect or 0)
+
+    points = []
+    balance = opening
+    for bucket in buckets:
+        balance += effects.get(bucket, 0)
+        points.append({"period_start": bucket, "balance_cents": balance})
+    return {
+        "account_id": account_id,
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "opening_balance_cents": opening,
+        "points": points,
+    }
+
+# --- Conciliación de balances ---
+
+def _ledger_balance_effect():
+    return case(
+        (models.Transaction.type.in_(('income', 'transfer_in')), models.Transaction.amount_cents),
+        (models.Transaction.type.in_(('expense', 'transfer_out')), -models.Transaction.amount_cents),
+        else_=0
+    )
+
+def baseline_opening_balances(db: Session):
+    """
+    Fija opening_balance en las cuentas que no lo tienen (creadas antes de
+    existir la columna) suponiendo que su balance actual es correcto.
+    Devuelve el número de cuentas actualizadas.
+    """
+    ledger = (
+        select(func.coalesce(func.sum(_ledger_balance_effect()), 0))
+        .where(models.Transaction.account_id == models.Account.id)
+        .scalar_subquery()
+    )
+    updated = db.execute(
+        update(models.Account)
+        .where(models.Account.opening_balance_cents.is_(None))
+        .values(opening_balance_cents=models.Account.balance_cents - ledger)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return updated
+
+def _accounts_changed_since(db: Session, seq: int):
+    """Cuentas afectadas por eventos del feed posteriores a seq, o None si ya se purgaron."""
+    oldest = db.query(func.min(models.ChangeEvent.seq)).scalar()
+    latest = db.query(models.TableVersion.version).filter(models.TableVersion.name == "changes").scalar() or 0
+    if seq < latest and (oldest is None or oldest > seq + 1):
+        return None
+    account_ids = set()
+    for (payload,) in db.query(models.ChangeEvent.payload).filter(models.ChangeEvent.seq > seq):
+        account_ids.update(account["id"] for account in json.loads(payload)["accounts"])
+    return account_ids
+
+def reconcile_balances(db: Session, repair: bool = False, incremental: bool = False):
+    """
+    Recalcula el balance esperado de cada cuenta (opening_balance + efecto de
+    sus transacciones) en una sola consulta agregada que lee también el
+    balance actual, y devuelve las diferencias; al ser céntimos enteros la
+    comparación es exacta. Con repair corrige cada
+    cuenta con UPDATE balance = balance - diferencia, que respeta las
+    escrituras concurrentes, y regenera sus snapshots de balance.
+
+    Con incremental solo revisa las cuentas que aparecen en el feed de
+    cambios desde la última ejecución; si no hay ejecución previa o esos
+    eventos ya se purgaron, hace una pasada completa.
+    """
+    started_at = datetime.datetime.now()
+    # Se lee antes de agregar: lo que se confirme después entra en la próxima ejecución
+    last_seq = db.query(models.TableVersion.version).filter(models.TableVersion.name == "changes").scalar() or 0
+    account_ids = None
+    mode = "full"
+    if incremental:
+        previous = db.query(models.ReconciliationRun.last_seq).order_by(models.ReconciliationRun.id.desc()).first()
+        if previous is not None:
+            account_ids = _accounts_changed_since(db, previous.last_seq)
+            if account_ids is not None:
+                mode = "incremental"
+
+    ledger = select(
+        models.Transaction.account_id.label("account_id"),
+        func.sum(_ledger_balance_effect()).label("total")
+    )
+    if account_ids is not None:
+        ledger = ledger.where(models.Transaction.account_id.in_(account_ids))
+    ledger = ledger.group_by(models.Transaction.account_id).subquery()
+    query = (
+        select(
+            models.Account.id, models.Account.name, models.Account.balance_cents,
+            models.Account.opening_balance_cents, func.coalesce(ledger.c.total, 0)
+        )
+        .outerjoin(ledger, ledger.c.account_id == models.Account.id)
+        .order_by(models.Account.id)
+    )
+    if account_ids is not None:
+        query = query.where(models.Account.id.in_(account_ids))
+
+    checked = 0
+    discrepancies = []
+    for account_id, name, balance, opening_balance, ledger_total in db.execute(query):
+        checked += 1
+        expected = (opening_balance or 0) + int(ledger_total)
+        difference = balance - expected
+        if difference:
+            discrepancies.append({
+                "account_id": account_id,
+                "name": name,
+                "balance_cents": balance,
+                "expected_balance_cents": expected,
+                "difference_cents": difference,
+            })
+
+    if repair and discrepancies:
+        repaired_ids = [item["account_id"] for item in discrepancies]
+        _apply_balance_deltas(db, {item["account_id"]: -item["difference_cents"] for item in discrepancies})
+        _record_change(db, "account.updated", repaired_ids)
+        # El historial se recalcula desde el balance ya corregido
+        db.execute(
+            delete(models.BalanceSnapshot)
+            .where(models.BalanceSnapshot.account_id.in_(repaired_ids))
+            .execution_options(synchronize_session=False)
+        )
+    run = models.ReconciliationRun(
+        started_at=started_at,
+        finished_at=datetime.datetime.now(),
+        mode=mode,
+        last_seq=last_seq,
+        accounts_checked=checked,
+        discrepancies=len(discrepancies),
+        repaired=len(discrepancies) if repair else 0,
+    )
+    db.add(run)
+    db.flush()
+    result = {
+        "run_id": run.id,
+        "mode": mode,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "last_seq": last_seq,
+        "accounts_checked": checked,
+        "repaired": repair and bool(discrepancies),
+        "discrepancies": discrepancies,
+    }
+    db.commit()
+    if repair and discrepancies:
+        snapshot_balances(db)
+    return result
+
+# --- Periodos archivados ---
+
+class ArchivedPeriodError(ValueError):
+    """Escritura con fecha dentro de un periodo archivado."""
+
+    def __init__(self, cutoff: datetime.date):
+        super().__init__(f"Las transacciones anteriores a {cutoff.isoformat()} están archivadas y no se pueden modificar.")
+        self.cutoff = cutoff
+
+def _day_start(day: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time())
+
+def get_archive_cutoff(db: Session):
+    """Fin del último periodo archivado (todo lo anterior está archivado) o None."""
+    return db.query(func.max(models.ArchivedPeriod.period_end)).scalar()
+
+def _naive_utc(value: datetime.datetime) -> datetime.datetime:
+    """Fecha sin zona horaria para comparar con las del libro: las que traen zona se pasan a UTC."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def _is_archived(cutoff, date: datetime.datetime) -> bool:
+    return cutoff is not None and _naive_utc(date) < _day_start(cutoff)
+
+def _check_not_archived(db: Session, *dates):
+    cutoff = get_archive_cutoff(db)
+    if any(_is_archived(cutoff, date) for date in dates):
+        raise ArchivedPeriodError(cutoff)
+
+def get_archived_periods(db: Session):
+    return db.query(models.ArchivedPeriod).order_by(models.ArchivedPeriod.period_start).all()
+
+def check_archivable(db: Session, start: datetime.date, end: datetime.date):
+    """
+    Valida que [start, end) se pueda archivar: terminado antes de este año,
+    posterior a lo ya archivado, sin transacciones vivas anteriores y con
+    alguna dentro. Lanza ValueError si no.
+    """
+    if end > datetime.date(datetime.date.today().year, 1, 1):
+        raise ValueError("Solo se pueden archivar años cerrados.")
+    cutoff = get_archive_cutoff(db)
+    if cutoff is not None and start < cutoff:
+        raise ValueError(f"El periodo ya está archivado (hasta {cutoff.isoformat()}).")
+    earlier = db.query(models.Transaction.id).filter(models.Transaction.date < _day_start(start)).first()
+    if earlier is not None:
+        raise ValueError("Hay transacciones anteriores al periodo: hay que archivar antes los años anteriores.")
+    inside = db.query(models.Transaction.id).filter(
+        models.Transaction.date >= _day_start(start), models.Transaction.date < _day_start(end)
+    ).first()
+    if inside is None:
+        raise ValueError("No hay transacciones en el periodo.")
+
+# Módulo del hash de ids e importes de los resúmenes de archivo: cada
+# término cabe en 31 bits y su suma en un entero de 64 en SQL
+_ARCHIVE_HASH_MODULUS = 2_147_483_647
+
+def update_archive_summary(summary, rows):
+    """
+    Añade a summary las filas (id, account_id, type, amount_cents) escritas
+    en un fichero de archivo: {account_id: (filas, efecto en el balance,
+    hash de ids e importes)}. archive_transactions calcula lo mismo en SQL.
+    """
+    for id, account_id, type_, amount_cents in rows:
+        count, effect, digest = summary.get(account_id, (0, 0, 0))
+        summary[account_id] = (
+            count + 1,
+            effect + _balance_delta(type_, amount_cents),
+            digest + id * (amount_cents % _ARCHIVE_HASH_MODULUS) % _ARCHIVE_HASH_MODULUS,
+        )
+    return summary
+
+def archive_transactions(db: Session, start: datetime.date, end: datetime.date, path: str, summary):
+    """
+    Quita del libro las transacciones de [start, end), ya escritas en path
+    (summary, ver update_archive_summary), y registra el periodo archivado
+    en una sola transacción. El efecto de esas filas pasa al balance inicial
+    de cada cuenta, así la conciliación sigue cuadrando; rollups y snapshots
+    no cambian. Si el resumen del libro, calculado con las escrituras ya
+    bloqueadas, no coincide con summary (altas, borrados o ediciones de
+    importe, tipo o cuenta tras escribir el fichero) no borra nada y lanza
+    ValueError. Devuelve el ArchivedPeriod.
+    """
+    # Las cuentas sin balance inicial lo calculan con el libro completo
+    baseline_opening_balances(db)
+    date_from, date_to = _day_start(start), _day_start(end)
+    if db.get_bind().dialect.name == "postgresql":
+        # Sin altas en el periodo entre el recuento y el borrado
+        db.execute(text("LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE"))
+    # En SQLite esta primera escritura toma ya el bloqueo de escritura
+    search.unindex_period(db, date_from, date_to)
+    in_period = and_(models.Transaction.date >= date_from, models.Transaction.date < date_to)
+    modulus = _ARCHIVE_HASH_MODULUS
+    digest = models.Transaction.id * (models.Transaction.amount_cents % modulus) % modulus
+    ledger = {
+        account_id: (count, int(effect), int(digest_sum))
+        for account_id, count, effect, digest_sum in db.query(
+            models.Transaction.account_id, func.count(models.Transaction.id),
+            func.sum(_ledger_balance_effect()), func.sum(digest)
+        ).filter(in_period).group_by(models.Transaction.account_id)
+    }
+    row_count = sum(count for count, _, _ in summary.values())
+    if ledger != summary:
+        found = sum(count for count, _, _ in ledger.values())
+        db.rollback()
+        raise ValueError(
+            f"El periodo cambió después de escribir el archivo ({found} transacciones en el libro, "
+            f"{row_count} en el archivo): hay que volver a archivarlo."
+        )
+    effects = sorted(ledger.items())
+
+    partitions.drop_partitions(db, start, end)
+    db.execute(delete(models.Transaction).where(in_period).execution_options(synchronize_session=False))
+    for account_id, (_, effect, _) in effects:
+        if effect:
+            db.execute(
+                update(models.Account)
+                .where(models.Account.id == account_id)
+                .values(opening_balance_cents=models.Account.opening_balance_cents + int(effect))
+                .execution_options(synchronize_session=False)
+            )
+    period = models.ArchivedPeriod(period_start=start, period_end=end, path=path, row_count=row_count)
+    db.add(period)
+    _touch(db, "transactions")
+    _record_change(
+        db, "transactions.archived", [account_id for account_id, _ in effects],
+        period_start=start.isoformat(), period_end=end.isoformat(), count=row_count
+    )
+    db.commit()
+    db.refresh(period)
+    return period
+
 def delete_transaction(db: Session, transaction_id: int):
     """
     Elimina una transacción y revierte su efecto en el balance de la cuenta.
@@ -237,22 +1549,21 @@ def delete_transaction(db: Session, transaction_id: int):
     db_transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
     if not db_transaction:
         return None # No se encontró la transacción
+    _check_not_archived(db, db_transaction.date)
 
-    # 2. Encontrar la cuenta asociada
-    db_account = db_transaction.account
+    # 2. Revertir el balance de la cuenta asociada
+    _apply_balance_deltas(db, {
+        db_transaction.account_id: -_balance_delta(db_transaction.type, db_transaction.amount_cents)
+    })
 
-    # 3. Revertir el balance
-    if db_transaction.type == 'income':
-        db_account.balance -= db_transaction.amount
-    elif db_transaction.type == 'expense':
-        db_account.balance += db_transaction.amount
-    elif db_transaction.type == 'transfer_out':
-        db_account.balance += db_transaction.amount # Add back to source account
-    elif db_transaction.type == 'transfer_in':
-        db_account.balance -= db_transaction.amount # Subtract from destination account
+    # 3. Descontar la transacción de los rollups
+    key, amount = _rollup_entry(db_transaction)
+    _apply_rollups(db, [(key, amount, -1)])
 
-    # 4. Eliminar la transacción y confirmar los cambios
+    # 4. Eliminar la transacción (y su entrada del índice de búsqueda) y confirmar los cambios
+    search.unindex_transactions(db, [(db_transaction.id, db_transaction.description)])
     db.delete(db_transaction)
+    _record_change(db, "transactions.deleted", [db_transaction.account_id], ids=[db_transaction.id])
     db.commit()
 
     return db_transaction
@@ -264,29 +1575,32 @@ def update_transaction(db: Session, transaction_id: int, transaction_data: schem
     db_transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
     if not db_transaction:
         return None
+    _check_not_archived(db, db_transaction.date, transaction_data.date or db_transaction.date)
 
-    db_account = db_transaction.account
-
-    # Revertir el monto original de la cuenta
-    if db_transaction.type == 'income':
-        db_account.balance -= db_transaction.amount
-    else:  # expense
-        db_account.balance += db_transaction.amount
+    old_key, old_amount = _rollup_entry(db_transaction)
 
     # Actualizar los campos de la transacción con los nuevos datos
-    if transaction_data.description is not None:
+    if transaction_data.description is not None and transaction_data.description != db_transaction.description:
+        search.unindex_transactions(db, [(db_transaction.id, db_transaction.description)])
+        search.index_transactions(db, [(db_transaction.id, transaction_data.description)])
         db_transaction.description = transaction_data.description
     if transaction_data.amount is not None:
-        db_transaction.amount = abs(transaction_data.amount)
+        db_transaction.amount_cents = abs(transaction_data.amount_cents)
     if transaction_data.date is not None:
         db_transaction.date = transaction_data.date
 
-    # Aplicar el nuevo monto a la cuenta
-    if db_transaction.type == 'income':
-        db_account.balance += db_transaction.amount
-    else:  # expense
-        db_account.balance -= db_transaction.amount
+    # Ajustar la cuenta por la diferencia entre el monto nuevo y el original
+    _apply_balance_deltas(db, {
+        db_transaction.account_id: (
+            _balance_delta(db_transaction.type, db_transaction.amount_cents)
+            - _balance_delta(db_transaction.type, old_amount)
+        )
+    })
+
+    new_key, new_amount = _rollup_entry(db_transaction)
+    _apply_rollups(db, [(old_key, old_amount, -1), (new_key, new_amount, 1)])
 
+    _record_change(db, "transactions.updated", [db_transaction.account_id], [db_transaction])
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
\ No newline at end of file
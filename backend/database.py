@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -11,17 +11,145 @@ import tempfile
 TEMP_DIR = tempfile.gettempdir()
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(TEMP_DIR, 'ingresos_gastos.db')}")
 
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL.rstrip("/") == "sqlite:")
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+# Pool de conexiones, configurable por entorno. pre_ping descarta conexiones
+# que el servidor cerró; recycle las renueva antes de los timeouts del proxy.
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+}
+if IS_SQLITE_MEMORY:
+    # SQLite en memoria usa un pool de una sola conexión
+    POOL_SETTINGS = {}
+
+# Perfil de rendimiento para SQLite (SQLITE_PRAGMAS=0 para desactivarlo):
+# WAL permite lecturas concurrentes con una escritura y synchronous=NORMAL
+# es seguro con WAL, sin un fsync por commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")), # negativo = KiB
+    "temp_store": "MEMORY",
+}
+if not IS_SQLITE or IS_SQLITE_MEMORY or not _env_bool("SQLITE_PRAGMAS", True):
+    SQLITE_PRAGMAS = {}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
 # Si es SQLite, añadir connect_args
 connect_args = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+if IS_SQLITE:
     connect_args["check_same_thread"] = False
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
+    SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **POOL_SETTINGS
 )
+if SQLITE_PRAGMAS:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+
+# Réplica de lectura opcional (READ_REPLICA_URL, por ejemplo una segunda
+# base Postgres en streaming o una copia del fichero SQLite): los GET de
+# listados y reportes la usan salvo justo después de una escritura del
+# mismo cliente (ver replica.py). Sus conexiones son de solo lectura.
+READ_REPLICA_URL = os.getenv("READ_REPLICA_URL") or None
+# Segundos que un cliente lee del primario tras escribir
+READ_REPLICA_STICKY_SECONDS = int(os.getenv("READ_REPLICA_STICKY_SECONDS", "5"))
+
+def _apply_replica_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Cualquier escritura por error falla en lugar de divergir de la réplica
+    cursor.execute("PRAGMA query_only=ON")
+    for pragma in ("busy_timeout", "mmap_size", "cache_size", "temp_store"):
+        if pragma in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}={SQLITE_PRAGMAS[pragma]}")
+    cursor.close()
+
+replica_engine = None
+ReplicaSessionLocal = None
+if READ_REPLICA_URL:
+    REPLICA_IS_SQLITE = READ_REPLICA_URL.startswith("sqlite")
+    replica_engine = create_engine(
+        READ_REPLICA_URL, connect_args={"check_same_thread": False} if REPLICA_IS_SQLITE else {}, **POOL_SETTINGS
+    )
+    if REPLICA_IS_SQLITE:
+        event.listen(replica_engine, "connect", _apply_replica_sqlite_pragmas)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+def describe_engine_settings() -> str:
+    """Resumen de la configuración efectiva del engine para el log de arranque."""
+    parts = [f"url={engine.url.render_as_string(hide_password=True)}", f"pool={type(engine.pool).__name__}"]
+    parts += [f"{name}={value}" for name, value in POOL_SETTINGS.items()]
+    if SQLITE_PRAGMAS:
+        with engine.connect() as connection:
+            effective = {
+                pragma: connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+                for pragma in SQLITE_PRAGMAS
+            }
+        parts += [f"{pragma}={value}" for pragma, value in effective.items()]
+    if ASYNC_MODE:
+        parts.append(f"async_url={async_engine.url.render_as_string(hide_password=True)}")
+    if replica_engine is not None:
+        parts.append(f"replica_url={replica_engine.url.render_as_string(hide_password=True)}")
+        parts.append(f"replica_sticky_seconds={READ_REPLICA_STICKY_SECONDS}")
+    return ", ".join(parts)
 
 # Creación de la sesión de la base de datos
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Modo asíncrono opcional (DB_ASYNC=1): engine con aiosqlite / asyncpg.
+# El engine síncrono se mantiene para crear tablas, importar y exportar.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Convierte una URL síncrona (sqlite://, postgresql+psycopg2://...) a su driver async."""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No hay driver asíncrono configurado para '{dialect}'.")
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
+
+ASYNC_MODE = _env_bool("DB_ASYNC", False)
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_MODE:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(to_async_url(SQLALCHEMY_DATABASE_URL), **POOL_SETTINGS)
+    if SQLITE_PRAGMAS:
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    # expire_on_commit=False: la respuesta se serializa fuera del contexto
+    # async y no debe disparar cargas perezosas
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if ASYNC_MODE and READ_REPLICA_URL:
+    async_replica_engine = create_async_engine(to_async_url(READ_REPLICA_URL), **POOL_SETTINGS)
+    if REPLICA_IS_SQLITE:
+        event.listen(async_replica_engine.sync_engine, "connect", _apply_replica_sqlite_pragmas)
+    AsyncReplicaSessionLocal = async_sessionmaker(async_replica_engine, autoflush=False, expire_on_commit=False)
+
 # Base para los modelos ORM de SQLAlchemy
 Base = declarative_base()
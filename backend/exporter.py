@@ -0,0 +1,78 @@
+"""
+Exportación del libro de transacciones en CSV o NDJSON.
+
+Las filas se leen con un cursor del servidor y se emiten en bloques, de modo
+que la memoria usada no depende del tamaño de la exportación.
+"""
+import csv
+import io
+import json
+
+import crud
+import schemas
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Filas por bloque enviado al cliente
+CHUNK_ROWS = 1000
+
+
+# Posición del importe (en céntimos en la base) dentro de cada fila
+AMOUNT_INDEX = crud.EXPORT_COLUMNS.index("amount")
+
+
+def _to_json_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _csv_values(row):
+    values = [_to_json_value(value) for value in row]
+    values[AMOUNT_INDEX] = schemas.format_cents(row[AMOUNT_INDEX])
+    return values
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(crud.EXPORT_COLUMNS)
+    pending = 0
+    for row in rows:
+        writer.writerow(_csv_values(row))
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        record = {name: _to_json_value(value) for name, value in zip(crud.EXPORT_COLUMNS, row)}
+        record["amount"] = schemas.from_cents(row[AMOUNT_INDEX])
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def stream_export(session_factory, format: str = "csv", **filters):
+    """
+    Generador de bloques de texto para un StreamingResponse. Abre su propia
+    sesión porque se consume después de que el endpoint haya retornado.
+    """
+    chunks = _csv_chunks if format == "csv" else _ndjson_chunks
+    db = session_factory()
+    try:
+        rows = crud.iter_transactions_for_export(db, chunk_size=CHUNK_ROWS, **filters)
+        for chunk in chunks(rows):
+            yield chunk.encode("utf-8")
+    finally:
+        db.close()
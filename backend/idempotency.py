@@ -0,0 +1,121 @@
+"""
+Claves de idempotencia (cabecera ``Idempotency-Key``) para las altas de
+transacciones y transferencias.
+
+La primera petición con una clave la reserva insertando su fila en
+idempotency_keys y crud guarda la respuesta en esa fila antes del commit,
+en la misma transacción que la escritura: o quedan las dos o ninguna. Un
+reintento con la misma clave recibe la respuesta guardada sin leer
+accounts ni transactions. Si dos peticiones iguales llegan a la vez, la
+clave primaria hace esperar a la segunda hasta que la primera confirma o
+deshace: entonces responde lo guardado o, si la primera falló, hace la
+alta ella misma.
+
+Las claves caducan a las IDEMPOTENCY_TTL_HOURS horas; las caducadas se
+purgan cada PURGE_EVERY reservas de cada proceso.
+"""
+import datetime
+import hashlib
+import itertools
+import json
+import os
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+MAX_KEY_LENGTH = 255
+PURGE_EVERY = 500
+
+_claims = itertools.count(1)
+
+
+class KeyReusedError(Exception):
+    """La clave ya se usó con una petición distinta."""
+
+
+class KeyInProgressError(Exception):
+    """Otra petición con la clave está en curso y no se pudo esperar su resultado."""
+
+
+def fingerprint(payload) -> str:
+    """Huella de la petición (modelo pydantic) para detectar claves reutilizadas."""
+    body = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _lookup(db: Session, scope: str, key: str):
+    return db.execute(
+        select(models.IdempotencyKey.fingerprint, models.IdempotencyKey.response)
+        .where(
+            models.IdempotencyKey.scope == scope,
+            models.IdempotencyKey.key == key,
+            models.IdempotencyKey.expires_at > datetime.datetime.now(),
+        )
+    ).first()
+
+
+def _replay(stored, request_fingerprint: str) -> str:
+    if stored.fingerprint != request_fingerprint:
+        raise KeyReusedError("La Idempotency-Key ya se usó con una petición distinta.")
+    return stored.response
+
+
+def _claim(db: Session, scope: str, key: str, request_fingerprint: str):
+    now = datetime.datetime.now()
+    condition = (models.IdempotencyKey.scope == scope) & (models.IdempotencyKey.key == key)
+    # Una fila caducada aún no purgada no debe bloquear la clave
+    db.execute(delete(models.IdempotencyKey).where(condition, models.IdempotencyKey.expires_at <= now))
+    db.execute(insert(models.IdempotencyKey).values(
+        scope=scope, key=key, fingerprint=request_fingerprint, created_at=now,
+        expires_at=now + datetime.timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+    ))
+    if next(_claims) % PURGE_EVERY == 0:
+        db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at <= now))
+
+
+def run(db: Session, scope: str, key: str, request_fingerprint: str, serialize, fn, **kwargs):
+    """
+    Ejecuta fn(db, **kwargs) una sola vez por (scope, key). Devuelve
+    (repetida, resultado): en una repetición el resultado es el JSON de la
+    respuesta guardada; si no, lo que devuelva fn, que debe llamar a
+    store_response antes de su commit. serialize convierte ese resultado en
+    el JSON de la respuesta.
+    """
+    stored = _lookup(db, scope, key)
+    if stored is not None:
+        return True, _replay(stored, request_fingerprint)
+    try:
+        _claim(db, scope, key, request_fingerprint)
+    except IntegrityError:
+        # Otra petición con la clave confirmó mientras se esperaba su bloqueo
+        db.rollback()
+        stored = _lookup(db, scope, key)
+        if stored is None:
+            raise KeyInProgressError("Hay otra petición en curso con la misma Idempotency-Key.")
+        return True, _replay(stored, request_fingerprint)
+
+    db.info["idempotency_claim"] = (scope, key, serialize)
+    try:
+        return False, fn(db, **kwargs)
+    finally:
+        # Sin respuesta guardada (404, error): se deshace y la clave queda libre
+        if db.info.pop("idempotency_claim", None) is not None:
+            db.rollback()
+
+
+def store_response(db: Session, result):
+    """Guarda la respuesta de la petición con clave en curso, si la hay. No hace commit."""
+    claim = db.info.pop("idempotency_claim", None)
+    if claim is None:
+        return
+    scope, key, serialize = claim
+    db.flush()
+    db.execute(
+        update(models.IdempotencyKey)
+        .where(models.IdempotencyKey.scope == scope, models.IdempotencyKey.key == key)
+        .values(response=json.dumps(serialize(result), separators=(",", ":")))
+    )
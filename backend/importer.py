@@ -0,0 +1,279 @@
+"""
+Importación masiva de extractos bancarios (CSV u OFX).
+
+Los ficheros se leen línea a línea, nunca completos en memoria, y las
+transacciones se insertan en lotes con ``crud.bulk_create_transactions``.
+
+Uso como comando (desde ``backend/``):
+    python importer.py extracto.csv --account-id 1
+    python importer.py extracto.ofx --account-id 1 --format ofx --batch-size 5000
+"""
+import argparse
+import csv
+import datetime
+import io
+import re
+import sys
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from sqlalchemy.orm import Session
+
+import crud
+import models
+import search
+
+# Número máximo de rechazos que se devuelven con detalle
+MAX_REPORTED_REJECTIONS = 1000
+
+CSV_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%Y %H:%M")
+
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+class ImportRowError(ValueError):
+    """Fila del extracto que no se puede convertir en transacción."""
+
+
+def parse_amount(value: str) -> int:
+    """Convierte '1.234,56', '1,234.56' o '-12.5' en céntimos (sin pasar por float)."""
+    value = value.strip().replace(" ", "")
+    if not value:
+        raise ImportRowError("Importe vacío.")
+    if "," in value and "." in value:
+        # El separador que aparece último es el decimal
+        if value.rfind(",") > value.rfind("."):
+            value = value.replace(".", "").replace(",", ".")
+        else:
+            value = value.replace(",", "")
+    elif "," in value:
+        value = value.replace(",", ".")
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ImportRowError(f"Importe inválido: {value!r}.")
+    if not amount.is_finite():
+        raise ImportRowError(f"Importe inválido: {value!r}.")
+    return int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def parse_csv_date(value: str) -> datetime.datetime:
+    value = value.strip()
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in CSV_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ImportRowError(f"Fecha inválida: {value!r}.")
+
+
+def parse_ofx_date(value: str) -> datetime.datetime:
+    """DTPOSTED de OFX: AAAAMMDD[HHMMSS[.XXX]][[zona]]."""
+    digits = value.strip().split("[")[0].split(".")[0]
+    try:
+        if len(digits) >= 14:
+            return datetime.datetime.strptime(digits[:14], "%Y%m%d%H%M%S")
+        return datetime.datetime.strptime(digits[:8], "%Y%m%d")
+    except ValueError:
+        raise ImportRowError(f"Fecha OFX inválida: {value!r}.")
+
+
+def _row_from_amount(amount_cents: int, date: datetime.datetime, description, type=None):
+    """El signo del importe decide el tipo si el extracto no lo indica."""
+    if type is None:
+        type = "income" if amount_cents >= 0 else "expense"
+    elif type not in ("income", "expense"):
+        raise ImportRowError(f"Tipo inválido: {type!r}.")
+    return {"description": description or None, "amount_cents": abs(amount_cents), "type": type, "date": date}
+
+
+def iter_csv(stream, delimiter: str = ","):
+    """
+    Genera (línea, fila) de un CSV con cabecera. Columnas reconocidas:
+    date/fecha, amount/importe, description/descripcion, type/tipo,
+    category/categoria. Las filas inválidas se generan como ImportRowError.
+    """
+    aliases = {
+        "fecha": "date", "importe": "amount", "monto": "amount",
+        "descripcion": "description", "descripción": "description", "concepto": "description",
+        "tipo": "type", "categoria": "category", "categoría": "category",
+    }
+    reader = csv.reader(stream, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [aliases.get(name.strip().lower(), name.strip().lower()) for name in header]
+    missing = {"date", "amount"} - set(columns)
+    if missing:
+        raise ImportRowError(f"Faltan columnas en la cabecera: {', '.join(sorted(missing))}.")
+
+    for values in reader:
+        line = reader.line_num
+        if not any(value.strip() for value in values):
+            continue
+        try:
+            if len(values) != len(columns):
+                raise ImportRowError(f"Se esperaban {len(columns)} columnas y hay {len(values)}.")
+            record = dict(zip(columns, values))
+            row = _row_from_amount(
+                parse_amount(record["amount"]),
+                parse_csv_date(record["date"]),
+                record.get("description", "").strip(),
+                record.get("type", "").strip().lower() or None,
+            )
+            row["category"] = record.get("category", "").strip() or None
+            yield line, row
+        except ImportRowError as e:
+            yield line, e
+
+
+def iter_ofx(stream):
+    """
+    Genera (línea, fila) por cada <STMTTRN> de un OFX (SGML o XML), leyendo
+    el fichero línea a línea.
+    """
+    current = None
+    start_line = 0
+    for line_number, line in enumerate(stream, start=1):
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not closing:
+                    current, start_line = {}, line_number
+                    continue
+                if current is not None:
+                    yield start_line, _ofx_transaction(current)
+                current = None
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+    if current is not None:
+        yield start_line, ImportRowError("Bloque STMTTRN sin cerrar.")
+
+
+def _ofx_transaction(fields):
+    try:
+        if "TRNAMT" not in fields or "DTPOSTED" not in fields:
+            raise ImportRowError("STMTTRN sin TRNAMT o DTPOSTED.")
+        description = fields.get("NAME") or fields.get("MEMO")
+        row = _row_from_amount(parse_amount(fields["TRNAMT"]), parse_ofx_date(fields["DTPOSTED"]), description)
+        row["category"] = None
+        return row
+    except ImportRowError as e:
+        return e
+
+
+def import_statement(
+    db: Session,
+    stream,
+    account_id: int,
+    format: str = "csv",
+    batch_size: int = 1000,
+    delimiter: str = ",",
+):
+    """
+    Importa un extracto en la cuenta indicada y devuelve un resumen con filas
+    importadas, rechazadas (con número de línea) y filas por segundo.
+    Cada lote se confirma por separado; un lote fallido no deshace los anteriores.
+    """
+    if crud.get_account(db, account_id=account_id) is None:
+        raise ValueError("La cuenta especificada no existe.")
+    if format == "csv":
+        rows = iter_csv(stream, delimiter=delimiter)
+    elif format == "ofx":
+        rows = iter_ofx(stream)
+    else:
+        raise ValueError(f"Formato no soportado: {format}.")
+
+    categories = {category.name.lower(): category.id for category in db.query(models.Category)}
+    cutoff = crud.get_archive_cutoff(db)
+    archived_before = datetime.datetime.combine(cutoff, datetime.time()) if cutoff is not None else None
+    started = time.perf_counter()
+    imported = 0
+    rejected_count = 0
+    rejected = []
+    batch = []
+
+    def reject(line, reason):
+        nonlocal rejected_count
+        rejected_count += 1
+        if len(rejected) < MAX_REPORTED_REJECTIONS:
+            rejected.append({"line": line, "reason": reason})
+
+    try:
+        for line, row in rows:
+            if isinstance(row, ImportRowError):
+                reject(line, str(row))
+                continue
+            category = row.pop("category")
+            if category is not None and category.lower() not in categories:
+                reject(line, f"Categoría desconocida: {category!r}.")
+                continue
+            if archived_before is not None and row["date"] < archived_before:
+                reject(line, str(crud.ArchivedPeriodError(cutoff)))
+                continue
+            row["category_id"] = categories.get(category.lower()) if category else None
+            row["account_id"] = account_id
+            batch.append(row)
+            if len(batch) >= batch_size:
+                imported += crud.bulk_create_transactions(db, batch)
+                batch = []
+    except ImportRowError as e:
+        # Error de cabecera: no hay filas que procesar
+        reject(1, str(e))
+    imported += crud.bulk_create_transactions(db, batch)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "imported": imported,
+        "rejected_count": rejected_count,
+        "rejected": rejected,
+        "elapsed_seconds": elapsed,
+        "rows_per_second": imported / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def open_text(binary_stream, encoding: str = "utf-8-sig"):
+    """Envuelve un flujo binario para leerlo como texto línea a línea."""
+    return io.TextIOWrapper(binary_stream, encoding=encoding, newline="")
+
+
+def main():
+    from database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Importa un extracto bancario CSV u OFX.")
+    parser.add_argument("path")
+    parser.add_argument("--account-id", type=int, required=True)
+    parser.add_argument("--format", choices=("csv", "ofx"), default=None, help="Por defecto, según la extensión.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--encoding", default="utf-8-sig")
+    args = parser.parse_args()
+
+    format = args.format or ("ofx" if args.path.lower().endswith((".ofx", ".qfx")) else "csv")
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_search_index(engine)
+    with SessionLocal() as db, open(args.path, encoding=args.encoding, newline="") as stream:
+        try:
+            result = import_statement(
+                db, stream, account_id=args.account_id, format=format,
+                batch_size=args.batch_size, delimiter=args.delimiter
+            )
+        except ValueError as e:
+            print(e)
+            return 1
+
+    for rejection in result["rejected"]:
+        print(f"Línea {rejection['line']}: {rejection['reason']}")
+    print(
+        f"{result['imported']} filas importadas, {result['rejected_count']} rechazadas "
+        f"en {result['elapsed_seconds']:.2f}s ({result['rows_per_second']:.0f} filas/s)."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,77 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict
+from pydantic import TypeAdapter
+from typing import List, Optional, Dict, Literal, Union
 import logging
+import datetime
+import hashlib
+import contextlib
 
 # Importaciones locales
 import models
 import schemas
 import crud
-from database import SessionLocal, engine
+import importer
+import exporter
+import metrics
+import changefeed
+import idempotency
+import migrations
+import partitions
+import pivot
+import replica
+import search
+from database import (
+    SessionLocal, AsyncSessionLocal, ReplicaSessionLocal, AsyncReplicaSessionLocal,
+    engine, async_engine, replica_engine, async_replica_engine, describe_engine_settings,
+)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Instrumentación de SQL (sentencias y tiempo por petición)
+metrics.instrument_engine(engine)
+if async_engine is not None:
+    metrics.instrument_engine(async_engine.sync_engine)
+for read_engine in (replica_engine, async_replica_engine and async_replica_engine.sync_engine):
+    if read_engine is not None:
+        metrics.instrument_engine(read_engine)
+
 # Crea las tablas en la base de datos
 try:
     models.Base.metadata.create_all(bind=engine)
+    # create_all no añade índices nuevos a tablas ya existentes
+    for index in models.Transaction.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    # ...ni columnas nuevas
+    migrations.migrate_amounts_to_cents(engine)
+    migrations.add_missing_columns(engine)
+    migrations.migrate_rollup_key_index(engine)
+    if search.ensure_search_index(engine):
+        logger.info("Índice de búsqueda de descripciones creado.")
+    for name in partitions.maintain_partitions(engine):
+        logger.info(f"Partición de transacciones creada: {name}.")
+    # Bases existentes: poblar los rollups diarios la primera vez
+    with SessionLocal() as db:
+        crud.ensure_table_versions(db)
+        if crud.rollups_need_rebuild(db):
+            logger.info(f"Rollups diarios regenerados: {crud.rebuild_rollups(db)} filas.")
+        baselined = crud.baseline_opening_balances(db)
+        if baselined:
+            logger.info(f"Balance inicial fijado en {baselined} cuentas existentes.")
+        snapshots = crud.snapshot_balances(db)
+        if snapshots:
+            logger.info(f"Snapshots de balance creados: {snapshots}.")
     logger.info("Tablas de la base de datos verificadas/creadas exitosamente.")
+    logger.info(f"Configuración de base de datos: {describe_engine_settings()}")
+    if AsyncSessionLocal is not None:
+        logger.info("Modo asíncrono activado (DB_ASYNC): los endpoints usan el engine async.")
+    if replica.enabled():
+        logger.info("Réplica de lectura activada (READ_REPLICA_URL): los GET de listados y reportes la usan.")
 except Exception as e:
     logger.error(f"No se pudo conectar a la base de datos o crear las tablas: {e}")
     logger.warning("La aplicación continuará ejecutándose, pero las operaciones de base de datos fallarán.")
@@ -35,6 +89,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(replica.ReadYourWritesMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Dependencia para obtener la sesión de la BD
 def get_db():
@@ -44,46 +100,340 @@ def get_db():
     finally:
         db.close()
 
+class SyncRunner:
+    """Ejecuta funciones de crud con una Session síncrona en el threadpool."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+class AsyncRunner:
+    """
+    Ejecuta funciones de crud sobre una AsyncSession con run_sync: la E/S pasa
+    por el driver asíncrono y no ocupa un hilo mientras espera a la base.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await self.session.run_sync(fn, *args, **kwargs)
+
+DBRunner = Union[SyncRunner, AsyncRunner]
+
+def validated(schema, fn):
+    """
+    Envuelve una función de crud para convertir su resultado en `schema`
+    dentro de la sesión, cuando la respuesta necesita relaciones que se
+    cargarían de forma perezosa (no permitido con AsyncSession).
+    """
+    def call(session, *args, **kwargs):
+        result = fn(session, *args, **kwargs)
+        return None if result is None else schema.model_validate(result)
+    return call
+
+@contextlib.asynccontextmanager
+async def open_runner(session_factory, async_session_factory):
+    if async_session_factory is not None:
+        async with async_session_factory() as session:
+            yield AsyncRunner(session)
+        return
+    db = session_factory()
+    try:
+        yield SyncRunner(db)
+    finally:
+        await run_in_threadpool(db.close)
+
+# Dependencia para los endpoints async: modo síncrono o asíncrono según DB_ASYNC
+async def get_db_runner():
+    async with open_runner(SessionLocal, AsyncSessionLocal) as runner:
+        yield runner
+
+# Igual para los GET de listados y reportes: la réplica si está configurada
+# y el cliente no acaba de escribir (ver replica.py)
+async def get_read_db_runner(request: Request):
+    if replica.reads_from_replica(request):
+        factories = ReplicaSessionLocal, AsyncReplicaSessionLocal
+    else:
+        factories = SessionLocal, AsyncSessionLocal
+    async with open_runner(*factories) as runner:
+        yield runner
+
+class ConditionalGet:
+    """
+    Dependencia para GET con ETag. La etiqueta sale de las versiones de las
+    tablas de las que depende la respuesta (una consulta a table_versions),
+    la URL y la fecha del día (por los reportes del mes en curso). Si coincide
+    con If-None-Match se responde 304 sin ejecutar el endpoint.
+    `tables` puede ser una tupla o una función de los parámetros de consulta.
+    Las versiones se leen en la misma sesión que el endpoint y antes que él,
+    y las escrituras incrementan en la misma transacción las de las tablas y
+    las de las etiquetas de caché: un cuerpo cacheado se busca por versiones
+    al menos tan recientes como las del ETag, nunca anteriores.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    async def __call__(self, request: Request, response: Response, db: DBRunner = Depends(get_read_db_runner)):
+        tables = self.tables(request.query_params) if callable(self.tables) else self.tables
+        versions = await db.run(crud.get_table_versions, names=tables)
+        key = repr((
+            sorted(versions.items()), request.url.path,
+            sorted(request.query_params.multi_items()), datetime.date.today().isoformat(),
+        ))
+        etag = f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
 # --- Endpoints ---
 
 @app.get("/")
 def read_root():
     return {"message": "Bienvenido a la API de Gestión de Ingresos y Gastos"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Endpoints para Cuentas
 @app.post("/api/accounts/", response_model=schemas.Account, tags=["Accounts"])
-def create_account_endpoint(account: schemas.AccountCreate, db: Session = Depends(get_db)):
-    db_account = crud.get_account_by_name(db, name=account.name)
+async def create_account_endpoint(account: schemas.AccountCreate, db: DBRunner = Depends(get_db_runner)):
+    db_account = await db.run(crud.get_account_by_name, name=account.name)
     if db_account:
         raise HTTPException(status_code=400, detail="Ya existe una cuenta con este nombre.")
-    return crud.create_account(db=db, account=account)
+    return await db.run(validated(schemas.Account, crud.create_account), account=account)
 
-@app.get("/api/accounts/", response_model=List[schemas.Account], tags=["Accounts"])
-def read_accounts_endpoint(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    accounts = crud.get_accounts(db, skip=skip, limit=limit)
-    return accounts
+@app.get("/api/accounts/", response_model=Union[List[schemas.AccountSummary], List[schemas.Account]], tags=["Accounts"])
+async def read_accounts_endpoint(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Literal["full", "summary"] = Query("full", description="'summary' omite las transacciones; usar /api/transactions/ para paginarlas."),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(
+        lambda query: ("accounts",) if query.get("fields") == "summary" else ("accounts", "transactions")
+    )),
+):
+    if fields == "summary":
+        accounts = await db.run(crud.get_accounts, skip=skip, limit=limit)
+        return [schemas.AccountSummary.model_validate(account) for account in accounts]
+    return await db.run(crud.get_accounts, skip=skip, limit=limit, include_transactions=True)
 
 @app.put("/api/accounts/{account_id}", response_model=schemas.Account, tags=["Accounts"])
-def update_account_endpoint(account_id: int, account: schemas.AccountUpdate, db: Session = Depends(get_db)):
-    db_account = crud.update_account(db, account_id=account_id, account_data=account)
+async def update_account_endpoint(account_id: int, account: schemas.AccountUpdate, db: DBRunner = Depends(get_db_runner)):
+    db_account = await db.run(validated(schemas.Account, crud.update_account), account_id=account_id, account_data=account)
     if db_account is None:
         raise HTTPException(status_code=404, detail="Cuenta no encontrada.")
     return db_account
 
+@app.get("/api/accounts/{account_id}/balance", response_model=schemas.AccountBalance, tags=["Accounts"])
+async def read_account_balance_endpoint(
+    account_id: int,
+    date: Optional[datetime.date] = Query(None, description="Balance al final de este día; hoy por defecto."),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("accounts", "transactions"))),
+):
+    balance = await db.run(crud.get_balance_at, account_id=account_id, day=date or datetime.date.today())
+    if balance is None:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada.")
+    return balance
+
+@app.get("/api/accounts/{account_id}/balance_history", response_model=schemas.BalanceHistory, tags=["Accounts"])
+async def read_account_balance_history_endpoint(
+    account_id: int,
+    start: datetime.date = Query(..., description="Incluida."),
+    end: datetime.date = Query(..., description="Excluida."),
+    granularity: Literal["day", "week", "month"] = "day",
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("accounts", "transactions"))),
+):
+    try:
+        history = await db.run(
+            crud.get_balance_history, account_id=account_id, start=start, end=end, granularity=granularity
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if history is None:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada.")
+    return history
+
+# Cabecera opcional de las altas: un reintento con la misma clave recibe la respuesta guardada
+IdempotencyKeyHeader = Header(None, max_length=idempotency.MAX_KEY_LENGTH, description="Clave para reintentar sin duplicar la alta.")
+
+def _serializer(response_model):
+    adapter = TypeAdapter(response_model)
+    return lambda result: adapter.dump_python(adapter.validate_python(result, from_attributes=True), mode="json")
+
+async def run_idempotent(db: DBRunner, key: Optional[str], scope: str, payload, serialize, fn, **kwargs):
+    """
+    Ejecuta la función de crud; con Idempotency-Key, una sola vez por clave:
+    las repeticiones devuelven la respuesta guardada tal cual.
+    """
+    if key is None:
+        return await db.run(fn, **kwargs)
+    try:
+        replayed, result = await db.run(
+            idempotency.run, scope, key, idempotency.fingerprint(payload), serialize, fn, **kwargs
+        )
+    except idempotency.KeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except idempotency.KeyInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if replayed:
+        return Response(content=result, media_type="application/json", headers={"Idempotent-Replayed": "true"})
+    return result
+
+serialize_transaction = _serializer(schemas.Transaction)
+serialize_transfer = _serializer(Dict[str, schemas.Transaction])
+
 # Endpoints para Transacciones
 @app.post("/api/transactions/", response_model=schemas.Transaction, tags=["Transactions"])
-def create_transaction_endpoint(transaction: schemas.TransactionCreate, db: Session = Depends(get_db)):
+async def create_transaction_endpoint(
+    transaction: schemas.TransactionCreate,
+    idempotency_key: Optional[str] = IdempotencyKeyHeader,
+    db: DBRunner = Depends(get_db_runner),
+):
     # La lógica de negocio (actualizar balance) está en la función crud
-    db_transaction = crud.create_transaction(db=db, transaction=transaction)
+    try:
+        db_transaction = await run_idempotent(
+            db, idempotency_key, "transactions", transaction, serialize_transaction,
+            crud.create_transaction, transaction=transaction
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_transaction is None:
         raise HTTPException(status_code=404, detail="La cuenta especificada no existe.")
     return db_transaction
 
+@app.get("/api/transactions/", response_model=schemas.TransactionPage, tags=["Transactions"])
+async def read_transactions_endpoint(
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    type: Optional[str] = None,
+    date_from: Optional[datetime.datetime] = Query(None, description="Incluido."),
+    date_to: Optional[datetime.datetime] = Query(None, description="Excluido."),
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    cursor: Optional[str] = Query(None, description="Valor de next_cursor de la página anterior."),
+    limit: int = Query(50, ge=1, le=500),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("transactions",))),
+):
+    try:
+        items, next_cursor = await db.run(
+            crud.get_transactions, account_id=account_id, category_id=category_id, type=type,
+            date_from=date_from, date_to=date_to, min_amount_cents=schemas.to_cents(min_amount),
+            max_amount_cents=schemas.to_cents(max_amount), cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/api/transactions/search", response_model=schemas.TransactionSearchPage, tags=["Transactions"])
+async def search_transactions_endpoint(
+    q: str = Query(..., min_length=1, description="Palabras a buscar en la descripción (prefijos, todas deben aparecer)."),
+    account_id: Optional[int] = None,
+    date_from: Optional[datetime.datetime] = Query(None, description="Incluido."),
+    date_to: Optional[datetime.datetime] = Query(None, description="Excluido."),
+    offset: int = Query(0, ge=0, le=search.SEARCH_RANK_WINDOW, description="Dentro de las coincidencias ordenadas por relevancia."),
+    before_id: Optional[int] = Query(None, description="Valor de next_before_id: coincidencias anteriores a la ventana ordenada."),
+    limit: int = Query(50, ge=1, le=500),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("transactions",))),
+):
+    try:
+        rows, next_offset, next_before_id = await db.run(
+            search.search_transactions, query=q, account_id=account_id,
+            date_from=date_from, date_to=date_to, offset=offset, limit=limit, before_id=before_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "items": [{**schemas.Transaction.model_validate(transaction).model_dump(), "rank": rank} for transaction, rank in rows],
+        "next_offset": next_offset,
+        "next_before_id": next_before_id,
+    }
+
+@app.post("/api/transactions/import", response_model=schemas.ImportResult, tags=["Transactions"])
+def import_transactions_endpoint(
+    account_id: int,
+    file: UploadFile = File(...),
+    format: Literal["csv", "ofx"] = "csv",
+    batch_size: int = Query(1000, ge=1, le=50000),
+    delimiter: str = Query(",", min_length=1, max_length=1),
+    encoding: str = "utf-8-sig",
+    db: Session = Depends(get_db),
+):
+    # UploadFile ya está en disco/spool: se lee como texto línea a línea
+    stream = importer.open_text(file.file, encoding=encoding)
+    try:
+        return importer.import_statement(
+            db, stream, account_id=account_id, format=format,
+            batch_size=batch_size, delimiter=delimiter
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+
+@app.get("/api/transactions/export", tags=["Transactions"])
+def export_transactions_endpoint(
+    request: Request,
+    format: Literal["csv", "ndjson"] = "csv",
+    account_id: Optional[int] = None,
+    date_from: Optional[datetime.datetime] = Query(None, description="Incluido."),
+    date_to: Optional[datetime.datetime] = Query(None, description="Excluido."),
+):
+    return StreamingResponse(
+        exporter.stream_export(
+            ReplicaSessionLocal if replica.reads_from_replica(request) else SessionLocal, format=format, account_id=account_id,
+            date_from=date_from, date_to=date_to
+        ),
+        media_type=exporter.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transacciones.{format}"'},
+    )
+
+# Límite de elementos por petición en los endpoints batch
+MAX_BATCH_ITEMS = 10000
+
+def _check_batch_size(items):
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Como máximo {MAX_BATCH_ITEMS} elementos por lote.")
+
+@app.post("/api/transactions/batch", response_model=List[schemas.Transaction], tags=["Transactions"])
+async def create_transactions_batch_endpoint(transactions: List[schemas.TransactionCreate], db: DBRunner = Depends(get_db_runner)):
+    # Todo o nada: un solo commit; el resultado sigue el orden de la petición
+    _check_batch_size(transactions)
+    try:
+        return await db.run(crud.create_transactions_batch, transactions=transactions)
+    except crud.BatchValidationError as e:
+        raise HTTPException(status_code=400, detail=e.errors)
+
+@app.post("/api/transfers/batch", response_model=List[Dict[str, schemas.Transaction]], tags=["Transfers"])
+async def create_transfers_batch_endpoint(transfers: List[schemas.TransferCreate], db: DBRunner = Depends(get_db_runner)):
+    _check_batch_size(transfers)
+    try:
+        return await db.run(crud.create_transfers_batch, transfers=transfers)
+    except crud.BatchValidationError as e:
+        raise HTTPException(status_code=400, detail=e.errors)
+
 # Nuevo Endpoint para Transferencias
 @app.post("/api/transfers/", response_model=Dict[str, schemas.Transaction], tags=["Transfers"])
-def create_transfer_endpoint(transfer: schemas.TransferCreate, db: Session = Depends(get_db)):
+async def create_transfer_endpoint(
+    transfer: schemas.TransferCreate,
+    idempotency_key: Optional[str] = IdempotencyKeyHeader,
+    db: DBRunner = Depends(get_db_runner),
+):
     try:
-        result = crud.create_transfer(db=db, transfer=transfer)
+        result = await run_idempotent(
+            db, idempotency_key, "transfers", transfer, serialize_transfer,
+            crud.create_transfer, transfer=transfer
+        )
         if result is None:
             raise HTTPException(status_code=404, detail="Una o ambas cuentas no fueron encontradas.")
         return result
@@ -92,70 +442,203 @@ def create_transfer_endpoint(transfer: schemas.TransferCreate, db: Session = Dep
 
 # Endpoints para Categorías
 @app.post("/api/categories/", response_model=schemas.Category, tags=["Categories"])
-def create_category_endpoint(category: schemas.CategoryCreate, db: Session = Depends(get_db)):
-    db_category = crud.get_category_by_name(db, name=category.name)
+async def create_category_endpoint(category: schemas.CategoryCreate, db: DBRunner = Depends(get_db_runner)):
+    db_category = await db.run(crud.get_category_by_name, name=category.name)
     if db_category:
         raise HTTPException(status_code=400, detail="Ya existe una categoría con este nombre.")
-    return crud.create_category(db=db, category=category)
+    return await db.run(crud.create_category, category=category)
 
 @app.put("/api/categories/{category_id}", response_model=schemas.Category, tags=["Categories"])
-def update_category_endpoint(category_id: int, category: schemas.CategoryCreate, db: Session = Depends(get_db)):
-    db_category = crud.update_category(db, category_id=category_id, category_data=category)
+async def update_category_endpoint(category_id: int, category: schemas.CategoryCreate, db: DBRunner = Depends(get_db_runner)):
+    db_category = await db.run(crud.update_category, category_id=category_id, category_data=category)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Categoría no encontrada.")
     return db_category
 
 @app.delete("/api/categories/{category_id}", response_model=schemas.Category, tags=["Categories"])
-def delete_category_endpoint(category_id: int, db: Session = Depends(get_db)):
-    db_category = crud.delete_category(db, category_id=category_id)
+async def delete_category_endpoint(category_id: int, db: DBRunner = Depends(get_db_runner)):
+    db_category = await db.run(crud.delete_category, category_id=category_id)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Categoría no encontrada.")
     return db_category
 
-@app.get("/api/categories/", response_model=List[schemas.Category], tags=["Categories"])
-def read_categories_endpoint(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    categories = crud.get_categories(db, skip=skip, limit=limit)
+@app.get("/api/categories/", response_model=Union[List[schemas.Category], List[schemas.CategoryStats]], tags=["Categories"])
+async def read_categories_endpoint(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Literal["summary", "full"] = Query("summary", description="'full' añade el número de transacciones de cada categoría."),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(
+        lambda query: ("categories", "transactions") if query.get("fields") == "full" else ("categories",)
+    )),
+):
+    if fields == "full":
+        return [schemas.CategoryStats(**row) for row in await db.run(crud.get_categories_with_stats, skip=skip, limit=limit)]
+    categories = await db.run(crud.get_categories, skip=skip, limit=limit)
     return categories
 
+# Conciliación
+
+@app.post("/api/reconciliation", response_model=schemas.ReconciliationReport, tags=["Reconciliation"])
+async def reconcile_endpoint(
+    repair: bool = Query(False, description="Corregir los balances que no cuadran con el libro."),
+    incremental: bool = Query(False, description="Solo las cuentas con cambios desde la última ejecución."),
+    db: DBRunner = Depends(get_db_runner),
+):
+    return await db.run(crud.reconcile_balances, repair=repair, incremental=incremental)
+
+# Feed de cambios
+
+@app.get("/api/changes", response_model=schemas.ChangePage, tags=["Changes"])
+async def read_changes_endpoint(
+    since: Optional[int] = Query(None, description="Último seq recibido; sin él solo se devuelve el seq actual."),
+    limit: int = Query(500, ge=1, le=5000),
+    db: DBRunner = Depends(get_db_runner),
+):
+    return await db.run(crud.get_changes, since=since, limit=limit)
+
+async def _read_changes(since, limit):
+    # Una sesión corta por lectura: el stream puede durar horas
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(crud.get_changes, since=since, limit=limit)
+
+    def read():
+        with SessionLocal() as db:
+            return crud.get_changes(db, since=since, limit=limit)
+    return await run_in_threadpool(read)
+
+@app.get("/api/changes/stream", tags=["Changes"])
+async def stream_changes_endpoint(
+    request: Request,
+    since: Optional[int] = Query(None, description="Alternativa a la cabecera Last-Event-ID."),
+):
+    """
+    Server-Sent Events con los cambios de transacciones y cuentas. Cada
+    evento lleva id (seq); al reconectar, EventSource envía Last-Event-ID y
+    el stream continúa desde ahí.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id is not None:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID inválido.")
+    if since is None:
+        since = (await _read_changes(None, 0))["last_seq"]
+    return StreamingResponse(
+        changefeed.event_stream(_read_changes, since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Endpoint para Reportes
-import datetime
 
 @app.get("/api/reports/monthly", response_model=schemas.MonthlyReport, tags=["Reports"])
-def read_monthly_report_endpoint(year: int = None, month: int = None, db: Session = Depends(get_db)):
+async def read_monthly_report_endpoint(
+    year: Optional[int] = Query(None, ge=1, le=9999), month: Optional[int] = Query(None, ge=1, le=12),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("transactions",))),
+):
     today = datetime.date.today()
     if year is None:
         year = today.year
     if month is None:
         month = today.month
 
-    report_data = crud.get_monthly_report(db, year=year, month=month)
-    return report_data
+    try:
+        return await db.run(crud.get_monthly_report, year=year, month=month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/reports/daily", response_model=schemas.DailyReport, tags=["Reports"])
-def read_daily_report_endpoint(year: int, month: int, day: int, db: Session = Depends(get_db)):
-    report_data = crud.get_daily_report(db, year=year, month=month, day=day)
-    return report_data
+async def read_daily_report_endpoint(
+    year: int = Query(..., ge=1, le=9999), month: int = Query(..., ge=1, le=12), day: int = Query(..., ge=1, le=31),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("transactions",))),
+):
+    try:
+        return await db.run(crud.get_daily_report, year=year, month=month, day=day)
+    except ValueError as e:
+        # Días que no existen en el mes, como el 30 de febrero
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/api/reports/categorized_expenses", tags=["Reports"])
-def get_categorized_expenses_report_endpoint(year: int = None, month: int = None, db: Session = Depends(get_db)):
+@app.get("/api/reports/categorized_expenses", response_model=List[schemas.CategoryExpense], tags=["Reports"])
+async def get_categorized_expenses_report_endpoint(
+    year: Optional[int] = Query(None, ge=1, le=9999), month: Optional[int] = Query(None, ge=1, le=12),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("transactions", "categories"))),
+):
     today = datetime.date.today()
     if year is None:
         year = today.year
     if month is None:
         month = today.month
-    report_data = crud.get_categorized_expenses_report(db, year=year, month=month)
-    return report_data
+    try:
+        return await db.run(crud.get_categorized_expenses_report, year=year, month=month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/reports/timeseries", response_model=schemas.TimeSeriesReport, tags=["Reports"])
+async def read_time_series_report_endpoint(
+    start: datetime.date = Query(..., description="Incluida."),
+    end: datetime.date = Query(..., description="Excluida."),
+    granularity: Literal["day", "week", "month"] = "month",
+    split_by: Optional[Literal["account", "category"]] = None,
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("transactions", "categories", "accounts"))),
+):
+    try:
+        return await db.run(
+            crud.get_time_series_report, start=start, end=end,
+            granularity=granularity, split_by=split_by
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/reports/pivot", response_model=schemas.PivotReport, tags=["Reports"])
+async def read_pivot_report_endpoint(
+    start: datetime.date = Query(..., description="Incluida."),
+    end: datetime.date = Query(..., description="Excluida."),
+    rows: Literal["category", "account", "type", "period"] = "category",
+    columns: Literal["category", "account", "type", "period"] = "period",
+    granularity: Literal["day", "week", "month", "year"] = "month",
+    measure: Literal["net", "amount", "count"] = Query("net", description="'net' con signo (efecto en el balance), 'amount' sin signo, 'count' transacciones."),
+    account_id: Optional[List[int]] = Query(None, description="Solo estas cuentas."),
+    category_id: Optional[List[int]] = Query(None, description="Solo estas categorías."),
+    type: Optional[List[Literal["income", "expense", "transfer_in", "transfer_out"]]] = Query(None, description="Solo estos tipos."),
+    db: DBRunner = Depends(get_read_db_runner),
+    _etag: None = Depends(ConditionalGet(("transactions", "categories", "accounts"))),
+):
+    # Filtros como tuplas ordenadas: forman parte de la clave de la caché
+    filters = {
+        name: tuple(sorted(set(values))) if values else None
+        for name, values in (("account_ids", account_id), ("category_ids", category_id), ("types", type))
+    }
+    try:
+        return await db.run(
+            pivot.get_pivot_report, start=start, end=end, rows=rows, columns=columns,
+            granularity=granularity, measure=measure, **filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/api/transactions/{transaction_id}", response_model=schemas.Transaction, tags=["Transactions"])
-def delete_transaction_endpoint(transaction_id: int, db: Session = Depends(get_db)):
-    db_transaction = crud.delete_transaction(db, transaction_id=transaction_id)
+async def delete_transaction_endpoint(transaction_id: int, db: DBRunner = Depends(get_db_runner)):
+    try:
+        db_transaction = await db.run(crud.delete_transaction, transaction_id=transaction_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_transaction is None:
         raise HTTPException(status_code=404, detail="No se encontró la transacción.")
     return db_transaction
 
 @app.put("/api/transactions/{transaction_id}", response_model=schemas.Transaction, tags=["Transactions"])
-def update_transaction_endpoint(transaction_id: int, transaction: schemas.TransactionUpdate, db: Session = Depends(get_db)):
-    db_transaction = crud.update_transaction(db, transaction_id=transaction_id, transaction_data=transaction)
+async def update_transaction_endpoint(transaction_id: int, transaction: schemas.TransactionUpdate, db: DBRunner = Depends(get_db_runner)):
+    try:
+        db_transaction = await db.run(crud.update_transaction, transaction_id=transaction_id, transaction_data=transaction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_transaction is None:
         raise HTTPException(status_code=404, detail="No se encontró la transacción.")
     return db_transaction
\ No newline at end of file
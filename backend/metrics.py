@@ -0,0 +1,206 @@
+"""
+Instrumentación de peticiones y de SQL con exposición en formato Prometheus.
+
+* Un middleware mide la latencia de cada petición por ruta.
+* Los eventos before/after_cursor_execute de SQLAlchemy cuentan sentencias y
+  tiempo de base de datos de la petición en curso.
+* Con SLOW_QUERY_MS definido se registran las consultas más lentas que ese
+  umbral junto con la ruta y los parámetros.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+import cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0")) # 0 = desactivado
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas, seguro entre hilos."""
+
+    def __init__(self, name, help, buckets, label_names):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            for labels, series in items:
+                label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{label_text}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP.",
+    LATENCY_BUCKETS, ("method", "route", "status"),
+)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_db_statements", "Sentencias SQL ejecutadas por petición.",
+    STATEMENT_BUCKETS, ("method", "route"),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds", "Tiempo en base de datos por petición.",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+DB_STATEMENTS_TOTAL = Counter("db_statements_total", "Sentencias SQL ejecutadas.")
+DB_SECONDS_TOTAL = Counter("db_duration_seconds_total", "Tiempo total en base de datos.")
+SLOW_QUERIES_TOTAL = Counter("db_slow_queries_total", "Consultas más lentas que SLOW_QUERY_MS.")
+
+METRICS = (
+    REQUEST_LATENCY, REQUEST_STATEMENTS, REQUEST_DB_TIME,
+    DB_STATEMENTS_TOTAL, DB_SECONDS_TOTAL, SLOW_QUERIES_TOTAL,
+)
+
+
+class RequestStats:
+    """Estadísticas SQL de la petición en curso (compartidas con el threadpool)."""
+
+    __slots__ = ("scope", "statements", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements = 0
+        self.db_seconds = 0.0
+
+    def add(self, elapsed):
+        # Las sentencias de una misma petición se ejecutan secuencialmente
+        self.statements += 1
+        self.db_seconds += elapsed
+
+
+_current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def route_label(scope):
+    """Plantilla de la ruta (/api/transactions/{transaction_id}) para no disparar la cardinalidad."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_STATEMENTS_TOTAL.inc()
+    DB_SECONDS_TOTAL.inc(elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.add(elapsed)
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES_TOTAL.inc()
+        route = route_label(stats.scope) if stats is not None else "-"
+        logger.warning(
+            f"Consulta lenta ({elapsed * 1000:.1f} ms) en {route}: {statement} | parámetros: {parameters!r}"
+        )
+
+
+def instrument_engine(engine):
+    """Registra los eventos de cursor en un engine síncrono (o en async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide latencia y SQL por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current_request.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            route = route_label(scope)
+            method = scope["method"]
+            REQUEST_LATENCY.observe((method, route, str(status["code"])), elapsed)
+            REQUEST_STATEMENTS.observe((method, route), stats.statements)
+            REQUEST_DB_TIME.observe((method, route), stats.db_seconds)
+
+
+def _render_cache_stats():
+    lines = []
+    cache_stats = sorted(cache.stats().items())
+    for name, field, help in (
+        ("cache_hits_total", "hits", "Aciertos de la caché de lectura."),
+        ("cache_misses_total", "misses", "Fallos de la caché de lectura."),
+    ):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+        lines += [f'{name}{{namespace="{namespace}"}} {counts[field]}' for namespace, counts in cache_stats]
+    return lines
+
+
+def render_metrics():
+    """Todas las métricas en formato de exposición de texto de Prometheus."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(_render_cache_stats())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,171 @@
+"""
+Cambios de esquema que create_all no aplica sobre bases existentes.
+
+create_all solo crea tablas que faltan; las columnas nuevas de tablas ya
+creadas se añaden aquí con ALTER TABLE. Solo admite columnas que aceptan
+NULL, que es como se declaran las columnas nuevas; crud las rellena después.
+
+migrate_amounts_to_cents pasa los importes de float a céntimos enteros y
+debe ejecutarse antes que add_missing_columns. migrate_rollup_key_index
+cambia el índice único de daily_rollups por uno sobre la clave sin NULL.
+"""
+import logging
+import warnings
+
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.schema import CreateIndex
+
+import schemas
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine):
+    """Añade las columnas de los modelos que falten en tablas existentes. Devuelve 'tabla.columna' añadidas."""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f"La columna {table.name}.{column.name} necesita una migración manual.")
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+                logger.info(f"Columna añadida: {table.name}.{column.name}")
+    return added
+
+
+def migrate_rollup_key_index(engine):
+    """
+    Sustituye el índice único antiguo de daily_rollups, sobre category_id,
+    por el de models.rollup_category_key: con category_id NULL el antiguo
+    admitía filas repetidas para la misma clave. Antes de crear el nuevo
+    fusiona esas filas en la de menor id (sin regenerar desde el libro: los
+    periodos archivados ya no tienen transacciones). Devuelve las filas
+    fusionadas, o None si no había nada que migrar.
+    """
+    inspector = inspect(engine)
+    if "daily_rollups" not in inspector.get_table_names():
+        return None
+    table = Base.metadata.tables["daily_rollups"]
+    with warnings.catch_warnings():
+        # SQLite no refleja índices sobre expresiones (el nuevo): basta con los nombres
+        warnings.simplefilter("ignore", exc.SAWarning)
+        old_index = "ux_daily_rollups_key" in {index["name"] for index in inspector.get_indexes(table.name)}
+    merged = None
+    with engine.begin() as conn:
+        if old_index:
+            conn.execute(text('DROP INDEX "ux_daily_rollups_key"'))
+            same_key = (
+                "d.day = daily_rollups.day AND d.account_id = daily_rollups.account_id "
+                "AND COALESCE(d.category_id, 0) = COALESCE(daily_rollups.category_id, 0) "
+                "AND d.type = daily_rollups.type"
+            )
+            key = "day, account_id, COALESCE(category_id, 0), type"
+            conn.execute(text(
+                f"UPDATE daily_rollups SET "
+                f"total_cents = (SELECT SUM(d.total_cents) FROM daily_rollups d WHERE {same_key}), "
+                f"count = (SELECT SUM(d.count) FROM daily_rollups d WHERE {same_key}) "
+                f"WHERE id IN (SELECT MIN(id) FROM daily_rollups GROUP BY {key} HAVING COUNT(*) > 1)"
+            ))
+            merged = conn.execute(text(
+                f"DELETE FROM daily_rollups WHERE id NOT IN (SELECT MIN(id) FROM daily_rollups GROUP BY {key})"
+            )).rowcount
+            logger.info(f"Índice de daily_rollups migrado a coalesce(category_id, 0): {merged} filas fusionadas.")
+        # create_all no añade índices a tablas existentes; checkfirst no ve
+        # los de expresiones en SQLite
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+    return merged
+
+
+# Tablas derivadas del libro: se vacían y el arranque las regenera desde
+# las transacciones (rebuild_rollups / snapshot_balances)
+DERIVED_TABLES = ("daily_rollups", "balance_snapshots")
+
+
+def _float_columns(inspector, table):
+    """{columna_cents: columna_float} de los importes aún sin migrar."""
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    return {
+        column.name: column.name[:-len("_cents")]
+        for column in table.columns
+        if column.name.endswith("_cents") and column.name not in existing
+        and column.name[:-len("_cents")] in existing
+    }
+
+
+def _rebuild_sqlite_table(conn, inspector, table, renamed):
+    """
+    SQLite no cambia el tipo de una columna: se renombra la tabla antigua,
+    se crea la nueva con sus índices y se copian las filas convirtiendo los
+    importes con to_cents (el mismo redondeo que la API).
+    """
+    old_name = f"{table.name}_float_old"
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    for index in inspector.get_indexes(table.name):
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    # legacy_alter_table evita que las FK de otras tablas pasen a apuntar a la antigua
+    conn.execute(text("PRAGMA legacy_alter_table=ON"))
+    conn.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"'))
+    conn.execute(text("PRAGMA legacy_alter_table=OFF"))
+    table.create(conn)
+    if table.name not in DERIVED_TABLES:
+        names, values = [], []
+        for column in table.columns:
+            if column.name in renamed:
+                names.append(column.name)
+                values.append(f'to_cents("{renamed[column.name]}")')
+            elif column.name in existing:
+                names.append(column.name)
+                values.append(f'"{column.name}"')
+        conn.execute(text(
+            f'INSERT INTO "{table.name}" ({", ".join(names)}) SELECT {", ".join(values)} FROM "{old_name}"'
+        ))
+    conn.execute(text(f'DROP TABLE "{old_name}"'))
+
+
+def migrate_amounts_to_cents(engine):
+    """
+    Convierte las columnas de importe float (amount, balance, total,
+    opening_balance) en BIGINT de céntimos (*_cents) en bases existentes.
+    Cada importe se redondea por separado, así que un balance acumulado con
+    fracciones de céntimo puede diferir en un céntimo de su libro:
+    ``reconcile.py --repair`` lo ajusta. Devuelve las tablas migradas.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    migrated = []
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.connection.driver_connection.create_function("to_cents", 1, schemas.to_cents, deterministic=True)
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            renamed = _float_columns(inspector, table)
+            if not renamed:
+                continue
+            if engine.dialect.name == "sqlite":
+                _rebuild_sqlite_table(conn, inspector, table, renamed)
+            elif table.name in DERIVED_TABLES:
+                conn.execute(text(f'DROP TABLE "{table.name}"'))
+                table.create(conn)
+            else:
+                for new_name, old_name in renamed.items():
+                    # float8 -> numeric conserva el decimal escrito; el redondeo coincide con to_cents
+                    conn.execute(text(
+                        f'ALTER TABLE "{table.name}" ALTER COLUMN "{old_name}" TYPE BIGINT '
+                        f'USING ROUND(CAST("{old_name}" AS NUMERIC) * 100)'
+                    ))
+                    conn.execute(text(f'ALTER TABLE "{table.name}" RENAME COLUMN "{old_name}" TO "{new_name}"'))
+            migrated.append(table.name)
+            logger.info(f"Importes de {table.name} migrados a céntimos: {', '.join(renamed)}.")
+    return migrated
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, ForeignKey, Index, Text, func, literal_column
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -8,8 +8,12 @@ class Account(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
-    balance = Column(Float, default=0.0, nullable=False)
+    # Importes en céntimos enteros; schemas los convierte a unidades
+    balance_cents = Column(BigInteger, default=0, nullable=False)
     type = Column(String, nullable=False, default="Banco") # New field for account type
+    # Balance inicial (sin movimientos): balance esperado = inicial + efecto del libro.
+    # NULL en cuentas anteriores a la conciliación hasta que se fija al arrancar
+    opening_balance_cents = Column(BigInteger, nullable=True)
 
     # Relación con transacciones donde esta cuenta es el origen (account_id)
     transactions = relationship("Transaction", foreign_keys="[Transaction.account_id]", back_populates="account")
@@ -26,10 +30,18 @@ class Category(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Índices compuestos para los reportes por rango de fechas
+        Index("ix_transactions_type_date", "type", "date"),
+        Index("ix_transactions_account_date", "account_id", "date"),
+        # Índices para el listado paginado por (date, id)
+        Index("ix_transactions_date_id", "date", "id"),
+        Index("ix_transactions_category_date", "category_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String, index=True)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False) # Siempre positivo; el tipo da el signo
     date = Column(DateTime, default=datetime.datetime.now)
     type = Column(String, nullable=False)  # "income", "expense", "transfer_in", "transfer_out"
     account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
@@ -39,4 +51,117 @@ class Transaction(Base):
     # Relación con la cuenta
     account = relationship("Account", foreign_keys=[account_id], back_populates="transactions")
     to_account = relationship("Account", foreign_keys=[to_account_id])
-    category = relationship("Category", back_populates="transactions")
\ No newline at end of file
+    category = relationship("Category", back_populates="transactions")
+
+class DailyRollup(Base):
+    """
+    Totales diarios precalculados por (día, cuenta, categoría, tipo).
+    Se mantienen desde crud en la misma transacción que el movimiento.
+    """
+    __tablename__ = "daily_rollups"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    type = Column(String, nullable=False)
+    total_cents = Column(BigInteger, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+def rollup_category_key():
+    """
+    Categoría de la clave de un rollup: 0 en lugar de NULL (transferencias y
+    movimientos sin categoría). En un índice único los NULL son distintos
+    entre sí, así que la unicidad de la clave se impone sobre esta expresión;
+    crud filtra por la misma para que el UPDATE use el índice (el 0 va
+    literal: con un parámetro la expresión ya no coincide con la del índice).
+    """
+    return func.coalesce(DailyRollup.category_id, literal_column("0"))
+
+Index(
+    "ux_daily_rollups_category_key",
+    DailyRollup.day, DailyRollup.account_id, rollup_category_key(), DailyRollup.type,
+    unique=True,
+)
+
+class BalanceSnapshot(Base):
+    """
+    Balance de una cuenta al inicio de un día (antes de sus movimientos),
+    normalmente el día 1 de cada mes. crud lo ajusta cuando se crean,
+    editan o borran transacciones de días anteriores.
+    """
+    __tablename__ = "balance_snapshots"
+    __table_args__ = (
+        Index("ux_balance_snapshots_account_day", "account_id", "day", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    balance_cents = Column(BigInteger, nullable=False)
+
+class TableVersion(Base):
+    """
+    Contador de cambios por tabla lógica ("accounts", "categories",
+    "transactions"). crud lo incrementa al confirmar cada escritura y los
+    endpoints de lectura lo usan para calcular ETags. Las filas
+    "cache:<etiqueta>" versionan las claves de la caché (ver cache.py).
+    """
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ChangeEvent(Base):
+    """
+    Evento del feed de cambios. seq se asigna en orden de commit (ver
+    crud._write_change_events); payload es JSON.
+    """
+    __tablename__ = "change_events"
+
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, default=datetime.datetime.now, nullable=False)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+
+class ReconciliationRun(Base):
+    """Ejecución de la conciliación de balances; last_seq es el punto de control del feed de cambios."""
+    __tablename__ = "reconciliation_runs"
+
+    id = Column(Integer, primary_key=True)
+    started_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+    mode = Column(String, nullable=False) # "full" o "incremental"
+    last_seq = Column(Integer, nullable=False)
+    accounts_checked = Column(Integer, nullable=False, default=0)
+    discrepancies = Column(Integer, nullable=False, default=0)
+    repaired = Column(Integer, nullable=False, default=0)
+
+class ArchivedPeriod(Base):
+    """
+    Periodo [period_start, period_end) cuyas transacciones se movieron a un
+    fichero Parquet (archive.py). Sus rollups y snapshots se conservan.
+    """
+    __tablename__ = "archived_periods"
+
+    id = Column(Integer, primary_key=True)
+    period_start = Column(Date, nullable=False)
+    period_end = Column(Date, nullable=False)
+    path = Column(String, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+
+class IdempotencyKey(Base):
+    """
+    Respuesta de una alta hecha con cabecera Idempotency-Key (ver
+    idempotency.py). response se escribe en la misma transacción que la
+    alta, así que nunca se ve confirmada sin ella.
+    """
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String, primary_key=True) # "transactions" o "transfers"
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False) # sha256 del cuerpo de la petición
+    response = Column(Text, nullable=True) # JSON compacto
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,256 @@
+"""
+Particionado mensual de transactions en Postgres (opcional).
+
+``python partitions.py --convert`` convierte la tabla en una tabla
+particionada por rango de date: una partición por mes desde la primera
+transacción y una partición por defecto para las fechas que aún no tienen
+la suya. Es una operación única que reescribe la tabla bloqueándola:
+hacerla con la API parada.
+
+Con la tabla ya particionada, el arranque de la API y ``python
+partitions.py`` (programarlo a fin de mes en servidores que no se
+reinician) crean las particiones de los próximos PARTITION_MONTHS_AHEAD
+meses y mueven a su mes las filas que hayan caído en la partición por
+defecto. Las consultas con rango de fechas solo leen las particiones del
+rango; el listado prueba primero con los meses recientes (ver
+crud.get_transactions) y archive.py borra particiones enteras.
+
+En SQLite no hace nada.
+
+Uso (desde ``backend/``):
+    python partitions.py --convert
+    python partitions.py                 # mantenimiento
+    python partitions.py --months-ahead 6
+"""
+import argparse
+import datetime
+import os
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import models
+import search
+
+# Meses futuros con partición ya creada
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Meses anteriores al actual que el listado lee antes que el resto
+RECENT_MONTHS = 2
+
+DEFAULT_PARTITION = "transactions_default"
+UNPARTITIONED_TABLE = "transactions_unpartitioned"
+
+# Estado por engine: solo cambia con --convert, que se hace con la API parada
+_partitioned = {}
+
+
+def _month_start(day) -> datetime.date:
+    return datetime.date(day.year, day.month, 1)
+
+
+def _add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"transactions_p{month:%Y_%m}"
+
+
+def _query_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('transactions'))"
+    )).scalar()
+
+
+def is_partitioned(db: Session) -> bool:
+    """True si transactions es una tabla particionada (Postgres)."""
+    engine = db.get_bind().engine
+    if engine.dialect.name != "postgresql":
+        return False
+    if engine not in _partitioned:
+        _partitioned[engine] = _query_partitioned(db)
+    return _partitioned[engine]
+
+
+def recent_start(before: datetime.datetime | None = None) -> datetime.datetime:
+    """Inicio de los RECENT_MONTHS meses anteriores al mes de before (hoy por defecto)."""
+    month = _add_months(_month_start(before or datetime.date.today()), -RECENT_MONTHS)
+    return datetime.datetime.combine(month, datetime.time())
+
+
+def _existing_partitions(conn):
+    return {
+        name for (name,) in conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass('transactions')"
+        ))
+    }
+
+
+def _bounds(month: datetime.date) -> str:
+    # Los límites de una partición no admiten parámetros: literales de fecha generados aquí
+    return f"FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+
+
+def _create_partition(conn, month: datetime.date):
+    """
+    Crea la partición del mes fuera de la tabla, le mueve las filas de ese mes
+    que estuvieran en la partición por defecto y la engancha: ATTACH bloquea
+    la tabla padre menos que CREATE TABLE ... PARTITION OF.
+    """
+    name = partition_name(month)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": month, "end": _add_months(month, 1)})
+    conn.execute(text(f"ALTER TABLE transactions ATTACH PARTITION {name} FOR VALUES {_bounds(month)}"))
+    return name
+
+
+def convert_to_partitioned(engine, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """
+    Reescribe transactions como tabla particionada por mes con los mismos
+    índices, claves foráneas y secuencia de ids. La clave primaria pasa a
+    ser (id, date): Postgres exige la clave de partición en ella. Todo en
+    una transacción. Devuelve las particiones creadas.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("El particionado de transactions solo está disponible en Postgres.")
+    table = models.Transaction.__table__
+    with engine.begin() as conn:
+        if _query_partitioned(conn):
+            return []
+        conn.execute(text("LOCK TABLE transactions IN ACCESS EXCLUSIVE MODE"))
+        if conn.execute(text("SELECT EXISTS (SELECT 1 FROM transactions WHERE date IS NULL)")).scalar():
+            raise RuntimeError("Hay transacciones sin fecha: asígnales una antes de particionar.")
+        first = conn.execute(text("SELECT min(date) FROM transactions")).scalar()
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('transactions', 'id')")).scalar()
+
+        # Los nombres de índices son únicos por esquema: se liberan antes de crear la tabla nueva
+        for (index,) in conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'transactions' AND indexname <> 'transactions_pkey'"
+        )).all():
+            conn.execute(text(f'DROP INDEX "{index}"'))
+        conn.execute(text(f"ALTER TABLE transactions RENAME TO {UNPARTITIONED_TABLE}"))
+        conn.execute(text(f"ALTER TABLE {UNPARTITIONED_TABLE} RENAME CONSTRAINT transactions_pkey TO {UNPARTITIONED_TABLE}_pkey"))
+
+        conn.execute(text(
+            f"CREATE TABLE transactions (LIKE {UNPARTITIONED_TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (date)"
+        ))
+        conn.execute(text("ALTER TABLE transactions ALTER COLUMN date SET NOT NULL"))
+        conn.execute(text("ALTER TABLE transactions ADD PRIMARY KEY (id, date)"))
+        for constraint in table.foreign_key_constraints:
+            columns = ", ".join(column.name for column in constraint.columns)
+            referred = ", ".join(element.column.name for element in constraint.elements)
+            conn.execute(text(
+                f"ALTER TABLE transactions ADD FOREIGN KEY ({columns}) "
+                f"REFERENCES {constraint.referred_table.name} ({referred})"
+            ))
+        # En la tabla padre: cada partición recibe los suyos al crearse
+        for index in table.indexes:
+            index.create(conn)
+        if sequence:
+            # Si no, la secuencia se borraría con la tabla antigua
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY transactions.id"))
+
+        this_month = _month_start(datetime.date.today())
+        month = _month_start(first) if first is not None and first.date() < this_month else this_month
+        last = _add_months(this_month, months_ahead)
+        created = []
+        while month <= last:
+            name = partition_name(month)
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF transactions FOR VALUES {_bounds(month)}"))
+            created.append(name)
+            month = _add_months(month, 1)
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF transactions DEFAULT"))
+
+        conn.execute(text(f"INSERT INTO transactions SELECT * FROM {UNPARTITIONED_TABLE}"))
+        conn.execute(text(f"DROP TABLE {UNPARTITIONED_TABLE}"))
+    _partitioned[engine] = True
+    search.ensure_search_index(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE transactions"))
+    return created
+
+
+def maintain_partitions(engine, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """
+    Crea las particiones que falten para este mes y los months_ahead
+    siguientes, y para los meses con filas en la partición por defecto.
+    No hace nada si transactions no está particionada. Devuelve las
+    particiones creadas.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.begin() as conn:
+        _partitioned[engine] = _query_partitioned(conn)
+        if not _partitioned[engine]:
+            return []
+        # Varios workers arrancando a la vez: uno crea, los demás ven las particiones ya hechas
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('transactions_partitions'))"))
+        existing = _existing_partitions(conn)
+        this_month = _month_start(datetime.date.today())
+        wanted = {_add_months(this_month, months) for months in range(months_ahead + 1)}
+        wanted.update(conn.execute(text(
+            f"SELECT DISTINCT CAST(date_trunc('month', date) AS date) FROM {DEFAULT_PARTITION}"
+        )).scalars())
+        return [
+            _create_partition(conn, month)
+            for month in sorted(wanted) if partition_name(month) not in existing
+        ]
+
+
+def drop_partitions(db: Session, start: datetime.date, end: datetime.date):
+    """
+    Borra las particiones mensuales contenidas en [start, end), dentro de la
+    transacción de db (archive.py). Las filas del rango que queden en la
+    partición por defecto las borra quien llama. Devuelve las borradas.
+    """
+    if not is_partitioned(db):
+        return []
+    existing = _existing_partitions(db)
+    dropped = []
+    month = _month_start(start)
+    while _add_months(month, 1) <= end:
+        name = partition_name(month)
+        if month >= start and name in existing:
+            db.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+        month = _add_months(month, 1)
+    return dropped
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Particionado mensual de transactions (Postgres).")
+    parser.add_argument("--convert", action="store_true", help="Convertir la tabla actual (con la API parada).")
+    parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print("El particionado de transactions solo está disponible en Postgres.")
+        return 1
+    models.Base.metadata.create_all(bind=engine)
+    if args.convert:
+        created = convert_to_partitioned(engine, months_ahead=args.months_ahead)
+        if not created:
+            print("transactions ya estaba particionada.")
+        else:
+            print(f"transactions particionada: {len(created)} particiones mensuales ({created[0]} a {created[-1]}).")
+    created = maintain_partitions(engine, months_ahead=args.months_ahead)
+    if not _partitioned.get(engine):
+        print("transactions no está particionada: usar --convert.")
+        return 1
+    for name in created:
+        print(f"Partición creada: {name}")
+    if not created:
+        print("Particiones al día.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
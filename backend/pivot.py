@@ -0,0 +1,188 @@
+"""
+Reporte pivote: totales cruzando dos dimensiones (categoría, cuenta, tipo o
+periodo) en una matriz densa con totales por fila, por columna y general.
+
+Una sola consulta GROUP BY sobre daily_rollups trae las columnas pedidas al
+grano (día, dimensión): decenas de miles de filas para diez años, sin
+importar cuántas transacciones haya. NumPy agrupa los días en periodos,
+asigna a cada fila su celda y acumula las celdas de una vez. Los rollups se
+conservan al archivar, así que el pivote cubre también los años archivados.
+"""
+import datetime
+
+import numpy as np
+from sqlalchemy import String, case, cast, func, select
+from sqlalchemy.orm import Session
+
+import cache
+import models
+
+DIMENSIONS = ("category", "account", "type", "period")
+GRANULARITIES = ("day", "week", "month", "year")
+MEASURES = ("net", "amount", "count")
+TYPES = ("income", "expense", "transfer_in", "transfer_out")
+
+# Celdas como máximo de la matriz
+MAX_PIVOT_CELLS = 100_000
+
+# Categoría NULL: -1 en la consulta y, en los arrays, una clave que ordena al final del eje
+_NULL_CATEGORY = -1
+_NO_CATEGORY = np.iinfo(np.int64).max
+
+
+def _period_starts(days: np.ndarray, granularity: str) -> np.ndarray:
+    """Inicio del periodo de cada día (datetime64[D]); las semanas empiezan en lunes."""
+    if granularity == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    if granularity == "year":
+        return days.astype("datetime64[Y]").astype("datetime64[D]")
+    if granularity == "week":
+        # El día 0 (1970-01-01) fue jueves
+        numbers = days.astype(np.int64)
+        return (numbers - (numbers + 3) % 7).astype("datetime64[D]")
+    return days
+
+
+def _period_axis(start: datetime.date, end: datetime.date, granularity: str) -> np.ndarray:
+    """Todos los periodos que solapan [start, end), también los vacíos."""
+    first = _period_starts(np.array([start], dtype="datetime64[D]"), granularity)[0]
+    if granularity in ("month", "year"):
+        unit = "M" if granularity == "month" else "Y"
+        periods = np.arange(first.astype(f"datetime64[{unit}]"), np.datetime64(end, unit) + 1).astype("datetime64[D]")
+    else:
+        periods = np.arange(first, np.datetime64(end, "D"), np.timedelta64(7 if granularity == "week" else 1, "D"))
+    return periods[periods < np.datetime64(end, "D")]
+
+
+def _measure(measure: str):
+    rollup = models.DailyRollup
+    if measure == "count":
+        return func.sum(rollup.count)
+    if measure == "amount":
+        return func.sum(rollup.total_cents)
+    # Efecto en el balance, como crud._balance_delta
+    return func.sum(case(
+        (rollup.type.in_(("income", "transfer_in")), rollup.total_cents),
+        (rollup.type.in_(("expense", "transfer_out")), -rollup.total_cents),
+        else_=0,
+    ))
+
+
+def _dimension_columns(dimension: str):
+    """(columna a seleccionar, columna de agrupación) de la dimensión."""
+    rollup = models.DailyRollup
+    if dimension == "period":
+        # Texto ISO: NumPy lo convierte mucho más rápido que objetos date
+        return cast(rollup.day, String), rollup.day
+    if dimension == "category":
+        return func.coalesce(rollup.category_id, _NULL_CATEGORY), rollup.category_id
+    column = rollup.account_id if dimension == "account" else rollup.type
+    return column, column
+
+
+def _categorical_axis(values, dimension: str):
+    """(claves ordenadas, índice de cada fila en ellas) de una dimensión que no es el periodo."""
+    if dimension == "type":
+        present, index = np.unique(np.array(values, dtype=str), return_inverse=True)
+        # Orden fijo de los tipos, no alfabético
+        order = sorted(range(len(present)), key=lambda i: TYPES.index(present[i]) if present[i] in TYPES else len(TYPES))
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        return [str(present[i]) for i in order], position[index]
+    values = np.array(values, dtype=np.int64)
+    if dimension == "category":
+        values[values == _NULL_CATEGORY] = _NO_CATEGORY
+    keys, index = np.unique(values, return_inverse=True)
+    return [None if key == _NO_CATEGORY else int(key) for key in keys], index
+
+
+def _labels(db: Session, dimension: str, keys):
+    if dimension == "account":
+        names = dict(db.query(models.Account.id, models.Account.name).filter(models.Account.id.in_(keys)))
+    elif dimension == "category":
+        names = dict(db.query(models.Category.id, models.Category.name).filter(
+            models.Category.id.in_([key for key in keys if key is not None])
+        ))
+        names[None] = "Sin categoría"
+    else:
+        return None
+    return [names.get(key, str(key)) for key in keys]
+
+
+def _pivot_tags(start, end, rows, columns, granularity, measure, account_ids, category_ids, types):
+    return [*cache.month_tags(start, end), "accounts", "categories"]
+
+
+@cache.cached("reports", tags=_pivot_tags)
+def get_pivot_report(
+    db: Session,
+    start: datetime.date,
+    end: datetime.date,
+    rows: str = "category",
+    columns: str = "period",
+    granularity: str = "month",
+    measure: str = "net",
+    account_ids: tuple | None = None,
+    category_ids: tuple | None = None,
+    types: tuple | None = None,
+):
+    """
+    Matriz rows x columns de measure en [start, end): "net" es el efecto en
+    el balance (ingresos y transferencias recibidas menos gastos y enviadas),
+    "amount" la suma de importes sin signo y "count" el número de
+    transacciones. Los filtros son tuplas (o None) para poder cachear.
+    Importes en unidades; el eje de periodos incluye los vacíos, los demás
+    solo las claves con datos.
+    """
+    if end <= start:
+        raise ValueError("La fecha final debe ser posterior a la inicial.")
+    if rows == columns:
+        raise ValueError("Filas y columnas deben ser dimensiones distintas.")
+    periods = _period_axis(start, end, granularity) if "period" in (rows, columns) else None
+    if periods is not None and len(periods) > MAX_PIVOT_CELLS:
+        raise ValueError(f"El pivote supera {MAX_PIVOT_CELLS} celdas.")
+
+    rollup = models.DailyRollup
+    (row_column, row_group), (column_column, column_group) = _dimension_columns(rows), _dimension_columns(columns)
+    query = select(row_column, column_column, _measure(measure)).where(rollup.day >= start, rollup.day < end)
+    if account_ids is not None:
+        query = query.where(rollup.account_id.in_(account_ids))
+    if category_ids is not None:
+        query = query.where(rollup.category_id.in_(category_ids))
+    if types is not None:
+        query = query.where(rollup.type.in_(types))
+    result = db.execute(query.group_by(row_group, column_group)).all()
+    row_values, column_values, measured = zip(*result) if result else ((), (), ())
+
+    axes = []
+    for dimension, values in ((rows, row_values), (columns, column_values)):
+        if dimension == "period":
+            starts = _period_starts(np.array(values, dtype="datetime64[D]"), granularity)
+            axes.append(([str(period) for period in periods], np.searchsorted(periods, starts)))
+        else:
+            axes.append(_categorical_axis(values, dimension))
+    (row_keys, row_index), (column_keys, column_index) = axes
+    if len(row_keys) * len(column_keys) > MAX_PIVOT_CELLS:
+        raise ValueError(f"El pivote supera {MAX_PIVOT_CELLS} celdas.")
+
+    matrix = np.zeros((len(row_keys), len(column_keys)), dtype=np.int64)
+    np.add.at(matrix, (row_index, column_index), np.array(measured, dtype=np.int64))
+    # Totales exactos en céntimos; la conversión a unidades se hace aquí,
+    # sobre el array, y no celda a celda en el esquema
+    scale = 1 if measure == "count" else 100
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity if periods is not None else None,
+        "measure": measure,
+        "rows": {"dimension": rows, "keys": row_keys, "labels": _labels(db, rows, row_keys)},
+        "columns": {"dimension": columns, "keys": column_keys, "labels": _labels(db, columns, column_keys)},
+        "values": _units(matrix, scale).tolist(),
+        "row_totals": _units(matrix.sum(axis=1), scale).tolist(),
+        "column_totals": _units(matrix.sum(axis=0), scale).tolist(),
+        "total": _units(matrix.sum(), scale).item(),
+    }
+
+
+def _units(cents: np.ndarray, scale: int) -> np.ndarray:
+    return cents if scale == 1 else cents / scale
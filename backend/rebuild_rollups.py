@@ -0,0 +1,44 @@
+"""
+Regenera la tabla daily_rollups desde el libro de transacciones y verifica
+que coincide con él.
+
+Uso (desde ``backend/``):
+    python rebuild_rollups.py            # regenera y verifica
+    python rebuild_rollups.py --check    # solo verifica
+"""
+import argparse
+import sys
+
+import crud
+import models
+import schemas
+from database import SessionLocal, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenera y verifica los rollups diarios.")
+    parser.add_argument("--check", action="store_true", help="Solo comparar rollups con el libro, sin regenerar.")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if not args.check:
+            rows = crud.rebuild_rollups(db)
+            print(f"Rollups regenerados: {rows} filas.")
+
+        mismatches = crud.check_rollups(db)
+        for mismatch in mismatches[:50]:
+            print(
+                f"{mismatch['day']} cuenta={mismatch['account_id']} categoría={mismatch['category_id']} "
+                f"tipo={mismatch['type']}: libro={schemas.format_cents(mismatch['expected_total_cents'])} ({mismatch['expected_count']}) "
+                f"rollup={schemas.format_cents(mismatch['actual_total_cents'])} ({mismatch['actual_count']})"
+            )
+        if mismatches:
+            print(f"{len(mismatches)} diferencias entre rollups y libro.")
+            return 1
+        print("Rollups consistentes con el libro.")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
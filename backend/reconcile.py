@@ -0,0 +1,53 @@
+"""
+Concilia el balance de cada cuenta con su libro de transacciones.
+
+Uso (desde ``backend/``):
+    python reconcile.py                  # informa de diferencias
+    python reconcile.py --repair         # y las corrige
+    python reconcile.py --incremental    # solo cuentas con cambios desde la última ejecución
+
+Sale con código 1 si quedan diferencias sin corregir.
+"""
+import argparse
+import sys
+
+import crud
+import migrations
+import models
+import schemas
+from database import SessionLocal, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concilia balances con el libro de transacciones.")
+    parser.add_argument("--repair", action="store_true", help="Corregir los balances que no cuadran.")
+    parser.add_argument("--incremental", action="store_true", help="Desde el punto de control de la última ejecución.")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    migrations.migrate_amounts_to_cents(engine)
+    migrations.add_missing_columns(engine)
+    with SessionLocal() as db:
+        crud.ensure_table_versions(db)
+        crud.baseline_opening_balances(db)
+        report = crud.reconcile_balances(db, repair=args.repair, incremental=args.incremental)
+
+    print(f"Ejecución {report['run_id']} ({report['mode']}): {report['accounts_checked']} cuentas revisadas.")
+    for item in report["discrepancies"]:
+        print(
+            f"cuenta={item['account_id']} ({item['name']}): balance={schemas.format_cents(item['balance_cents'])} "
+            f"libro={schemas.format_cents(item['expected_balance_cents'])} "
+            f"diferencia={schemas.format_cents(item['difference_cents'])}"
+        )
+    if not report["discrepancies"]:
+        print("Balances consistentes con el libro.")
+        return 0
+    if report["repaired"]:
+        print(f"{len(report['discrepancies'])} balances corregidos.")
+        return 0
+    print(f"{len(report['discrepancies'])} balances no cuadran con el libro.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
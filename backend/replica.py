@@ -0,0 +1,51 @@
+"""
+Enrutado de lecturas a la réplica (READ_REPLICA_URL, ver database.py).
+
+Los GET de listados y reportes leen de la réplica. Cada escritura correcta
+(POST, PUT, DELETE con estado < 400) deja al cliente la cookie
+``read_primary`` durante READ_REPLICA_STICKY_SECONDS: mientras la envíe,
+sus GET leen del primario y ven lo que acaba de escribir aunque la réplica
+vaya con retraso. Un cliente en otro origen debe enviar las cookies
+(``withCredentials`` en axios).
+
+El feed de cambios siempre lee del primario: una réplica atrasada haría
+ver a un cliente un seq anterior al que ya recibió.
+"""
+from fastapi import Request
+
+from database import READ_REPLICA_STICKY_SECONDS, ReplicaSessionLocal
+
+READ_PRIMARY_COOKIE = "read_primary"
+
+_READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def enabled() -> bool:
+    return ReplicaSessionLocal is not None
+
+
+def reads_from_replica(request: Request) -> bool:
+    """True si la petición puede leer de la réplica."""
+    return enabled() and READ_PRIMARY_COOKIE not in request.cookies
+
+
+class ReadYourWritesMiddleware:
+    """Middleware ASGI que pone la cookie read_primary en las respuestas de escrituras correctas."""
+
+    def __init__(self, app):
+        self.app = app
+        self.cookie = (
+            f"{READ_PRIMARY_COOKIE}=1; Max-Age={READ_REPLICA_STICKY_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+        ).encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled() or scope["method"] in _READ_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", self.cookie)]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,6 +1,49 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import List, Optional
+from pydantic import BaseModel, model_validator
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Optional, Union
+
+# --- Importes: la base guarda céntimos enteros, la API usa unidades ---
+
+def to_cents(amount) -> int | None:
+    """12.345 -> 1235 (redondeo comercial sobre el decimal escrito, no sobre el float)."""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_cents(cents) -> float | None:
+    return None if cents is None else int(cents) / 100
+
+def format_cents(cents: int) -> str:
+    """1235 -> '12.35', exacto para cualquier entero."""
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+class FromCents(BaseModel):
+    """
+    Base de las respuestas con importes. Si la fuente (objeto ORM, fila o
+    dict de crud) trae ``<campo>_cents`` en lugar de ``<campo>``, se
+    convierte a unidades al validar.
+    """
+
+    @model_validator(mode="before")
+    @classmethod
+    def _convert_cents(cls, data):
+        if isinstance(data, dict):
+            values = dict(data)
+            for name in cls.model_fields:
+                if name not in values and f"{name}_cents" in values:
+                    values[name] = from_cents(values[f"{name}_cents"])
+            return values
+        if isinstance(data, BaseModel):
+            return data
+        values = {}
+        for name in cls.model_fields:
+            if hasattr(data, f"{name}_cents"):
+                values[name] = from_cents(getattr(data, f"{name}_cents"))
+            elif hasattr(data, name):
+                values[name] = getattr(data, name)
+        return values
 
 # --- Esquemas para Transacciones ---
 
@@ -11,11 +54,15 @@ class TransactionBase(BaseModel):
     to_account_id: Optional[int] = None # New field
     category_id: Optional[int] = None # New field for categories
 
+    @property
+    def amount_cents(self) -> int:
+        return to_cents(self.amount)
+
 class TransactionCreate(TransactionBase):
     account_id: int
     date: Optional[datetime] = None # Campo de fecha opcional
 
-class Transaction(TransactionBase):
+class Transaction(TransactionBase, FromCents):
     id: int
     date: datetime
     account_id: int
@@ -25,6 +72,18 @@ class Transaction(TransactionBase):
     class Config:
         from_attributes = True
 
+class TransactionPage(BaseModel):
+    items: List[Transaction]
+    next_cursor: Optional[str] = None # None cuando no hay más páginas
+
+class TransactionSearchHit(Transaction):
+    rank: float # Relevancia; mayor es mejor
+
+class TransactionSearchPage(BaseModel):
+    items: List[TransactionSearchHit]
+    next_offset: Optional[int] = None # Siguiente página ordenada por relevancia
+    next_before_id: Optional[int] = None # Tras la última: coincidencias más antiguas; ambos None al terminar
+
 # --- Esquemas para Categorías ---
 
 class CategoryBase(BaseModel):
@@ -39,6 +98,9 @@ class Category(CategoryBase):
     class Config:
         from_attributes = True
 
+class CategoryStats(Category):
+    transaction_count: int = 0
+
 # New TransferCreate schema
 class TransferCreate(BaseModel):
     from_account_id: int
@@ -46,6 +108,10 @@ class TransferCreate(BaseModel):
     amount: float
     description: str | None = None
 
+    @property
+    def amount_cents(self) -> int:
+        return to_cents(self.amount)
+
 # --- Esquemas para Cuentas ---
 
 class AccountBase(BaseModel):
@@ -55,21 +121,31 @@ class AccountBase(BaseModel):
 class AccountCreate(AccountBase):
     balance: float = 0.0
 
-class Account(AccountBase):
+    @property
+    def balance_cents(self) -> int:
+        return to_cents(self.balance)
+
+class AccountSummary(AccountBase, FromCents):
     id: int
     balance: float
-    transactions: List[Transaction] = []
 
     class Config:
         from_attributes = True
 
+class Account(AccountSummary):
+    transactions: List[Transaction] = []
+
 class AccountUpdate(BaseModel):
     name: Optional[str] = None
     balance: Optional[float] = None
 
+    @property
+    def balance_cents(self) -> int | None:
+        return to_cents(self.balance)
+
 # --- Esquemas para Reportes ---
 
-class MonthlyReport(BaseModel):
+class MonthlyReport(FromCents):
     year: int
     month: int
     total_income: float
@@ -81,10 +157,111 @@ class TransactionUpdate(BaseModel):
     amount: float | None = None
     date: Optional[datetime] = None
 
-class DailyReport(BaseModel):
+    @property
+    def amount_cents(self) -> int | None:
+        return to_cents(self.amount)
+
+class DailyReport(FromCents):
     year: int
     month: int
     day: int
     total_income: float
     total_expense: float
     net_balance: float
+
+class CategoryExpense(FromCents):
+    category: str
+    total_expense: float
+
+class TimeSeriesPoint(FromCents):
+    period_start: date
+    group_id: Optional[int] = None # Cuenta o categoría si se usa split_by
+    group_name: Optional[str] = None
+    total_income: float
+    total_expense: float
+    net_balance: float
+
+class TimeSeriesReport(BaseModel):
+    start: date
+    end: date
+    granularity: str # "day", "week" o "month"
+    split_by: Optional[str] = None # "account" o "category"
+    series: List[TimeSeriesPoint]
+
+class PivotAxis(BaseModel):
+    dimension: str # "category", "account", "type" o "period"
+    keys: List[Union[int, str, None]] # id, tipo o inicio del periodo (ISO); None = sin categoría
+    labels: Optional[List[str]] = None # Nombres de cuentas y categorías
+
+class PivotReport(BaseModel):
+    """Matriz densa en columnas: values[i][j] es la celda de rows.keys[i] y columns.keys[j]."""
+    start: date
+    end: date
+    granularity: Optional[str] = None # Solo si una dimensión es el periodo
+    measure: str # "net", "amount" o "count"
+    rows: PivotAxis
+    columns: PivotAxis
+    values: List[List[Union[int, float]]]
+    row_totals: List[Union[int, float]]
+    column_totals: List[Union[int, float]]
+    total: Union[int, float]
+
+# --- Esquemas para el historial de balances ---
+
+class AccountBalance(FromCents):
+    account_id: int
+    date: date # Balance al final de este día
+    balance: float
+
+class BalancePoint(FromCents):
+    period_start: date
+    balance: float # Balance al cierre del periodo
+
+class BalanceHistory(FromCents):
+    account_id: int
+    start: date
+    end: date
+    granularity: str # "day", "week" o "month"
+    opening_balance: float # Balance al inicio de start
+    points: List[BalancePoint]
+
+# --- Esquemas para la conciliación ---
+
+class BalanceDiscrepancy(FromCents):
+    account_id: int
+    name: str
+    balance: float
+    expected_balance: float # opening_balance + efecto de las transacciones
+    difference: float
+
+class ReconciliationReport(BaseModel):
+    run_id: int
+    mode: str # "full" o "incremental"
+    started_at: datetime
+    finished_at: datetime
+    last_seq: int # Punto de control en el feed de cambios
+    accounts_checked: int
+    repaired: bool
+    discrepancies: List[BalanceDiscrepancy]
+
+# --- Esquemas para Importaciones ---
+
+class ImportRejection(BaseModel):
+    line: int
+    reason: str
+
+class ImportResult(BaseModel):
+    imported: int
+    rejected_count: int
+    rejected: List[ImportRejection] # Como máximo los primeros 1000 rechazos
+    elapsed_seconds: float
+    rows_per_second: float
+
+# --- Esquemas para el feed de cambios ---
+
+class ChangePage(BaseModel):
+    # Cada evento: seq, kind, created_at, accounts (estado final de las cuentas
+    # afectadas) y, según kind, transactions, ids o count
+    events: List[Dict[str, Any]]
+    last_seq: int
+    reset: bool # True si faltan eventos purgados: recargar todo y seguir desde last_seq
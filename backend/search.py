@@ -0,0 +1,254 @@
+"""
+Búsqueda de texto completo sobre las descripciones de las transacciones.
+
+* SQLite: tabla FTS5 ``transactions_fts`` de contenido externo (rowid =
+  transactions.id). crud la mantiene en la misma transacción que cada alta,
+  edición o borrado; FTS5 necesita el texto anterior para borrar.
+* Postgres: índice GIN sobre ``to_tsvector('simple', description)``; lo
+  mantiene la propia base, crud no hace nada.
+* Otros motores: LIKE sin índice.
+
+Todas las palabras de la búsqueda deben aparecer completas; una palabra
+terminada en * se busca como prefijo ("seguro med*" encuentra "Seguro
+médico"). SQLite ignora además los acentos; Postgres con la configuración
+'simple' no.
+"""
+import logging
+import re
+
+from sqlalchemy import and_, bindparam, func, inspect, literal_column, text
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "transactions_fts"
+TS_CONFIG = "simple"
+PG_INDEX = "ix_transactions_description_fts"
+
+# Palabras como máximo por búsqueda
+MAX_QUERY_TERMS = 16
+# Coincidencias más recientes que se ordenan por relevancia
+SEARCH_RANK_WINDOW = 1000
+
+# Palabra y, si acaba en *, búsqueda por prefijo
+_TERM = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+def _pg_vector():
+    return func.to_tsvector(TS_CONFIG, func.coalesce(models.Transaction.description, ""))
+
+
+def ensure_search_index(engine) -> bool:
+    """Crea el índice de búsqueda si falta y lo llena desde transactions. True si lo creó."""
+    dialect = _dialect(engine)
+    if dialect == "sqlite":
+        if FTS_TABLE in inspect(engine).get_table_names():
+            return False
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "description, content='transactions', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        return True
+    if dialect == "postgresql":
+        if PG_INDEX in {index["name"] for index in inspect(engine).get_indexes("transactions")}:
+            return False
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON transactions "
+                f"USING GIN (to_tsvector('{TS_CONFIG}', coalesce(description, '')))"
+            ))
+        return True
+    return False
+
+
+def rebuild_search_index(engine):
+    """Vuelve a generar el índice desde transactions (tras cargas que no pasan por crud)."""
+    if _dialect(engine) == "sqlite" and not ensure_search_index(engine):
+        with engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    else:
+        ensure_search_index(engine)
+
+
+def maintained_by_crud(db: Session) -> bool:
+    return _dialect(db.get_bind()) == "sqlite"
+
+
+def index_transactions(db: Session, rows):
+    """Añade al índice las filas (id, description) recién insertadas."""
+    params = [{"id": id, "description": description} for id, description in rows]
+    if params and maintained_by_crud(db):
+        db.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (:id, :description)"), params)
+
+
+def unindex_transactions(db: Session, rows):
+    """Quita del índice las filas (id, description) con la descripción que tenían al indexarse."""
+    params = [{"id": id, "description": description} for id, description in rows]
+    if params and maintained_by_crud(db):
+        db.execute(text(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', :id, :description)"
+        ), params)
+
+
+def unindex_period(db: Session, date_from, date_to):
+    """Quita del índice las transacciones de [date_from, date_to) antes de borrarlas en bloque."""
+    if maintained_by_crud(db):
+        date_type = models.Transaction.date.type
+        db.execute(text(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) "
+            "SELECT 'delete', id, description FROM transactions WHERE date >= :date_from AND date < :date_to"
+        ).bindparams(bindparam("date_from", type_=date_type), bindparam("date_to", type_=date_type)),
+            {"date_from": date_from, "date_to": date_to})
+
+
+def parse_query(query: str):
+    """(palabra, es_prefijo) de la búsqueda; ValueError si no hay ninguna."""
+    terms = [(word, star == "*") for word, star in _TERM.findall(query.lower())][:MAX_QUERY_TERMS]
+    if not terms:
+        raise ValueError("La búsqueda no contiene palabras.")
+    return terms
+
+
+def _sqlite_search(db: Session, terms, filters, params, offset, limit, before_id):
+    params = {
+        **params,
+        "match": " ".join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in terms),
+        "window": SEARCH_RANK_WINDOW,
+        "offset": offset,
+        "limit": limit,
+    }
+    where = "".join(f" AND {condition}" for condition in filters)
+    # CROSS JOIN fija el orden (primero el índice FTS, luego transactions por
+    # clave primaria): al revés SQLite evaluaría MATCH por cada fila
+    joined = (
+        f"FROM {FTS_TABLE} CROSS JOIN transactions AS t ON t.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH :match"
+    )
+    bind = [bindparam(name, type_=models.Transaction.date.type) for name in ("date_from", "date_to") if name in params]
+    if before_id is not None:
+        # Fuera de la ventana: por id descendente desde before_id; el índice
+        # ya devuelve las coincidencias en ese orden y se corta en :limit
+        ranked = db.execute(text(
+            f"SELECT t.id, bm25({FTS_TABLE}) AS score {joined} AND {FTS_TABLE}.rowid < :before_id{where} "
+            f"ORDER BY {FTS_TABLE}.rowid DESC LIMIT :limit"
+        ).bindparams(*bind), {**params, "before_id": before_id}).all()
+        older = None
+    else:
+        # Rango de ids de la ventana: el índice devuelve las coincidencias de
+        # la más reciente a la más antigua y se corta al llenarla
+        low, high, size = db.execute(text(
+            f"SELECT min(id), max(id), count(*) FROM (SELECT t.id AS id {joined}{where} "
+            f"ORDER BY {FTS_TABLE}.rowid DESC LIMIT :window)"
+        ).bindparams(*bind), params).one()
+        if low is None:
+            return [], None
+        # bm25 solo se calcula para las filas de la ventana
+        ranked = db.execute(text(
+            f"SELECT t.id, bm25({FTS_TABLE}) AS score {joined} AND {FTS_TABLE}.rowid BETWEEN :low AND :high{where} "
+            "ORDER BY score, t.date DESC, t.id DESC LIMIT :limit OFFSET :offset"
+        ).bindparams(*bind), {**params, "low": low, "high": high}).all()
+        older = size == SEARCH_RANK_WINDOW and db.execute(text(
+            f"SELECT 1 {joined} AND {FTS_TABLE}.rowid < :low{where} LIMIT 1"
+        ).bindparams(*bind), {**params, "low": low}).first() is not None
+        older = low if older else None
+    transactions = {
+        row.id: row for row in
+        db.query(models.Transaction).filter(models.Transaction.id.in_([id for id, _ in ranked]))
+    }
+    # bm25 es más negativo cuanto más relevante
+    return [(transactions[id], -score) for id, score in ranked], older
+
+
+def _query_search(db: Session, terms, dialect, account_id, date_from, date_to, offset, limit, before_id):
+    transaction = models.Transaction
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(TS_CONFIG, " & ".join(f"{word}:*" if prefix else word for word, prefix in terms))
+        condition = _pg_vector().op("@@")(tsquery)
+    else:
+        condition = and_(*(func.lower(transaction.description).contains(word, autoescape=True) for word, _ in terms))
+    candidates = db.query(transaction).filter(condition)
+    if account_id is not None:
+        candidates = candidates.filter(transaction.account_id == account_id)
+    if date_from is not None:
+        candidates = candidates.filter(transaction.date >= date_from)
+    if date_to is not None:
+        candidates = candidates.filter(transaction.date < date_to)
+
+    def rank_of(rows):
+        if dialect == "postgresql":
+            return func.ts_rank(func.to_tsvector(TS_CONFIG, func.coalesce(rows.description, "")), tsquery).label("rank")
+        return literal_column("0.0").label("rank")
+
+    if before_id is not None:
+        page = aliased(transaction, candidates.filter(transaction.id < before_id)
+                       .order_by(transaction.id.desc()).limit(limit).subquery())
+        return db.query(page, rank_of(page)).order_by(page.id.desc()).all(), None
+    window = aliased(transaction, candidates.order_by(transaction.id.desc()).limit(SEARCH_RANK_WINDOW).subquery())
+    low, size = db.query(func.min(window.id), func.count(window.id)).one()
+    if low is None:
+        return [], None
+    rank = rank_of(window)
+    rows = db.query(window, rank).order_by(
+        rank.desc(), window.date.desc(), window.id.desc()
+    ).offset(offset).limit(limit).all()
+    older = size == SEARCH_RANK_WINDOW and candidates.filter(transaction.id < low).first() is not None
+    return rows, low if older else None
+
+
+def search_transactions(
+    db: Session,
+    query: str,
+    account_id: int | None = None,
+    date_from=None,
+    date_to=None,
+    offset: int = 0,
+    limit: int = 50,
+    before_id: int | None = None,
+):
+    """
+    Transacciones cuya descripción contiene todas las palabras de query.
+    Las SEARCH_RANK_WINDOW coincidencias registradas más recientemente se
+    ordenan de la más relevante a la menos (a igual relevancia, la más
+    reciente) y se paginan con offset: puntuar cada coincidencia de una
+    palabra muy común costaría cientos de ms. Las anteriores se recorren
+    después con before_id, por id descendente (paginación por clave, cada
+    página con su relevancia). Devuelve (filas (Transaction, rank),
+    next_offset, next_before_id); rank mayor es mejor.
+    """
+    if before_id is not None and offset:
+        raise ValueError("offset y before_id no se pueden combinar.")
+    if offset > SEARCH_RANK_WINDOW:
+        raise ValueError(f"offset no puede superar {SEARCH_RANK_WINDOW}; las coincidencias anteriores se piden con before_id.")
+    terms = parse_query(query)
+    dialect = _dialect(db.get_bind())
+    # Se pide una fila extra para saber si existe otra página
+    if dialect == "sqlite":
+        filters = []
+        params = {}
+        for name, value, condition in (
+            ("account_id", account_id, "t.account_id = :account_id"),
+            ("date_from", date_from, "t.date >= :date_from"),
+            ("date_to", date_to, "t.date < :date_to"),
+        ):
+            if value is not None:
+                filters.append(condition)
+                params[name] = value
+        rows, older = _sqlite_search(db, terms, filters, params, offset, limit + 1, before_id)
+    else:
+        rows, older = _query_search(db, terms, dialect, account_id, date_from, date_to, offset, limit + 1, before_id)
+    has_more, rows = len(rows) > limit, rows[:limit]
+    if before_id is not None:
+        return rows, None, rows[-1][0].id if has_more else None
+    if has_more:
+        return rows, offset + limit, None
+    # Última página de la ventana: las siguientes, si hay, son anteriores a ella
+    return rows, None, older
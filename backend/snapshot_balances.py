@@ -0,0 +1,35 @@
+"""
+Crea los snapshots de balance de inicio de mes que falten (historial de
+balances). La API lo hace al arrancar; programarlo también al cierre de mes
+para servidores que no se reinician.
+
+Uso (desde ``backend/``):
+    python snapshot_balances.py
+    python snapshot_balances.py --through 2024-06-01
+"""
+import argparse
+import datetime
+import sys
+
+import crud
+import models
+from database import SessionLocal, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea los snapshots de balance mensuales que falten.")
+    parser.add_argument(
+        "--through", type=datetime.date.fromisoformat, default=None,
+        help="Último mes a incluir (AAAA-MM-DD); por defecto, el mes actual."
+    )
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        created = crud.snapshot_balances(db, through=args.through)
+    print(f"Snapshots de balance creados: {created}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())